@@ -1,9 +1,19 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from app.models.schemas import FailureNotification, NotificationPayload
-from app.services import ai_analyzer, notifier
-from app.services import csv_logger
-from app.services.exceptions import AIAnalysisError, NotificationDispatchError
+import asyncio
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from app.models.context import Payload, RequestContext
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services import ai_analyzer, metrics, notifier, triage
+from app.services import analysis_store, csv_logger, incidents, ingest_queue
+from app.services.fingerprint import fingerprint
+from app.services.exceptions import AIAnalysisError, IngestQueueFullError
 from app.core.config import get_settings
 
 router = APIRouter(prefix="/api/v1", tags=["notify"])
@@ -15,54 +25,256 @@ async def api_key_auth(x_api_key: str = Header(...)):
     return True
 
 @router.post("/notify")
-async def notify_failure(payload: FailureNotification, return_only: bool = Query(False, description="If true, skip sending notifications and just return analysis."), auth=Depends(api_key_auth)):
+async def notify_failure(
+    payload: FailureNotification,
+    return_only: bool = Query(False, description="If true, skip sending notifications and just return analysis."),
+    async_mode: Optional[bool] = Query(None, description="If true, enqueue and answer 202 with a tracking id. Defaults to INGEST_ASYNC_DEFAULT."),
+    auth=Depends(api_key_auth),
+):
+    settings = get_settings()
+    use_queue = settings.ingest_async_default if async_mode is None else async_mode
+    if use_queue:
+        try:
+            job_id = ingest_queue.get_queue(process_notification).submit(payload, return_only)
+        except IngestQueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(settings.ingest_retry_after_seconds)})
+        return JSONResponse(status_code=202, content={"status": "accepted", "id": job_id, "status_url": f"{router.prefix}/notify/{job_id}"})
+    return await process_notification(payload, return_only)
+
+@router.get("/notify/{job_id}")
+async def notify_status(job_id: str, auth=Depends(api_key_auth)):
+    # A durable queue can answer for jobs accepted before a restart
+    queue = ingest_queue.get_queue(process_notification) if get_settings().ingest_db_path else ingest_queue.current_queue()
+    job = queue.status(job_id) if queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown notification id")
+    return job
+
+async def process_notification(payload: FailureNotification, return_only: bool) -> dict:
+    metrics.bind_correlation_id(payload.correlationId)
+    fp = fingerprint(payload)
     try:
-        analysis = await ai_analyzer.analyze_failure(payload)
+        analysis, tier = await triage.analyze(payload, fp)
     except AIAnalysisError as e:
         raise HTTPException(status_code=502, detail=str(e))
-    notif_payload = NotificationPayload(
-        pipelineName=payload.pipelineName,
-        runId=payload.runId,
-        activityName=payload.activityName,
-        errorCode=payload.errorCode,
-        environment=payload.environment,
-        source=getattr(payload, 'source', None),
-        resourceUrl=getattr(payload, 'resourceUrl', None),
-        component=getattr(payload, 'component', None),
-        severity=getattr(payload, 'severity', None),
-        tags=getattr(payload, 'tags', None),
-        correlationId=getattr(payload, 'correlationId', None),
-        region=getattr(payload, 'region', None),
-        raw_error=payload.errorMessage,
-        analysis=analysis
-    )
+    return await _log_and_dispatch(payload, analysis, fp, tier, return_only)
+
+async def _log_and_dispatch(payload: FailureNotification, analysis: AnalysisResult, fp: str, tier: str, return_only: bool) -> dict:
+    # One context per request, shared by the loggers, incident grouping and channels
+    context = RequestContext(payload, analysis, fp, tier)
     settings = get_settings()
-    metadata = {
-        "pipelineName": payload.pipelineName,
-        "runId": payload.runId,
-        "activityName": payload.activityName,
-        "errorCode": payload.errorCode,
-        "environment": payload.environment,
-        "source": getattr(payload, 'source', None),
-        "resourceUrl": getattr(payload, 'resourceUrl', None),
-        "component": getattr(payload, 'component', None),
-        "severity": getattr(payload, 'severity', None),
-        "tags": getattr(payload, 'tags', None),
-        "correlationId": getattr(payload, 'correlationId', None),
-        "region": getattr(payload, 'region', None),
-    }
+    metrics.ANALYSES.inc(tier)
+    metadata = context.metadata()
     # Optional CSV logging
     csv_path = None
     try:
-        csv_path = csv_logger.append_analysis(notif_payload)
+        with metrics.stage("log"):
+            csv_path = csv_logger.append_analysis(context)
     except Exception:
         csv_path = None
     if csv_path:
         metadata["csv_path"] = csv_path
     if return_only or settings.disable_notifications:
         return {"status": "analysis_only", "metadata": metadata, "analysis": analysis}
+    grouper = incidents.get_grouper()
+    if grouper is not None:
+        # Repeats inside the window are held and later summarized in one digest
+        decision, incident = await grouper.aobserve(context)
+        metadata["incident_id"] = incident.id
+        grouper.start(send_digest, settings.incident_flush_interval_seconds)
+        if decision == "suppressed":
+            return {"status": "suppressed", "metadata": metadata, "analysis": analysis}
     try:
-        await notifier.dispatch_notifications(notif_payload)
-    except NotificationDispatchError as e:
-        raise HTTPException(status_code=502, detail=str(e))
-    return {"status": "sent", "metadata": metadata, "analysis": analysis}
+        with metrics.stage("dispatch"):
+            channels = await notifier.dispatch_notifications(context) or []
+    except BaseException:
+        if grouper is not None:
+            await grouper.release(incident)
+        raise
+    attempted = [c for c in channels if c.status != "skipped"]
+    failed = [c for c in attempted if c.status != "sent"]
+    if attempted and len(failed) == len(attempted):
+        if grouper is not None:
+            await grouper.release(incident)  # nobody was alerted: the retry or next repeat must alert again
+        raise HTTPException(status_code=502, detail="; ".join(f"{c.channel}: {c.detail}" for c in failed))
+    return {"status": "partial" if failed else "sent", "metadata": metadata, "analysis": analysis, "channels": channels}
+
+async def send_digest(payload: Payload) -> None:
+    await notifier.dispatch_notifications(payload)
+
+def _parse_batch(body: bytes, content_type: str) -> List[Union[FailureNotification, str]]:
+    # Each entry is either a validated notification or the validation error text for that item
+    if "ndjson" in content_type or "jsonl" in content_type:
+        raw_items: list = []
+        for line in body.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                raw_items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raw_items.append(e)
+    else:
+        try:
+            raw_items = json.loads(body or b"null")
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of failure notifications (or NDJSON)")
+    items: List[Union[FailureNotification, str]] = []
+    for raw in raw_items:
+        if isinstance(raw, Exception):
+            items.append(f"Invalid JSON line: {raw}")
+            continue
+        try:
+            items.append(FailureNotification.model_validate(raw))
+        except ValidationError as e:
+            items.append(str(e))
+    return items
+
+@router.post("/notify/batch")
+async def notify_batch(request: Request, return_only: bool = Query(False, description="If true, skip sending notifications and just return analyses."), auth=Depends(api_key_auth)):
+    """Accepts a JSON array or NDJSON of failure notifications; streams one NDJSON result line per item as it completes."""
+    settings = get_settings()
+    body = await request.body()
+    with metrics.stage("validate"):
+        items = _parse_batch(body, request.headers.get("content-type", ""))
+    if len(items) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.batch_max_items} items")
+
+    async def stream():
+        semaphore = asyncio.Semaphore(max(1, settings.batch_concurrency))
+        unique: Dict[str, asyncio.Task] = {}
+
+        async def analyze_unique(item: FailureNotification, fp: str) -> Tuple[AnalysisResult, str]:
+            async with semaphore:
+                return await triage.analyze(item, fp)
+
+        async def run_item(index: int, item: Union[FailureNotification, str], fp: Optional[str], first: bool) -> dict:
+            if isinstance(item, str):
+                return {"index": index, "status": "invalid", "detail": item}
+            try:
+                analysis, tier = await unique[fp]
+                result = await _log_and_dispatch(item, analysis, fp, tier if first else "coalesced", return_only)
+            except HTTPException as e:
+                return {"index": index, "status": "error", "detail": e.detail}
+            except Exception as e:
+                return {"index": index, "status": "error", "detail": str(e)}
+            return {"index": index, **result}
+
+        # Deduplicate by fingerprint so each distinct error is analyzed once per batch
+        runs = []
+        for index, item in enumerate(items):
+            fp, first = None, False
+            if not isinstance(item, str):
+                fp = fingerprint(item)
+                if fp not in unique:
+                    unique[fp] = asyncio.ensure_future(analyze_unique(item, fp))
+                    first = True
+            runs.append(asyncio.ensure_future(run_item(index, item, fp, first)))
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(runs):
+                line = await next_done
+                if line["status"] in ("invalid", "error"):
+                    failed += 1
+                yield json.dumps(jsonable_encoder(line)) + "\n"
+            yield json.dumps({"done": True, "total": len(items), "unique": len(unique), "failed": failed}) + "\n"
+        finally:
+            # Client went away mid-stream: don't leave analyses running for nobody
+            for task in [*runs, *unique.values()]:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@router.post("/notify/stream")
+async def notify_stream(
+    payload: FailureNotification,
+    return_only: bool = Query(False, description="If true, skip sending notifications and just return analysis."),
+    auth=Depends(api_key_auth),
+):
+    """Server-sent events: ``delta`` events carry ``simplified_error`` as the model writes it, then one
+    ``result`` event with the same body as ``POST /notify`` (or an ``error`` event)."""
+
+    async def stream():
+        metrics.bind_correlation_id(payload.correlationId)
+        fp = fingerprint(payload)
+        try:
+            local = await triage.resolve_local(payload, fp)
+            if local is not None:
+                analysis, tier = local
+            else:
+                analysis = None
+                async for kind, value in ai_analyzer.analyze_failure_stream(payload):
+                    if kind == "delta":
+                        yield _sse("delta", {"simplified_error": value})
+                    else:
+                        analysis = value
+                if analysis is None:
+                    raise AIAnalysisError("Analysis stream ended without a result")
+                await triage.remember(payload, fp, analysis)
+                tier = triage.tier_of(analysis)
+            yield _sse("result", await _log_and_dispatch(payload, analysis, fp, tier, return_only))
+        except HTTPException as e:
+            yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except AIAnalysisError as e:
+            yield _sse("error", {"status_code": 502, "detail": str(e)})
+
+    # Proxies (nginx, App Gateway) must not buffer or the first token arrives with the last
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _utc_iso(value: Optional[datetime]) -> Optional[str]:
+    # Stored timestamps are naive UTC ISO strings
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+@router.get("/analyses", tags=["analyses"])
+async def list_analyses(
+    pipelineName: Optional[str] = None,
+    errorCode: Optional[str] = None,
+    environment: Optional[str] = None,
+    source: Optional[str] = None,
+    severity: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+    runId: Optional[str] = None,
+    correlationId: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Inclusive lower bound (UTC)"),
+    until: Optional[datetime] = Query(None, description="Exclusive upper bound (UTC)"),
+    q: Optional[str] = Query(None, description="Full-text search over simplified and raw error (FTS5 syntax)"),
+    group_by: Optional[str] = Query(None, description="Return counts grouped by " + "|".join(analysis_store.GROUP_BY)),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_raw: bool = Query(False, description="Include the (redacted) raw error text"),
+    include_total: bool = Query(False, description="Also count all matching rows"),
+    auth=Depends(api_key_auth),
+):
+    store = analysis_store.get_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Analysis store disabled (set ENABLE_ANALYSIS_STORE=true)")
+    if group_by is not None and group_by not in analysis_store.GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(analysis_store.GROUP_BY)}")
+    filters = {
+        "pipelineName": pipelineName, "errorCode": errorCode, "environment": environment, "source": source,
+        "severity": severity, "fingerprint": fingerprint, "runId": runId, "correlationId": correlationId,
+    }
+    window = {
+        "since": _utc_iso(since),
+        "until": _utc_iso(until),
+        "q": q,
+    }
+    try:
+        page = await asyncio.to_thread(store.query, filters, limit=limit, cursor=cursor, include_raw=include_raw, **window)
+        if group_by:
+            page["group_by"] = group_by
+            page["counts"] = await asyncio.to_thread(store.aggregate, group_by, filters, **window)
+        if include_total:
+            page["total"] = await asyncio.to_thread(store.count, filters, **window)
+    except (ValueError, sqlite3.OperationalError) as e:
+        # Malformed cursor or FTS query syntax
+        raise HTTPException(status_code=400, detail=str(e))
+    return page
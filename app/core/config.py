@@ -10,8 +10,32 @@ class Settings(BaseModel):
     azure_openai_deployment: str = Field(default="", alias="AZURE_OPENAI_DEPLOYMENT")
     azure_openai_api_version: str = Field(default="2024-02-15-preview", alias="AZURE_OPENAI_API_VERSION")
     azure_openai_api_key: str = Field(default="", alias="AZURE_OPENAI_API_KEY")
+    # Optional JSON list of {"endpoint", "deployment", "api_key", "api_version", "rpm", "tpm"} for failover;
+    # missing fields fall back to the single-endpoint settings above
+    azure_openai_endpoints: str = Field(default="", alias="AZURE_OPENAI_ENDPOINTS")
+    openai_rpm: int = Field(default=0, alias="OPENAI_RPM")  # client-side limits per endpoint, 0 = off
+    openai_tpm: int = Field(default=0, alias="OPENAI_TPM")
+    openai_max_retries: int = Field(default=2, alias="OPENAI_MAX_RETRIES")
+    openai_backoff_base_seconds: float = Field(default=0.5, alias="OPENAI_BACKOFF_BASE_SECONDS")
+    openai_backoff_max_seconds: float = Field(default=8.0, alias="OPENAI_BACKOFF_MAX_SECONDS")
+    openai_max_wait_seconds: float = Field(default=10.0, alias="OPENAI_MAX_WAIT_SECONDS")
+    openai_breaker_failure_threshold: int = Field(default=5, alias="OPENAI_BREAKER_FAILURE_THRESHOLD")
+    openai_breaker_reset_seconds: float = Field(default=30.0, alias="OPENAI_BREAKER_RESET_SECONDS")
+    # Error text is condensed to about this many tokens before prompting (0 sends it verbatim)
+    prompt_error_max_tokens: int = Field(default=1500, alias="PROMPT_ERROR_MAX_TOKENS")
+    # Rule tier: known failures (error code and/or regex) are answered without calling the model
+    rules_enabled: bool = Field(default=True, alias="RULES_ENABLED")
+    rules_path: Optional[str] = Field(default=None, alias="RULES_PATH")
+    rules_min_confidence: float = Field(default=0.8, alias="RULES_MIN_CONFIDENCE")
+    # Similarity tier: reuse the nearest past model analysis (hashed n-gram TF-IDF, needs numpy)
+    similarity_enabled: bool = Field(default=False, alias="SIMILARITY_ENABLED")
+    similarity_index_dir: Optional[str] = Field(default=None, alias="SIMILARITY_INDEX_DIR")
+    similarity_threshold: float = Field(default=0.75, alias="SIMILARITY_THRESHOLD")
+    similarity_max_entries: int = Field(default=10000, alias="SIMILARITY_MAX_ENTRIES")
+    similarity_dimensions: int = Field(default=2048, alias="SIMILARITY_DIMENSIONS")
 
     teams_webhook_url: Optional[str] = Field(default=None, alias="TEAMS_WEBHOOK_URL")
+    generic_webhook_url: Optional[str] = Field(default=None, alias="GENERIC_WEBHOOK_URL")
 
     alert_emails: List[str] = Field(default_factory=list, alias="ALERT_EMAILS")
     sender_email: Optional[str] = Field(default=None, alias="SENDER_EMAIL")
@@ -19,9 +43,99 @@ class Settings(BaseModel):
     tenant_id: Optional[str] = Field(default=None, alias="AZURE_TENANT_ID")
     client_id: Optional[str] = Field(default=None, alias="AZURE_CLIENT_ID")
     client_secret: Optional[str] = Field(default=None, alias="AZURE_CLIENT_SECRET")
+    graph_token_refresh_margin_seconds: float = Field(default=300.0, alias="GRAPH_TOKEN_REFRESH_MARGIN_SECONDS")
     disable_notifications: bool = Field(default=False, alias="DISABLE_NOTIFICATIONS")
+    # Redaction: extra rules are one regex or a JSON list of regexes (group 1, if any, is the part masked)
+    redaction_extra_patterns: str = Field(default="", alias="REDACTION_EXTRA_PATTERNS")
+    redaction_max_chars: int = Field(default=100000, alias="REDACTION_MAX_CHARS")
+    # Alert grouping: first failure per (pipeline, errorCode, fingerprint) alerts, repeats roll into one digest
+    incident_grouping_enabled: bool = Field(default=False, alias="INCIDENT_GROUPING_ENABLED")
+    incident_window_seconds: float = Field(default=300.0, alias="INCIDENT_WINDOW_SECONDS")
+    incident_max_open: int = Field(default=5000, alias="INCIDENT_MAX_OPEN")
+    incident_sample_run_ids: int = Field(default=5, alias="INCIDENT_SAMPLE_RUN_IDS")
+    incident_flush_interval_seconds: float = Field(default=5.0, alias="INCIDENT_FLUSH_INTERVAL_SECONDS")
     enable_csv_logging: bool = Field(default=False, alias="ENABLE_CSV_LOGGING")
     csv_log_path: Optional[str] = Field(default=None, alias="CSV_LOG_PATH")
+    csv_batch_size: int = Field(default=500, alias="CSV_BATCH_SIZE")
+    csv_flush_interval_seconds: float = Field(default=1.0, alias="CSV_FLUSH_INTERVAL_SECONDS")
+    csv_fsync: str = Field(default="never", alias="CSV_FSYNC")
+    csv_fsync_interval_seconds: float = Field(default=1.0, alias="CSV_FSYNC_INTERVAL_SECONDS")
+    csv_rotate_max_bytes: int = Field(default=0, alias="CSV_ROTATE_MAX_BYTES")
+    csv_rotate_interval_seconds: float = Field(default=0, alias="CSV_ROTATE_INTERVAL_SECONDS")
+    csv_shard_per_worker: bool = Field(default=False, alias="CSV_SHARD_PER_WORKER")
+    csv_max_queue: int = Field(default=10000, alias="CSV_MAX_QUEUE")
+
+    # Indexed SQLite store backing GET /api/v1/analyses
+    enable_analysis_store: bool = Field(default=False, alias="ENABLE_ANALYSIS_STORE")
+    analysis_store_path: Optional[str] = Field(default=None, alias="ANALYSIS_STORE_PATH")
+    analysis_store_flush_max_rows: int = Field(default=200, alias="ANALYSIS_STORE_FLUSH_MAX_ROWS")
+    analysis_store_flush_interval_seconds: float = Field(default=1.0, alias="ANALYSIS_STORE_FLUSH_INTERVAL_SECONDS")
+
+    # Columnar (Parquet) analysis log, partitioned by date/environment/source
+    enable_parquet_logging: bool = Field(default=False, alias="ENABLE_PARQUET_LOGGING")
+    parquet_log_dir: Optional[str] = Field(default=None, alias="PARQUET_LOG_DIR")
+    parquet_flush_max_rows: int = Field(default=5000, alias="PARQUET_FLUSH_MAX_ROWS")
+    parquet_flush_interval_seconds: float = Field(default=60.0, alias="PARQUET_FLUSH_INTERVAL_SECONDS")
+    parquet_row_group_size: int = Field(default=65536, alias="PARQUET_ROW_GROUP_SIZE")
+    parquet_compression: str = Field(default="zstd", alias="PARQUET_COMPRESSION")
+
+    # ADLS / Blob append logging
+    enable_adls_logging: bool = Field(default=False, alias="ENABLE_ADLS_LOGGING")
+    adls_account_url: Optional[str] = Field(default=None, alias="ADLS_ACCOUNT_URL")
+    adls_container_name: Optional[str] = Field(default=None, alias="ADLS_CONTAINER_NAME")
+    adls_credential: Optional[str] = Field(default=None, alias="ADLS_CREDENTIAL")
+    adls_connection_string: Optional[str] = Field(default=None, alias="ADLS_CONNECTION_STRING")
+    adls_blob_name: str = Field(default="analysis_log/%Y/%m/%d/analysis_log.csv", alias="ADLS_BLOB_NAME")
+    adls_flush_max_rows: int = Field(default=200, alias="ADLS_FLUSH_MAX_ROWS")
+    adls_flush_max_bytes: int = Field(default=1024 * 1024, alias="ADLS_FLUSH_MAX_BYTES")
+    adls_flush_interval_seconds: float = Field(default=5.0, alias="ADLS_FLUSH_INTERVAL_SECONDS")
+    adls_max_buffered_rows: int = Field(default=10000, alias="ADLS_MAX_BUFFERED_ROWS")
+
+    # Shared outbound HTTP clients (one pool per upstream)
+    http2_enabled: bool = Field(default=True, alias="HTTP2_ENABLED")
+    http_max_connections: int = Field(default=100, alias="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(default=20, alias="HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    http_keepalive_expiry: float = Field(default=30.0, alias="HTTP_KEEPALIVE_EXPIRY")
+    http_connect_timeout: float = Field(default=5.0, alias="HTTP_CONNECT_TIMEOUT")
+    openai_timeout: float = Field(default=20.0, alias="OPENAI_TIMEOUT")
+    teams_timeout: float = Field(default=10.0, alias="TEAMS_TIMEOUT")
+    graph_timeout: float = Field(default=15.0, alias="GRAPH_TIMEOUT")
+    webhook_timeout: float = Field(default=10.0, alias="WEBHOOK_TIMEOUT")
+
+    # GET /metrics (Prometheus text format) and optional OpenTelemetry spans (needs opentelemetry-api)
+    metrics_enabled: bool = Field(default=True, alias="METRICS_ENABLED")
+    otel_tracing_enabled: bool = Field(default=False, alias="OTEL_TRACING_ENABLED")
+
+    # Analysis cache keyed on normalized error fingerprint
+    analysis_cache_enabled: bool = Field(default=True, alias="ANALYSIS_CACHE_ENABLED")
+    analysis_cache_max_entries: int = Field(default=2048, alias="ANALYSIS_CACHE_MAX_ENTRIES")
+    analysis_cache_ttl_seconds: float = Field(default=3600.0, alias="ANALYSIS_CACHE_TTL_SECONDS")
+    analysis_cache_db_path: Optional[str] = Field(default=None, alias="ANALYSIS_CACHE_DB_PATH")
+    singleflight_enabled: bool = Field(default=True, alias="SINGLEFLIGHT_ENABLED")
+    singleflight_timeout_seconds: float = Field(default=30.0, alias="SINGLEFLIGHT_TIMEOUT_SECONDS")
+
+    # State shared by worker processes (analysis cache tier, alert dedup, rate limits): memory, sqlite or redis
+    state_backend: str = Field(default="memory", alias="STATE_BACKEND")
+    state_sqlite_path: Optional[str] = Field(default=None, alias="STATE_SQLITE_PATH")
+    state_redis_url: str = Field(default="redis://localhost:6379/0", alias="STATE_REDIS_URL")
+    state_key_prefix: str = Field(default="errordecode:", alias="STATE_KEY_PREFIX")
+    notify_rpm: int = Field(default=0, alias="NOTIFY_RPM")  # sends per channel per minute, 0 = off
+
+    # POST /api/v1/notify/batch
+    batch_max_items: int = Field(default=1000, alias="BATCH_MAX_ITEMS")
+    batch_concurrency: int = Field(default=8, alias="BATCH_CONCURRENCY")
+
+    # Async ingest (POST /api/v1/notify?async_mode=true answers 202, workers do the rest)
+    ingest_async_default: bool = Field(default=False, alias="INGEST_ASYNC_DEFAULT")
+    ingest_queue_maxsize: int = Field(default=1000, alias="INGEST_QUEUE_MAXSIZE")
+    ingest_workers: int = Field(default=4, alias="INGEST_WORKERS")
+    ingest_db_path: Optional[str] = Field(default=None, alias="INGEST_DB_PATH")
+    ingest_max_tracked_jobs: int = Field(default=10000, alias="INGEST_MAX_TRACKED_JOBS")
+    ingest_retry_after_seconds: int = Field(default=5, alias="INGEST_RETRY_AFTER_SECONDS")
+
+    # Cold start: build clients, patterns and routes in the lifespan instead of on the first request
+    prewarm_enabled: bool = Field(default=True, alias="PREWARM_ENABLED")
+    startup_profile: bool = Field(default=False, alias="STARTUP_PROFILE")  # GET /diagnostics/startup
 
     class Config:
         populate_by_name = True
@@ -35,8 +149,9 @@ class Settings(BaseModel):
             return parts
         return v
 
+_ENV_NAMES = frozenset(field.alias for field in Settings.model_fields.values() if field.alias)
+
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    # Load from environment variables (dotenv can be loaded in main)
-    data = {k: v for k, v in os.environ.items()}
-    return Settings(**data)
+    # Load from environment variables (dotenv can be loaded in main); only the names Settings reads
+    return Settings(**{k: v for k, v in os.environ.items() if k in _ENV_NAMES})
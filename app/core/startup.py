@@ -0,0 +1,216 @@
+"""Cold-start timings and the prewarm hook.
+
+``app.main`` imports this first, so its import time approximates when the app started
+loading. ``mark()`` records milestones (imports done, prewarmed, first request served)
+and ``timings()`` reports them relative to process start. Profile a cold start with:
+
+    python -m app.core.startup --runs 5
+"""
+from __future__ import annotations
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_IMPORT_STARTED = time.perf_counter()
+_marks: Dict[str, float] = {}
+_prewarm_steps: Dict[str, Any] = {}
+
+def _process_started() -> Optional[float]:
+    # perf_counter() reading at process start, from /proc on Linux; None elsewhere
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    # /proc ticks are coarse (10 ms); never place process start after this import
+    return min(time.perf_counter() - age, _IMPORT_STARTED)
+
+_PROCESS_STARTED = _process_started()
+
+def mark(name: str) -> None:
+    """Records when ``name`` first happened; later calls are ignored."""
+    if name not in _marks:
+        _marks[name] = time.perf_counter()
+
+def timings() -> Dict[str, Any]:
+    """Seconds from process start (or, without /proc, from app import) to each milestone."""
+    origin = _PROCESS_STARTED if _PROCESS_STARTED is not None else _IMPORT_STARTED
+    body: Dict[str, Any] = {"origin": "process_start" if _PROCESS_STARTED is not None else "app_import"}
+    body["app_import_started_s"] = round(_IMPORT_STARTED - origin, 4)
+    for name, at in _marks.items():
+        body[f"{name}_s"] = round(at - origin, 4)
+    if _prewarm_steps:
+        body["prewarm_steps"] = dict(_prewarm_steps)
+    return body
+
+def _prewarm_plan(settings) -> List[Tuple[str, Callable[[], Any]]]:
+    # Imported here: this module stays cheap to import, and each SDK loads only with its feature on
+    import importlib
+    from app.services import (adls_logger, analysis_cache, analysis_store, csv_logger, http_clients, incidents,
+                              metrics, openai_pool, parquet_logger, redaction, rules, shared_state, similarity, singleflight)
+    plan: List[Tuple[str, Callable[[], Any]]] = [
+        ("redaction", redaction.get_engine),
+        ("rules", rules.get_classifier),
+        ("shared_state", shared_state.get_backend),  # before the components that use it
+        ("analysis_cache", analysis_cache.get_cache),
+        ("singleflight", singleflight.get_singleflight),
+        ("similarity", similarity.get_index),
+        ("incidents", incidents.get_grouper),
+        ("tracer", metrics.get_tracer),
+    ]
+    if openai_pool.endpoints_from_settings(settings):
+        plan += [("openai_pool", openai_pool.get_pool), ("client_openai", lambda: http_clients.get_client("openai"))]
+    if not settings.disable_notifications:
+        upstreams = {"teams": settings.teams_webhook_url, "webhook": settings.generic_webhook_url,
+                     "graph": settings.alert_emails and settings.sender_email}
+        plan += [(f"client_{name}", lambda name=name: http_clients.get_client(name)) for name, on in upstreams.items() if on]
+    if settings.enable_csv_logging:
+        plan.append(("csv_logger", csv_logger.get_csv_writer))
+    if settings.enable_analysis_store:
+        plan.append(("analysis_store", analysis_store.get_store))
+    if settings.enable_parquet_logging:
+        plan.append(("parquet_logger", lambda: (parquet_logger.get_parquet_logger(), importlib.import_module("pyarrow.parquet"))))
+    if settings.enable_adls_logging:
+        plan.append(("adls_logger", adls_logger.get_adls_logger))
+    return plan
+
+async def _warm_routes(app, router) -> None:
+    # FastAPI builds route dependants and body validators on first match. An unauthenticated
+    # request to each of the router's routes, sent past the middleware (so no metrics), fails
+    # validation before any handler runs but leaves that state built.
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        pass
+
+    for route in router.routes:
+        path = getattr(route, "path", "")
+        methods = sorted(getattr(route, "methods", None) or ())
+        if not methods:
+            continue
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": methods[0],
+                 "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+                 "headers": [], "client": None, "server": None, "app": app}
+        try:
+            await app.router(scope, receive, send)
+        except Exception:
+            pass  # the missing API key is the expected outcome
+
+async def prewarm(app=None, router=None) -> Dict[str, Any]:
+    """Builds settings, compiled patterns, clients and enabled sinks before the first request.
+
+    With ``app`` and one of its ``router``s, that router's routes are warmed too. Each step is timed into
+    ``timings()["prewarm_steps"]``; a failing step is recorded instead of failing startup,
+    and its object is then built on first use as before.
+    """
+    from app.core.config import get_settings
+    started = time.perf_counter()
+    settings = get_settings()
+    _prewarm_steps.clear()
+    _prewarm_steps["settings"] = round(time.perf_counter() - started, 4)
+    for name, step in _prewarm_plan(settings):
+        at = time.perf_counter()
+        try:
+            step()
+            _prewarm_steps[name] = round(time.perf_counter() - at, 4)
+        except Exception as e:
+            _prewarm_steps[name] = f"error: {e.__class__.__name__}: {e}"
+    if app is not None and router is not None:
+        at = time.perf_counter()
+        await _warm_routes(app, router)
+        _prewarm_steps["routes"] = round(time.perf_counter() - at, 4)
+    _prewarm_steps["total"] = round(time.perf_counter() - started, 4)
+    mark("prewarmed")
+    return dict(_prewarm_steps)
+
+class FirstRequestMiddleware:
+    """Marks ``first_request`` when the first HTTP response finishes (STARTUP_PROFILE only)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if "first_request" in _marks or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marking(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                mark("first_request")
+        await self.app(scope, receive, send_marking)
+
+def import_breakdown(output: str, top: int = 15) -> Dict[str, Any]:
+    """Self time per top-level package and the slowest ``app.*`` modules from ``-X importtime`` output."""
+    packages: Dict[str, int] = {}
+    app_modules: List[Tuple[str, int]] = []
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        total += int(self_us)
+        if package == "app":
+            app_modules.append((name, int(cumulative_us)))
+    ranked = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "total_ms": round(total / 1000, 1),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in ranked},
+        "app_modules_cumulative_ms": {name: round(us / 1000, 1) for name, us in sorted(app_modules, key=lambda kv: kv[1], reverse=True)[:top]},
+    }
+
+async def _child(path: str) -> Dict[str, Any]:
+    # One cold start: import the app, run its lifespan (prewarm) and serve one request in-process.
+    # Under ``python -m`` this file is __main__, so the app's marks live in the imported module.
+    import app.main as main
+    import httpx
+    from app.core import startup
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get(path)
+    body = startup.timings()
+    body["first_request_status"] = response.status_code
+    return body
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    import argparse
+    import json
+    import statistics
+    import subprocess
+    import sys
+    parser = argparse.ArgumentParser(description="Profile a cold start: import breakdown and time to first request.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes to time (median reported)")
+    parser.add_argument("--path", default="/healthz", help="GET path used as the first request")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        import asyncio
+        print(json.dumps(asyncio.run(_child(args.path))))
+        return {}
+    env = {**os.environ, "STARTUP_PROFILE": "true"}
+    traced = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, capture_output=True, text=True, check=True)
+    runs = []
+    for _ in range(max(1, args.runs)):
+        out = subprocess.run([sys.executable, "-m", "app.core.startup", "--child", "--path", args.path], env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    keys = [k for k, v in runs[0].items() if k.endswith("_s") and isinstance(v, (int, float))]
+    report = {
+        "imports": import_breakdown(traced.stderr, args.top),
+        "median_s": {k: round(statistics.median(r[k] for r in runs if k in r), 4) for k in keys},
+        "origin": runs[0]["origin"],
+        "prewarm_steps": runs[-1].get("prewarm_steps", {}),
+        "runs": len(runs),
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
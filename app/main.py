@@ -1,16 +1,46 @@
 from __future__ import annotations
+from app.core import startup  # first, so its import time marks when the app started loading
 import os
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
-from app.api.routes import router as notify_router
+from app.api.routes import process_notification, router as notify_router, send_digest
 from app.core.config import get_settings
+from app.services import adls_logger, analysis_cache, analysis_store, csv_logger, graph_auth, http_clients, incidents, ingest_queue, metrics, openai_pool, parquet_logger, redaction, rules, shared_state, similarity, singleflight
 import httpx
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv(override=True)
 
-app = FastAPI(title="ADF Monitor Agent", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    if settings.prewarm_enabled:
+        await startup.prewarm(app, notify_router)
+    if settings.ingest_db_path:
+        # Replay durable jobs that were still pending when the previous process stopped
+        ingest_queue.get_queue(process_notification).start()
+    startup.mark("ready")
+    yield
+    # Let queued notifications drain (durable jobs are replayed on next start) before closing clients
+    await ingest_queue.shutdown()
+    grouper = incidents.set_grouper(None)
+    if grouper is not None:
+        await grouper.close(send_digest)  # emit digests for still-open incidents
+    await adls_logger.shutdown()
+    await csv_logger.shutdown()
+    await parquet_logger.shutdown()
+    await analysis_store.shutdown()
+    await similarity.shutdown()
+    # Pooled upstream clients live for the app lifetime; close them on shutdown
+    await http_clients.close_clients()
+    cache = analysis_cache.set_cache(None)
+    if cache is not None:
+        cache.close()
+    await shared_state.shutdown()
+
+app = FastAPI(title="ADF Monitor Agent", version="0.1.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -18,12 +48,49 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+if get_settings().startup_profile:
+    app.add_middleware(startup.FirstRequestMiddleware)
 app.include_router(notify_router)
 
 @app.get("/healthz")
 async def health():
     s = get_settings()
-    return {"status": "ok", "openai_configured": bool(s.azure_openai_api_key and s.azure_openai_endpoint)}
+    body = {"status": "ok", "openai_configured": bool(openai_pool.endpoints_from_settings(s))}
+    cache = analysis_cache.get_cache()
+    if cache is not None:
+        body["analysis_cache"] = cache.stats()
+    classifier = rules.get_classifier()
+    if classifier is not None:
+        body["rules"] = classifier.stats()
+    index = similarity.current_index()
+    if index is not None:
+        body["similarity"] = index.stats()
+    pool = openai_pool.current_pool()
+    if pool is not None:
+        body["openai_endpoints"] = pool.stats()
+    flight = singleflight.get_singleflight()
+    if flight is not None:
+        body["singleflight"] = flight.stats()
+    queue = ingest_queue.current_queue()
+    if queue is not None:
+        body["ingest_queue"] = queue.stats()
+    grouper = incidents.current_grouper()
+    if grouper is not None:
+        body["incidents"] = grouper.stats()
+    tokens = graph_auth.current_provider()
+    if tokens is not None:
+        body["graph_token"] = tokens.stats()
+    backend = shared_state.current_backend()
+    if backend is not None:
+        body["shared_state"] = backend.stats()
+    return body
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    if not get_settings().metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics disabled (set METRICS_ENABLED=true)")
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/diagnostics/openai")
 async def diag_openai():
@@ -34,19 +101,45 @@ async def diag_openai():
     headers = {"api-key": s.azure_openai_api_key, "Content-Type": "application/json"}
     body = {"messages": [{"role": "user", "content": "Ping"}], "max_tokens": 1}
     try:
-        async with httpx.AsyncClient(timeout=8) as client:
-            r = await client.post(url, headers=headers, json=body)
+        r = await http_clients.get_client("openai").post(url, headers=headers, json=body, timeout=8)
         return {"configured": True, "status_code": r.status_code, "ok": r.status_code < 400, "body_start": r.text[:180]}
     except httpx.RequestError as ex:
         return {"configured": True, "network_error": str(ex.__class__.__name__), "detail": str(ex)}
 
+@app.get("/diagnostics/startup")
+async def diag_startup():
+    if not get_settings().startup_profile:
+        raise HTTPException(status_code=404, detail="Startup profile disabled (set STARTUP_PROFILE=true)")
+    return startup.timings()
+
 @app.post("/diagnostics/reload-settings")
 async def reload_settings():
     # Reload .env and clear cached settings so new env vars are applied
     load_dotenv(override=True)
     from app.core import config as cfg
     cfg.get_settings.cache_clear()  # type: ignore[attr-defined]
+    graph_auth.set_token_provider(None)  # tenant/client may have changed
+    redaction.set_engine(None)  # recompiled with any new REDACTION_* rules
+    rules.set_classifier(None)  # reloads RULES_PATH
+    await similarity.shutdown()  # reopened with new SIMILARITY_* settings
+    openai_pool.set_pool(None)  # endpoints, limits and breaker settings
+    # Components built on the state backend, then the backend itself (STATE_BACKEND may have changed)
+    grouper = incidents.set_grouper(None)
+    if grouper is not None:
+        await grouper.close(send_digest)
+    cache = analysis_cache.set_cache(None)
+    if cache is not None:
+        cache.close()
+    await shared_state.shutdown()
+    metrics.reset_tracer()  # OTEL_TRACING_ENABLED
+    # Log sinks pick up new paths/containers on next write
+    await csv_logger.shutdown()
+    await adls_logger.shutdown()
+    await parquet_logger.shutdown()
+    await analysis_store.shutdown()
     s = cfg.get_settings()
+    if s.prewarm_enabled:
+        await startup.prewarm()  # rebuild now rather than on the next request
     # Return a safe subset for quick verification
     return {
         "reloaded": True,
@@ -58,3 +151,5 @@ async def reload_settings():
 @app.exception_handler(Exception)
 async def unhandled(exc: Exception, request):  # type: ignore
     return JSONResponse(status_code=500, content={"detail": str(exc)})
+
+startup.mark("imported")
@@ -0,0 +1,77 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, Union
+from .schemas import AnalysisResult, FailureNotification, IncidentDigest, NotificationPayload
+
+# NotificationPayload fields that read straight through from the failure
+_FAILURE_FIELDS = frozenset(NotificationPayload.model_fields) - {"raw_error", "analysis", "fingerprint", "incident"}
+
+class RequestContext:
+    """One failure's state for the rest of the request, built once and shared by the loggers and channels.
+
+    Holds references to the validated ``FailureNotification`` and its ``AnalysisResult``
+    instead of copying every field into a ``NotificationPayload`` and again into a metadata
+    dict. It reads like a payload (``pipelineName`` ... ``region``, ``raw_error``, ``analysis``,
+    ``fingerprint``, ``incident``), so sinks and channels accept either. ``model_dump`` and
+    ``model_copy`` mirror the pydantic calls made on payloads; a real payload is only built
+    by ``to_payload()`` for the consumers that serialize one.
+    """
+
+    __slots__ = ("failure", "analysis", "fingerprint", "tier", "incident")
+
+    def __init__(self, failure: FailureNotification, analysis: AnalysisResult, fingerprint: Optional[str] = None,
+                 tier: Optional[str] = None, incident: Optional[IncidentDigest] = None):
+        self.failure = failure
+        self.analysis = analysis
+        self.fingerprint = fingerprint
+        self.tier = tier
+        self.incident = incident
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for names that aren't slots: the payload fields shared with the failure
+        if name in _FAILURE_FIELDS:
+            return getattr(self.failure, name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    @property
+    def raw_error(self) -> str:
+        return self.failure.errorMessage
+
+    def metadata(self) -> Dict[str, Any]:
+        """The ``metadata`` object of API responses (a new dict; callers add to it)."""
+        f = self.failure
+        return {
+            "pipelineName": f.pipelineName,
+            "runId": f.runId,
+            "activityName": f.activityName,
+            "errorCode": f.errorCode,
+            "environment": f.environment,
+            "source": f.source,
+            "resourceUrl": f.resourceUrl,
+            "component": f.component,
+            "severity": f.severity,
+            "tags": f.tags,
+            "correlationId": f.correlationId,
+            "region": f.region,
+            "fingerprint": self.fingerprint,
+            "analysis_tier": self.tier,
+        }
+
+    def to_payload(self) -> NotificationPayload:
+        # Fields were validated on the way in; model_construct keeps references instead of revalidating
+        values = {name: getattr(self.failure, name) for name in _FAILURE_FIELDS}
+        return NotificationPayload.model_construct(
+            **values, raw_error=self.failure.errorMessage, analysis=self.analysis,
+            fingerprint=self.fingerprint, incident=self.incident,
+        )
+
+    def model_dump(self, **kwargs: Any) -> Dict[str, Any]:
+        return self.to_payload().model_dump(**kwargs)
+
+    def model_copy(self, update: Optional[Dict[str, Any]] = None) -> "RequestContext":
+        copy = RequestContext(self.failure, self.analysis, self.fingerprint, self.tier, self.incident)
+        for name, value in (update or {}).items():
+            setattr(copy, name, value)
+        return copy
+
+# What loggers and notification channels accept
+Payload = Union[NotificationPayload, RequestContext]
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, PrivateAttr
 from typing import Optional, List
 from datetime import datetime
 
@@ -24,6 +24,20 @@ class AnalysisResult(BaseModel):
     probable_reason: str
     probable_fix: str
     confidence: float = 0.6
+    # Set by the analyzer when it had to return a local fallback instead of a model answer
+    _fallback_reason: Optional[str] = PrivateAttr(default=None)
+
+    @property
+    def fallback_reason(self) -> Optional[str]:
+        return self._fallback_reason
+
+class IncidentDigest(BaseModel):
+    id: str
+    occurrences: int
+    suppressed: int
+    first_seen: datetime
+    last_seen: datetime
+    sample_run_ids: List[str] = Field(default_factory=list)
 
 class NotificationPayload(BaseModel):
     pipelineName: str
@@ -40,3 +54,11 @@ class NotificationPayload(BaseModel):
     region: Optional[str]
     raw_error: str
     analysis: AnalysisResult
+    fingerprint: Optional[str] = None
+    incident: Optional[IncidentDigest] = None
+
+class ChannelResult(BaseModel):
+    channel: str
+    status: str = Field(description="sent|skipped|failed|timeout|rate_limited")
+    detail: Optional[str] = None
+    elapsed_ms: float = 0.0
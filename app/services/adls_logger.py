@@ -1,61 +1,199 @@
-from azure.storage.blob import BlobServiceClient
-import os
-from app.core.config import get_settings
-from app.models.schemas import NotificationPayload
+from __future__ import annotations
+import asyncio
 import csv
-from datetime import datetime
 import io
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.core.config import Settings, get_settings
+from app.models.context import Payload
+from app.services import metrics
+from app.services.csv_logger import CSV_HEADERS, build_row
+
+# Append Block payloads are capped at 4 MiB by the service
+MAX_APPEND_BLOCK_BYTES = 4 * 1024 * 1024
+
+def _encode_row(row: List[str]) -> bytes:
+    out = io.StringIO()
+    csv.writer(out).writerow(row)
+    return out.getvalue().encode('utf-8')
 
 class ADLSLogger:
-    def __init__(self):
-        settings = get_settings()
+    """Buffers CSV rows and appends them to date-partitioned append blobs in batches.
+
+    Each flush is one Append Block per blob, which is atomic on the service side, so
+    concurrent writers (other workers/replicas) interleave whole rows instead of
+    overwriting each other. The blob client is created once and reused.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None, client: Any = None):
+        settings = settings or get_settings()
         self.account_url = settings.adls_account_url
         self.container_name = settings.adls_container_name
         self.credential = settings.adls_credential
+        self.connection_string = settings.adls_connection_string
         self.blob_name = settings.adls_blob_name or "analysis_log.csv"
         self.enabled = getattr(settings, "enable_adls_logging", False)
-        if self.enabled:
-            self.client = BlobServiceClient(account_url=self.account_url, credential=self.credential)
+        self.flush_max_rows = max(1, settings.adls_flush_max_rows)
+        self.flush_max_bytes = min(settings.adls_flush_max_bytes, MAX_APPEND_BLOCK_BYTES)
+        self.flush_interval = settings.adls_flush_interval_seconds
+        self.max_buffered_rows = settings.adls_max_buffered_rows
+        self.client = client
+        if self.enabled and self.client is None:
+            self.client = self._build_client()
+        self._buffer: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._known_blobs: set = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.Task] = None
+        self.rows_written = 0
+        self.flushes = 0
+        self.dropped = 0
 
-    def append_analysis(self, payload: NotificationPayload):
+    def _build_client(self):
+        # Imported lazily so the Azure SDK only loads when ADLS logging is enabled
+        from azure.storage.blob import BlobServiceClient
+        if self.connection_string:
+            # Connection strings also cover local Azurite (UseDevelopmentStorage=true)
+            return BlobServiceClient.from_connection_string(self.connection_string)
+        return BlobServiceClient(account_url=self.account_url, credential=self.credential)
+
+    def resolve_blob_name(self, when: Optional[datetime] = None) -> str:
+        # strftime directives in ADLS_BLOB_NAME give date-partitioned blobs, e.g. analysis_log/%Y/%m/%d.csv
+        return (when or datetime.utcnow()).strftime(self.blob_name)
+
+    def append_analysis(self, payload: Payload) -> Optional[str]:
         if not self.enabled:
             return None
-        # Download existing blob or create new
+        blob_name = self.resolve_blob_name()
+        data = _encode_row(build_row(payload))
+        with self._lock:
+            self._buffer.setdefault(blob_name, []).append(data)
+            self._buffered_rows += 1
+            self._buffered_bytes += len(data)
+            full = self._buffered_rows >= self.flush_max_rows or self._buffered_bytes >= self.flush_max_bytes
+        self._schedule(full)
+        return blob_name
+
+    def _schedule(self, flush_now: bool) -> None:
         try:
-            blob_client = self.client.get_blob_client(container=self.container_name, blob=self.blob_name)
-            try:
-                stream = blob_client.download_blob().readall()
-                content = stream.decode('utf-8')
-            except Exception:
-                content = ''
-            output = io.StringIO()
-            writer = csv.writer(output)
-            if not content:
-                writer.writerow([
-                    "timestamp", "pipelineName", "runId", "activityName", "errorCode", "environment", "source", "component", "severity", "correlationId", "region", "resourceUrl", "simplified_error", "probable_reason", "probable_fix", "confidence"
-                ])
-            row = [
-                datetime.utcnow().isoformat(),
-                payload.pipelineName,
-                payload.runId or '',
-                payload.activityName or '',
-                payload.errorCode or '',
-                payload.environment or '',
-                getattr(payload, 'source', None) or '',
-                getattr(payload, 'component', None) or '',
-                getattr(payload, 'severity', None) or '',
-                getattr(payload, 'correlationId', None) or '',
-                getattr(payload, 'region', None) or '',
-                str(getattr(payload, 'resourceUrl', None) or ''),
-                (payload.analysis.simplified_error or '').replace('\n',' ')[:4000],
-                (payload.analysis.probable_reason or '').replace('\n',' ')[:4000],
-                (payload.analysis.probable_fix or '').replace('\n',' ')[:4000],
-                f"{getattr(payload.analysis, 'confidence', 0.0):.2f}",
-            ]
-            if content:
-                output.write(content)
-            writer.writerow(row)
-            blob_client.upload_blob(output.getvalue(), overwrite=True)
-            return self.blob_name
-        except Exception as e:
-            return None
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if flush_now:
+                self.flush_sync()  # no event loop (CLI/tests): write inline
+            return
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+        if flush_now and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffered_rows:
+                await self.flush()
+
+    async def flush(self) -> int:
+        # The SDK is synchronous; keep its network I/O off the event loop
+        return await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._buffer = self._buffer, OrderedDict()
+                self._buffered_rows = 0
+                self._buffered_bytes = 0
+            written = 0
+            for blob_name, rows in pending.items():
+                started = time.perf_counter()
+                try:
+                    self._append_rows(blob_name, rows)
+                    written += len(rows)
+                    status = "ok"
+                except Exception:
+                    self._requeue(blob_name, rows)
+                    status = "error"
+                metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, "adls", status)
+            if written:
+                self.flushes += 1
+                self.rows_written += written
+            return written
+
+    def _requeue(self, blob_name: str, rows: List[bytes]) -> None:
+        with self._lock:
+            current = self._buffer.setdefault(blob_name, [])
+            current[:0] = rows
+            self._buffered_rows += len(rows)
+            self._buffered_bytes += sum(len(r) for r in rows)
+            # Bound memory while the store is unreachable: shed the oldest rows
+            while self._buffered_rows > self.max_buffered_rows and self._buffer:
+                name, queued = next(iter(self._buffer.items()))
+                dropped = queued.pop(0)
+                self._buffered_rows -= 1
+                self._buffered_bytes -= len(dropped)
+                self.dropped += 1
+                if not queued:
+                    del self._buffer[name]
+
+    def _append_rows(self, blob_name: str, rows: List[bytes]) -> None:
+        blob_client = self.client.get_blob_client(container=self.container_name, blob=blob_name)
+        chunk = self._ensure_blob(blob_name, blob_client)
+        for data in rows:
+            if chunk and len(chunk) + len(data) > MAX_APPEND_BLOCK_BYTES:
+                blob_client.append_block(bytes(chunk))
+                chunk = bytearray()
+            chunk += data
+        if chunk:
+            blob_client.append_block(bytes(chunk))
+
+    def _ensure_blob(self, blob_name: str, blob_client) -> bytearray:
+        # Returns the header bytes when this writer created the blob
+        if blob_name in self._known_blobs:
+            return bytearray()
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError
+        try:
+            blob_client.create_append_blob(etag="*", match_condition=MatchConditions.IfMissing)
+            header = bytearray(_encode_row(CSV_HEADERS))
+        except ResourceExistsError:
+            header = bytearray()
+        self._known_blobs.add(blob_name)
+        return header
+
+    async def close(self) -> None:
+        for task in (self._timer, self._flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._buffered_rows:
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered_rows": self._buffered_rows,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+        }
+
+_logger: Optional[ADLSLogger] = None
+
+def get_adls_logger() -> ADLSLogger:
+    global _logger
+    if _logger is None:
+        _logger = ADLSLogger()
+    return _logger
+
+def set_adls_logger(logger: Optional[ADLSLogger]) -> Optional[ADLSLogger]:
+    global _logger
+    previous, _logger = _logger, logger
+    return previous
+
+async def shutdown() -> None:
+    logger = set_adls_logger(None)
+    if logger is not None:
+        await logger.close()
@@ -1,9 +1,14 @@
 from __future__ import annotations
 import json
-import httpx
-from .exceptions import AIAnalysisError
 import re
-from app.core.config import get_settings
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from .exceptions import AIAnalysisError, OpenAIUnavailableError
+from .condenser import condense, estimate_tokens
+from .openai_pool import endpoints_from_settings, get_pool
+from . import metrics, rules
+from .redaction import get_engine
+from app.core.config import Settings, get_settings
 from app.models.schemas import AnalysisResult, FailureNotification
 
 PROMPT_TEMPLATE = """You are an assistant that analyzes failure messages across Azure Data Factory, Synapse, Fabric, Databricks, Spark, Kubernetes, generic apps and services.
@@ -25,6 +30,7 @@ Resource URL: {resource_url}
 Raw Error: {error}
 """
 
+# Legacy per-rule patterns; the redaction engine folds these into its single compiled pass
 SENSITIVE_PATTERNS = [
     r"(?i)(password\s*=\s*)([^;\s]+)",
     r"(?i)(secret\s*=\s*)([^;\s]+)",
@@ -33,20 +39,75 @@ SENSITIVE_PATTERNS = [
 ]
 
 def redact(text: str) -> str:
-    t = text
-    for pat in SENSITIVE_PATTERNS:
-        t = re.sub(pat, r"\1***", t)
-    return t
+    return get_engine().redact(text)
 
-async def analyze_failure(data: FailureNotification) -> AnalysisResult:
-    settings = get_settings()
-    if not settings.azure_openai_api_key or not settings.azure_openai_endpoint:
-        # Fallback naive heuristic (no external call) for local testing
-        return AnalysisResult(
-            simplified_error=(data.errorMessage[:180] + '...') if len(data.errorMessage) > 180 else data.errorMessage,
-            probable_reason="Heuristic: check connectivity / credentials / resource limits.",
-            probable_fix="Validate linked service creds, network access, and activity configuration."
+# (probable_reason, probable_fix) for each way the upstream can be unavailable
+UNAVAILABLE_HINTS = {
+    "network_error": ("Network error calling Azure OpenAI.", "Verify endpoint DNS, firewall, and that deployment name is correct."),
+    "http_error": ("Azure OpenAI kept returning server errors.", "Check the deployment's health in the Azure portal; retries and failover were exhausted."),
+    "rate_limited": ("Azure OpenAI is throttling (429 or client-side RPM/TPM limit).", "Raise the deployment's TPM quota or OPENAI_RPM/OPENAI_TPM, or add another endpoint to AZURE_OPENAI_ENDPOINTS."),
+    "circuit_open": ("Azure OpenAI is marked unhealthy after repeated failures; skipped the call.", "Wait for the circuit to close (OPENAI_BREAKER_RESET_SECONDS) or check /healthz for endpoint state."),
+}
+
+def fallback_result(data: FailureNotification, kind: str, probable_reason: str, probable_fix: str) -> AnalysisResult:
+    result = AnalysisResult(
+        simplified_error=(data.errorMessage[:180] + '...') if len(data.errorMessage) > 180 else data.errorMessage,
+        probable_reason=probable_reason,
+        probable_fix=probable_fix
+    )
+    result._fallback_reason = kind
+    metrics.FALLBACKS.inc(kind)
+    return result
+
+def _not_configured(data: FailureNotification) -> AnalysisResult:
+    # No model configured: the closest rule (even below RULES_MIN_CONFIDENCE) beats a generic hint
+    classifier = rules.get_classifier()
+    rule = classifier.match(data) if classifier is not None else None
+    if rule is not None:
+        result = rule.result()
+        result._fallback_reason = "not_configured"
+        metrics.FALLBACKS.inc("not_configured")
+        return result
+    return fallback_result(
+        data,
+        "not_configured",
+        probable_reason="Heuristic: check connectivity / credentials / resource limits.",
+        probable_fix="Validate linked service creds, network access, and activity configuration."
+    )
+
+def _unavailable(data: FailureNotification, reason: str) -> AnalysisResult:
+    probable_reason, probable_fix = UNAVAILABLE_HINTS.get(reason, UNAVAILABLE_HINTS["http_error"])
+    return fallback_result(data, reason, probable_reason=probable_reason, probable_fix=probable_fix)
+
+def _http_error(data: FailureNotification, status_code: int) -> AnalysisResult:
+    # Provide structured fallback instead of raising to avoid 502 for operational issues
+    return fallback_result(
+        data,
+        "http_error",
+        probable_reason=f"Azure OpenAI HTTP {status_code} - possibly bad deployment or key.",
+        probable_fix="Confirm deployment name, rotate key, verify model availability in region."
+    )
+
+def _parse(data: FailureNotification, content: str) -> AnalysisResult:
+    try:
+        return AnalysisResult(**json.loads(content))
+    except Exception as e:  # noqa
+        return fallback_result(
+            data,
+            "parse_error",
+            probable_reason=f"Failed to parse AI response: {e.__class__.__name__}",
+            probable_fix="Inspect raw response, adjust response_format or deployment model."
         )
+
+def _request_body(data: FailureNotification, settings: Settings) -> Tuple[Dict[str, Any], int]:
+    error = data.errorMessage
+    # Condense first: redaction cuts at REDACTION_MAX_CHARS, which would lose the innermost
+    # "Caused by" at the tail of a large trace. Redacting the condensed text still masks what's sent.
+    if settings.prompt_error_max_tokens:
+        with metrics.stage("condense"):
+            error = condense(error, settings.prompt_error_max_tokens)
+    with metrics.stage("redact"):
+        error = redact(error)
     prompt = PROMPT_TEMPLATE.format(
         pipeline=data.pipelineName,
         activity=data.activityName or "N/A",
@@ -58,11 +119,9 @@ async def analyze_failure(data: FailureNotification) -> AnalysisResult:
         correlation_id=getattr(data, 'correlationId', None) or "N/A",
         region=getattr(data, 'region', None) or "N/A",
         resource_url=str(getattr(data, 'resourceUrl', None) or "N/A"),
-        error=redact(data.errorMessage)
+        error=error
     )
     # Minimal Azure OpenAI Chat Completions request using REST
-    url = f"{settings.azure_openai_endpoint}openai/deployments/{settings.azure_openai_deployment}/chat/completions?api-version={settings.azure_openai_api_version}"
-    headers = {"api-key": settings.azure_openai_api_key, "Content-Type": "application/json"}
     body = {
         "messages": [
             {"role": "system", "content": "You output only JSON."},
@@ -72,30 +131,105 @@ async def analyze_failure(data: FailureNotification) -> AnalysisResult:
         "max_tokens": 400,
         "response_format": {"type": "json_object"}
     }
+    return body, estimate_tokens(prompt) + body["max_tokens"]
+
+async def analyze_failure(data: FailureNotification) -> AnalysisResult:
+    settings = get_settings()
+    if not endpoints_from_settings(settings):
+        return _not_configured(data)
+    body, tokens = _request_body(data, settings)
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            r = await client.post(url, headers=headers, json=body)
-    except httpx.RequestError as ex:
-        # Network or DNS issue – fallback gracefully
-        return AnalysisResult(
-            simplified_error=(data.errorMessage[:180] + '...') if len(data.errorMessage) > 180 else data.errorMessage,
-            probable_reason=f"Network error calling Azure OpenAI: {ex.__class__.__name__}",
-            probable_fix="Verify endpoint DNS, firewall, and that deployment name is correct."
-        )
+        # Retries, failover, rate limits and circuit breaking happen inside the pool
+        with metrics.stage("llm"):
+            r = await get_pool(settings).chat(body, tokens=tokens)
+    except OpenAIUnavailableError as ex:
+        return _unavailable(data, ex.reason)
     if r.status_code >= 400:
-        # Provide structured fallback instead of raising to avoid 502 for operational issues
-        return AnalysisResult(
-            simplified_error=(data.errorMessage[:180] + '...') if len(data.errorMessage) > 180 else data.errorMessage,
-            probable_reason=f"Azure OpenAI HTTP {r.status_code} - possibly bad deployment or key.",
-            probable_fix="Confirm deployment name, rotate key, verify model availability in region."
-        )
+        return _http_error(data, r.status_code)
     try:
-        content = r.json()["choices"][0]["message"]["content"]
-        parsed = json.loads(content)
-        return AnalysisResult(**parsed)
+        response = r.json()
+        metrics.record_usage(response.get("usage"))
+        content = response["choices"][0]["message"]["content"]
     except Exception as e:  # noqa
-        return AnalysisResult(
-            simplified_error=(data.errorMessage[:180] + '...') if len(data.errorMessage) > 180 else data.errorMessage,
-            probable_reason=f"Failed to parse AI response: {e.__class__.__name__}",
-            probable_fix="Inspect raw response, adjust response_format or deployment model."
-        )
+        content = ""
+    return _parse(data, content)
+
+class _StringFieldStream:
+    """Decodes one JSON string field incrementally from streamed JSON text."""
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._pos: Optional[int] = None
+        self._done = False
+
+    def feed(self, piece: str) -> str:
+        self._buffer += piece
+        if self._done:
+            return ""
+        if self._pos is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+        buf, i, out = self._buffer, self._pos, []
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self._done = True
+                break
+            if c == "\\":
+                end = i + (6 if buf[i + 1:i + 2] == "u" else 2)
+                if end > len(buf):
+                    break  # escape split across chunks; wait for the rest
+                out.append(json.loads(f'"{buf[i:end]}"'))
+                i = end
+                continue
+            out.append(c)
+            i += 1
+        self._pos = i
+        return "".join(out)
+
+async def analyze_failure_stream(data: FailureNotification) -> AsyncIterator[Tuple[str, Any]]:
+    """Streams the analysis: ``("delta", text)`` for each new piece of ``simplified_error``, then ``("result", AnalysisResult)``."""
+    settings = get_settings()
+    if not endpoints_from_settings(settings):
+        yield "result", _not_configured(data)
+        return
+    body, tokens = _request_body(data, settings)
+    try:
+        with metrics.stage("llm"):  # until response headers; the body streams to the caller
+            r = await get_pool(settings).chat({**body, "stream": True}, tokens=tokens, stream=True)
+    except OpenAIUnavailableError as ex:
+        yield "result", _unavailable(data, ex.reason)
+        return
+    content: List[str] = []
+    field = _StringFieldStream("simplified_error")
+    try:
+        if r.status_code >= 400:
+            yield "result", _http_error(data, r.status_code)
+            return
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            chunk = line[5:].strip()
+            if chunk == "[DONE]":
+                break
+            try:
+                event = json.loads(chunk)
+            except ValueError:
+                continue
+            metrics.record_usage(event.get("usage"))  # only sent when the deployment streams usage
+            choices = event.get("choices") or []
+            piece = (choices[0].get("delta") or {}).get("content") if choices else None
+            if piece:
+                content.append(piece)
+                delta = field.feed(piece)
+                if delta:
+                    yield "delta", delta
+    except httpx.TransportError:
+        yield "result", _unavailable(data, "network_error")
+        return
+    finally:
+        await r.aclose()
+    yield "result", _parse(data, "".join(content))
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from app.core.config import get_settings
+from app.models.schemas import AnalysisResult
+from . import shared_state
+from .shared_state import StateBackend
+
+class AnalysisCache:
+    """Bounded LRU+TTL cache of analyses keyed on error fingerprint, with an optional SQLite tier.
+
+    With a ``shared`` backend, ``get_shared``/``put_shared`` add a tier other worker processes
+    read and write; they are async so its I/O stays off the event loop.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600.0, db_path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time, shared: Optional[StateBackend] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, AnalysisResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.shared = shared
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    @staticmethod
+    def _open_db(path: str) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS analysis_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return db
+
+    def get(self, key: str) -> Optional[AnalysisResult]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+                if row and row[1] > now:
+                    result = AnalysisResult.model_validate_json(row[0])
+                    self._store(key, result, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    async def get_shared(self, key: str) -> Optional[AnalysisResult]:
+        """The shared tier, after ``get`` missed; ``None`` without one, on a miss or if it's unavailable."""
+        if self.shared is None:
+            return None
+        value = await self.shared.run("get", f"analysis:{key}")
+        if value is None:
+            return None
+        expires_at, _, data = value.partition(" ")
+        result = AnalysisResult.model_validate_json(data)
+        with self._lock:
+            self._store(key, result, float(expires_at))
+            self.hits += 1
+            self.shared_hits += 1
+            self.misses -= 1  # counted by the local lookup that preceded this one
+        return result
+
+    async def put_shared(self, key: str, result: AnalysisResult) -> None:
+        if self.shared is not None:
+            # The expiry travels with the value so every worker drops it at the same time
+            expires_at = self._clock() + self.ttl_seconds
+            await self.shared.run("set", f"analysis:{key}", f"{expires_at} {result.model_dump_json()}", self.ttl_seconds)
+
+    def put(self, key: str, result: AnalysisResult) -> None:
+        expires_at = self._clock() + self.ttl_seconds
+        with self._lock:
+            self._store(key, result, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, result.model_dump_json(), expires_at),
+                )
+
+    def _store(self, key: str, result: AnalysisResult, expires_at: float) -> None:
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        now = self._clock()
+        with self._lock:
+            stale = [k for k, (exp, _) in self._entries.items() if exp <= now]
+            for k in stale:
+                del self._entries[k]
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (now,))
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_cache")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "persistent": self.db_path is not None,
+            "shared": self.shared is not None,
+        }
+
+_cache: Optional[AnalysisCache] = None
+
+def get_cache() -> Optional[AnalysisCache]:
+    global _cache
+    settings = get_settings()
+    if not settings.analysis_cache_enabled:
+        return None
+    if _cache is None:
+        _cache = AnalysisCache(
+            max_entries=settings.analysis_cache_max_entries,
+            ttl_seconds=settings.analysis_cache_ttl_seconds,
+            db_path=settings.analysis_cache_db_path or None,
+            shared=shared_state.shared_backend(),
+        )
+    return _cache
+
+def set_cache(cache: Optional[AnalysisCache]) -> Optional[AnalysisCache]:
+    global _cache
+    previous, _cache = _cache, cache
+    return previous
@@ -0,0 +1,227 @@
+from __future__ import annotations
+import asyncio
+import base64
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import Settings, get_settings
+from app.models.context import Payload
+from .ai_analyzer import redact
+
+COLUMNS = [
+    "ts", "pipelineName", "runId", "activityName", "errorCode", "environment", "source", "component",
+    "severity", "correlationId", "region", "resourceUrl", "fingerprint",
+    "simplified_error", "probable_reason", "probable_fix", "confidence", "raw_error",
+]
+FILTER_COLUMNS = ("pipelineName", "errorCode", "environment", "source", "severity", "fingerprint", "runId", "correlationId")
+GROUP_BY = {
+    "pipelineName": "pipelineName",
+    "errorCode": "errorCode",
+    "environment": "environment",
+    "source": "source",
+    "severity": "severity",
+    "fingerprint": "fingerprint",
+    "day": "substr(ts, 1, 10)",
+}
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS analyses (id INTEGER PRIMARY KEY, "
+    + ", ".join(f"{c} REAL" if c == "confidence" else f"{c} TEXT" for c in COLUMNS) + ")",
+    "CREATE INDEX IF NOT EXISTS ix_analyses_ts ON analyses(ts, id)",
+    "CREATE INDEX IF NOT EXISTS ix_analyses_pipeline ON analyses(pipelineName, ts)",
+    "CREATE INDEX IF NOT EXISTS ix_analyses_code ON analyses(errorCode, ts)",
+    "CREATE INDEX IF NOT EXISTS ix_analyses_env ON analyses(environment, ts)",
+    "CREATE INDEX IF NOT EXISTS ix_analyses_fingerprint ON analyses(fingerprint, ts)",
+]
+_FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(simplified_error, raw_error, content='analyses', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN "
+    "INSERT INTO analyses_fts(rowid, simplified_error, raw_error) VALUES (new.id, new.simplified_error, new.raw_error); END",
+    "CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN "
+    "INSERT INTO analyses_fts(analyses_fts, rowid, simplified_error, raw_error) VALUES ('delete', old.id, old.simplified_error, old.raw_error); END",
+]
+
+def _encode_cursor(ts: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts}|{row_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return ts, int(row_id)
+
+class AnalysisStore:
+    """SQLite store of analyses with per-column indexes and FTS5 over error text.
+
+    Inserts are buffered and committed in batches from a worker thread; reads use
+    a separate connection so WAL lets queries run alongside the writer.
+    """
+
+    def __init__(self, path: str, flush_max_rows: int = 200, flush_interval: float = 1.0, raw_error_max_chars: int = 16000):
+        self.path = path
+        self.flush_max_rows = max(1, flush_max_rows)
+        self.flush_interval = flush_interval
+        self.raw_error_max_chars = raw_error_max_chars
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._writer = self._connect()
+        for stmt in _SCHEMA:
+            self._writer.execute(stmt)
+        try:
+            for stmt in _FTS_SCHEMA:
+                self._writer.execute(stmt)
+            self.fts = True
+        except sqlite3.OperationalError:  # SQLite built without FTS5: fall back to LIKE
+            self.fts = False
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._buffer: List[Tuple[Any, ...]] = []
+        self._buffer_lock = threading.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _row(self, payload: Payload, ts: Optional[str] = None) -> Tuple[Any, ...]:
+        a = payload.analysis
+        return (
+            ts or datetime.utcnow().isoformat(),
+            payload.pipelineName, payload.runId, payload.activityName, payload.errorCode, payload.environment,
+            payload.source, payload.component, payload.severity, payload.correlationId, payload.region,
+            str(payload.resourceUrl) if payload.resourceUrl else None, payload.fingerprint,
+            a.simplified_error, a.probable_reason, a.probable_fix, a.confidence,
+            redact(payload.raw_error or "")[:self.raw_error_max_chars],
+        )
+
+    def append_analysis(self, payload: Payload, ts: Optional[str] = None) -> str:
+        with self._buffer_lock:
+            self._buffer.append(self._row(payload, ts))
+            full = len(self._buffer) >= self.flush_max_rows
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if full:
+                self.flush_sync()
+            return self.path
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+        if full and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(asyncio.to_thread(self.flush_sync))
+        return self.path
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffer:
+                await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self) -> int:
+        with self._write_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            placeholders = ", ".join("?" for _ in COLUMNS)
+            self._writer.execute("BEGIN")
+            try:
+                self._writer.executemany(f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+                self._writer.execute("COMMIT")
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+            self.rows_written += len(rows)
+            return len(rows)
+
+    def _where(self, filters: Dict[str, Any], since: Optional[str], until: Optional[str], q: Optional[str]) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column in FILTER_COLUMNS:
+            value = filters.get(column)
+            if value is not None:
+                clauses.append(f"a.{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("a.ts >= ?")
+            params.append(since)
+        if until:
+            clauses.append("a.ts < ?")
+            params.append(until)
+        if q:
+            if self.fts:
+                clauses.append("a.id IN (SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ?)")
+                params.append(q)
+            else:
+                clauses.append("(a.simplified_error LIKE ? OR a.raw_error LIKE ?)")
+                params.extend([f"%{q}%", f"%{q}%"])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, filters: Optional[Dict[str, Any]] = None, since: Optional[str] = None, until: Optional[str] = None, q: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None, include_raw: bool = False) -> Dict[str, Any]:
+        """Newest-first page of analyses; pass the returned ``next_cursor`` back for the next page (keyset pagination)."""
+        where, params = self._where(filters or {}, since, until, q)
+        if cursor:
+            ts, row_id = _decode_cursor(cursor)
+            where += (" AND " if where else " WHERE ") + "(a.ts < ? OR (a.ts = ? AND a.id < ?))"
+            params.extend([ts, ts, row_id])
+        columns = [c for c in COLUMNS if include_raw or c != "raw_error"]
+        sql = f"SELECT a.id, {', '.join('a.' + c for c in columns)} FROM analyses a{where} ORDER BY a.ts DESC, a.id DESC LIMIT ?"
+        with self._read_lock:
+            rows = self._reader.execute(sql, [*params, limit + 1]).fetchall()
+        items = [dict(r) for r in rows[:limit]]
+        next_cursor = _encode_cursor(items[-1]["ts"], items[-1]["id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def aggregate(self, group_by: str, filters: Optional[Dict[str, Any]] = None, since: Optional[str] = None, until: Optional[str] = None, q: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        expr = GROUP_BY[group_by]
+        where, params = self._where(filters or {}, since, until, q)
+        sql = (
+            f"SELECT {expr} AS key, COUNT(*) AS count, MIN(a.ts) AS first_seen, MAX(a.ts) AS last_seen "
+            f"FROM analyses a{where} GROUP BY key ORDER BY count DESC LIMIT ?"
+        )
+        with self._read_lock:
+            rows = self._reader.execute(sql, [*params, limit]).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, filters: Optional[Dict[str, Any]] = None, since: Optional[str] = None, until: Optional[str] = None, q: Optional[str] = None) -> int:
+        where, params = self._where(filters or {}, since, until, q)
+        with self._read_lock:
+            return self._reader.execute(f"SELECT COUNT(*) FROM analyses a{where}", params).fetchone()[0]
+
+    async def close(self) -> None:
+        for task in (self._timer, self._flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._buffer:
+            await asyncio.to_thread(self.flush_sync)
+        self._writer.close()
+        self._reader.close()
+
+_store: Optional[AnalysisStore] = None
+
+def get_store(settings: Optional[Settings] = None) -> Optional[AnalysisStore]:
+    global _store
+    settings = settings or get_settings()
+    if not settings.enable_analysis_store:
+        return None
+    if _store is None:
+        _store = AnalysisStore(
+            settings.analysis_store_path or os.path.join(os.getcwd(), "analysis_store.db"),
+            flush_max_rows=settings.analysis_store_flush_max_rows,
+            flush_interval=settings.analysis_store_flush_interval_seconds,
+        )
+    return _store
+
+def set_store(store: Optional[AnalysisStore]) -> Optional[AnalysisStore]:
+    global _store
+    previous, _store = _store, store
+    return previous
+
+async def shutdown() -> None:
+    store = set_store(None)
+    if store is not None:
+        await store.close()
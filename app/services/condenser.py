@@ -0,0 +1,162 @@
+from __future__ import annotations
+import json
+import re
+from typing import List, Optional, Tuple
+
+# Fields of an ADF/Synapse activity error object worth showing the model
+ADF_FIELDS = ("errorCode", "failureType", "target", "message")
+# Frames from these packages rarely explain a failure; the top frames of each block are kept regardless
+NOISE_PREFIXES = (
+    "java.", "javax.", "jdk.", "sun.", "scala.", "akka.", "io.netty.", "py4j.", "org.apache.hadoop.",
+    "org.apache.spark.scheduler.", "org.apache.spark.rdd.", "org.apache.spark.executor.", "org.apache.spark.util.",
+    "org.apache.spark.deploy.", "org.apache.spark.sql.execution.", "org.apache.spark.sql.catalyst.",
+    "com.databricks.backend.", "com.databricks.spark.util.",
+)
+KEEP_TOP_FRAMES = 2
+
+_FRAME = re.compile(r"^\s*(?:at\s+([\w$.<>/]+)[\s(]|\.\.\. \d+ more\s*$|File \"([^\"]+)\", line \d+)")
+_TOKEN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+def estimate_tokens(text: str, limit: Optional[int] = None) -> int:
+    """Rough BPE token count without a tokenizer download: letters split every ~5 chars, digits every 3, each symbol is one.
+
+    Counting stops once it passes ``limit``. Matches are walked by span rather than collected,
+    so a long trace costs no list of substrings.
+    """
+    count = 0
+    for match in _TOKEN.finditer(text):
+        start, end = match.span()
+        first = text[start]
+        if first.isalpha():
+            count += 1 + (end - start - 1) // 5
+        elif first.isdigit():
+            count += 1 + (end - start - 1) // 3
+        else:
+            count += 1
+        if limit is not None and count > limit:
+            break
+    return count
+
+def _is_noise(frame: str, python_file: Optional[str]) -> bool:
+    if python_file is not None:
+        return "site-packages" in python_file or "/lib/python" in python_file
+    return frame.startswith(NOISE_PREFIXES)
+
+def _adf_lines(text: str) -> Tuple[List[str], str]:
+    """Pulls the ADF error object out of ``text``; returns its key fields and the remaining text to condense."""
+    start = text.find("{")
+    if start < 0:
+        return [], text
+    try:
+        obj, end = json.JSONDecoder().raw_decode(text, start)
+    except ValueError:
+        return [], text
+    if not isinstance(obj, dict) or not any(k in obj for k in ADF_FIELDS):
+        return [], text
+    lines = [f"{k}: {obj[k]}" for k in ADF_FIELDS[:-1] if obj.get(k) not in (None, "")]
+    messages = [str(obj.get("message") or "")]
+    for detail in obj.get("details") or []:
+        if isinstance(detail, dict) and detail.get("message"):
+            messages.append(str(detail["message"]))
+    rest = "\n".join(p for p in (text[:start].strip(), *messages, text[end:].strip()) if p)
+    return lines, rest
+
+def _rank_lines(text: str) -> List[Tuple[str, int]]:
+    """Splits ``text`` into ``(line, rank)`` pairs; rank 0 lines are never dropped, frames rank by depth in their block.
+
+    Frames already shown and framework noise are dropped here, runs of identical lines are
+    counted, and exception lines seen before are shortened to droppable "(repeated)" markers.
+    """
+    ranked: List[Tuple[str, int]] = []
+    seen: set = set()
+    depth = 0
+    omitted = 0
+    previous: Optional[str] = None
+    repeats = 0
+    in_python_frame = False
+    repeated_block = False
+
+    def flush_omitted() -> None:
+        nonlocal omitted
+        if omitted:
+            ranked.append((f"\t... {omitted} frames omitted", depth + 1))
+            omitted = 0
+
+    for line in text.splitlines():
+        if line == previous:
+            repeats += 1
+            continue
+        if repeats:
+            ranked.append((f"\t(previous line repeated {repeats} more times)", 0))
+            repeats = 0
+        previous = line
+        if not line.strip():
+            continue
+        match = _FRAME.match(line)
+        if match is None and in_python_frame and line.startswith((" ", "\t")):
+            # Source line under a Python "File ..." frame: attach it to the frame if that was kept
+            in_python_frame = False
+            if not omitted and ranked and ranked[-1][1]:
+                ranked[-1] = (f"{ranked[-1][0]}: {line.strip()}", ranked[-1][1])
+            continue
+        in_python_frame = match is not None and match.group(2) is not None
+        key = line.strip()
+        if match is None:
+            flush_omitted()
+            depth = 0
+            repeated_block = key in seen
+            if repeated_block:
+                # Same exception again (retried tasks): show a short marker and skip its frames
+                ranked.append((f"(repeated) {key[:120]}", 1))
+            else:
+                seen.add(key)
+                ranked.append((line.rstrip(), 0))
+            continue
+        frame, python_file = match.group(1) or "", match.group(2)
+        if repeated_block or key in seen or (depth >= KEEP_TOP_FRAMES and _is_noise(frame, python_file)) or not (frame or python_file):
+            omitted += 1
+            continue
+        seen.add(key)
+        flush_omitted()
+        depth += 1
+        ranked.append((line.rstrip(), depth))
+    flush_omitted()
+    if repeats:
+        ranked.append((f"\t(previous line repeated {repeats} more times)", 0))
+    return ranked
+
+def _truncate_middle(text: str, max_tokens: int) -> str:
+    # Keep the head (outermost error) and the tail (innermost "Caused by"), cutting on line boundaries
+    if estimate_tokens(text, max_tokens) <= max_tokens:
+        return text
+    chars = max_tokens * 3
+    head = text[:chars * 2 // 5]
+    tail = text[-(chars * 3 // 5):]
+    # Snap to a line boundary unless that would throw away most of a long single-line message
+    if head.rfind("\n") > len(head) * 4 // 5:
+        head = head[:head.rfind("\n")]
+    if 0 <= tail.find("\n") < len(tail) // 5:
+        tail = tail[tail.find("\n") + 1:]
+    return f"{head}\n... [{len(text) - len(head) - len(tail)} chars omitted] ...\n{tail}"
+
+def condense(text: str, max_tokens: int = 1500) -> str:
+    """Shrinks an error message for the prompt: ADF error fields first, every exception and
+    "Caused by" line, a few frames per block, and at most ``max_tokens`` (estimated)."""
+    if len(text) <= max_tokens or estimate_tokens(text, max_tokens) <= max_tokens:
+        return text
+    fields, rest = _adf_lines(text)
+    ranked = [(line, 0) for line in fields] + _rank_lines(rest)
+    costs = [estimate_tokens(line) + 1 for line, _ in ranked]
+    total = sum(costs)
+    if total > max_tokens:
+        # Drop the deepest frames first, latest blocks before earlier ones at the same depth
+        order = sorted((i for i, (_, rank) in enumerate(ranked) if rank), key=lambda i: (-ranked[i][1], -i))
+        dropped: set = set()
+        for i in order:
+            if total <= max_tokens:
+                break
+            dropped.add(i)
+            total -= costs[i]
+        if dropped:
+            ranked = [r for i, r in enumerate(ranked) if i not in dropped]
+    return _truncate_middle("\n".join(line for line, _ in ranked), max_tokens)
@@ -1,10 +1,17 @@
 from __future__ import annotations
+import asyncio
 import csv
 import os
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, TextIO
 from app.core.config import get_settings
-from app.models.schemas import NotificationPayload
+from app.models.context import Payload
+
+try:  # POSIX advisory locks keep rows from several uvicorn workers from interleaving
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: use CSV_SHARD_PER_WORKER instead
+    fcntl = None
 
 CSV_HEADERS = [
     "timestamp",
@@ -25,35 +32,8 @@ CSV_HEADERS = [
     "confidence",
 ]
 
-def _resolve_path() -> str:
-    settings = get_settings()
-    return settings.csv_log_path or os.path.join(os.getcwd(), "analysis_log.csv")
-
-def append_analysis(payload: NotificationPayload) -> Optional[str]:
-    # Wrapper to choose between CSV and ADLS logging
-    settings = get_settings()
-    if getattr(settings, "enable_adls_logging", False):
-        from app.services.adls_logger import ADLSLogger
-        logger = ADLSLogger()
-        return logger.append_analysis(payload)
-    elif getattr(settings, "enable_csv_logging", False):
-        path = _resolve_path()
-        try:
-            log_payload(payload)
-            return path
-        except Exception:
-            return None
-    else:
-        return None
-
-def log_payload(payload: NotificationPayload) -> None:
-    settings = get_settings()
-    if not getattr(settings, "enable_csv_logging", False):
-        return
-    path = _resolve_path()
-    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
-    file_exists = os.path.isfile(path)
-    row = [
+def build_row(payload: Payload) -> List[str]:
+    return [
         datetime.utcnow().isoformat(),
         payload.pipelineName,
         payload.runId or '',
@@ -71,8 +51,234 @@ def log_payload(payload: NotificationPayload) -> None:
         (payload.analysis.probable_fix or '').replace('\n',' ')[:4000],
         f"{getattr(payload.analysis, 'confidence', 0.0):.2f}",
     ]
+
+def _resolve_path() -> str:
+    settings = get_settings()
+    path = settings.csv_log_path or os.path.join(os.getcwd(), "analysis_log.csv")
+    if settings.csv_shard_per_worker:
+        stem, ext = os.path.splitext(path)
+        path = f"{stem}.{os.getpid()}{ext or '.csv'}"
+    return path
+
+def append_analysis(payload: Payload) -> Optional[str]:
+    # Wrapper to choose between CSV and ADLS logging; the indexed store and Parquet sink run alongside either
+    settings = get_settings()
+    parquet_path = None
+    if getattr(settings, "enable_analysis_store", False):
+        from app.services.analysis_store import get_store
+        try:
+            get_store(settings).append_analysis(payload)
+        except Exception:
+            pass
+    if getattr(settings, "enable_parquet_logging", False):
+        from app.services.parquet_logger import get_parquet_logger
+        try:
+            parquet_path = get_parquet_logger().append_analysis(payload)
+        except Exception:
+            parquet_path = None
+    if getattr(settings, "enable_adls_logging", False):
+        from app.services.adls_logger import get_adls_logger
+        return get_adls_logger().append_analysis(payload)
+    elif getattr(settings, "enable_csv_logging", False):
+        path = _resolve_path()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (CLI/scripts): write synchronously
+            try:
+                log_payload(payload)
+                return path
+            except Exception:
+                return None
+        return path if get_csv_writer().submit(build_row(payload)) else None
+    else:
+        return parquet_path
+
+def log_payload(payload: Payload) -> None:
+    settings = get_settings()
+    if not getattr(settings, "enable_csv_logging", False):
+        return
+    path = _resolve_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    file_exists = os.path.isfile(path)
+    row = build_row(payload)
     with open(path, 'a', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
         if not file_exists or os.path.getsize(path) == 0:
             writer.writerow(CSV_HEADERS)
         writer.writerow(row)
+
+class CsvLogWriter:
+    """Background CSV writer: rows are queued by the request path and written in
+    batches from a worker thread through one long-lived file handle.
+
+    ``fsync`` is one of ``never`` (OS decides), ``batch`` (after every batch) or
+    ``interval`` (at most every ``fsync_interval`` seconds). The file is rotated to
+    ``<name>.<utc timestamp><ext>`` when it exceeds ``rotate_max_bytes`` or is older
+    than ``rotate_interval`` seconds (0 disables either rule).
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0, fsync: str = "never", fsync_interval: float = 1.0, rotate_max_bytes: int = 0, rotate_interval: float = 0, max_queue: int = 10000):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.rotate_max_bytes = rotate_max_bytes
+        self.rotate_interval = rotate_interval
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fh: Optional[TextIO] = None
+        self._opened_at = 0.0
+        self._last_fsync = 0.0
+        self.rows_written = 0
+        self.batches = 0
+        self.rotations = 0
+        self.dropped = 0
+
+    def submit(self, row: List[str]) -> bool:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = loop.create_task(self._run())
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            rows = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        rows.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            try:
+                await asyncio.to_thread(self.write_batch, rows)
+            except Exception:
+                self.dropped += len(rows)
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def _open(self) -> TextIO:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._fh = open(self.path, 'a', newline='', encoding='utf-8')
+        self._opened_at = time.time()
+        return self._fh
+
+    def _current_handle(self) -> TextIO:
+        fh = self._fh
+        if fh is None:
+            return self._open()
+        # Another process may have rotated the file away from under this handle
+        try:
+            stale = os.stat(self.path).st_ino != os.fstat(fh.fileno()).st_ino
+        except FileNotFoundError:
+            stale = True
+        if stale:
+            fh.close()
+            return self._open()
+        return fh
+
+    def _should_rotate(self, fh: TextIO) -> bool:
+        size = fh.tell()
+        if size == 0:
+            return False
+        if self.rotate_max_bytes and size >= self.rotate_max_bytes:
+            return True
+        return bool(self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval)
+
+    def _rotate(self, fh: TextIO) -> TextIO:
+        stem, ext = os.path.splitext(self.path)
+        fh.close()
+        os.replace(self.path, f"{stem}.{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}{ext}")
+        self.rotations += 1
+        return self._open()
+
+    def write_batch(self, rows: List[List[str]]) -> None:
+        fh = self._current_handle()
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            fh.seek(0, os.SEEK_END)
+            if self._should_rotate(fh):
+                locked = fh
+                fh = self._rotate(fh)  # closing the old handle releases its lock
+                if fcntl is not None and fh is not locked:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            writer = csv.writer(fh)
+            if fh.tell() == 0:
+                writer.writerow(CSV_HEADERS)
+            writer.writerows(rows)
+            fh.flush()
+            now = time.monotonic()
+            if self.fsync == "batch" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(fh.fileno())
+                self._last_fsync = now
+        finally:
+            if fcntl is not None and not fh.closed:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        self.rows_written += len(rows)
+        self.batches += 1
+
+    async def close(self) -> None:
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            if self._queue is not None and not self._task.done():
+                await self._queue.join()
+            self._task.cancel()
+        self._task = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "rotations": self.rotations,
+            "dropped": self.dropped,
+        }
+
+_writer: Optional[CsvLogWriter] = None
+
+def get_csv_writer() -> CsvLogWriter:
+    global _writer
+    if _writer is None:
+        settings = get_settings()
+        _writer = CsvLogWriter(
+            _resolve_path(),
+            batch_size=settings.csv_batch_size,
+            flush_interval=settings.csv_flush_interval_seconds,
+            fsync=settings.csv_fsync,
+            fsync_interval=settings.csv_fsync_interval_seconds,
+            rotate_max_bytes=settings.csv_rotate_max_bytes,
+            rotate_interval=settings.csv_rotate_interval_seconds,
+            max_queue=settings.csv_max_queue,
+        )
+    return _writer
+
+def set_csv_writer(writer: Optional[CsvLogWriter]) -> Optional[CsvLogWriter]:
+    global _writer
+    previous, _writer = _writer, writer
+    return previous
+
+async def shutdown() -> None:
+    writer = set_csv_writer(None)
+    if writer is not None:
+        await writer.close()
@@ -3,3 +3,13 @@ class AIAnalysisError(Exception):
 
 class NotificationDispatchError(Exception):
     """Raised when delivery to a channel fails."""
+
+class IngestQueueFullError(Exception):
+    """Raised when the async ingest queue cannot accept more work."""
+
+class OpenAIUnavailableError(Exception):
+    """Raised when no Azure OpenAI endpoint could serve a call (circuit open, throttled, or failing)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
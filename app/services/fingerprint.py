@@ -0,0 +1,33 @@
+from __future__ import annotations
+import hashlib
+import re
+from app.models.schemas import FailureNotification
+from .ai_analyzer import redact
+
+# Order matters: specific shapes (GUIDs, timestamps, URLs/paths) are replaced
+# before the generic number rule would chop them into pieces.
+_NORMALIZERS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<guid>"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b\d{1,2}/\d{1,2}/\d{2,4}(?: \d{1,2}:\d{2}(?::\d{2})?(?: ?[AP]M)?)?", re.IGNORECASE), "<ts>"),
+    (re.compile(r"\b[a-z][a-z0-9+.-]*://[^\s'\"<>]+", re.IGNORECASE), "<path>"),
+    (re.compile(r"(?<![\w.])[A-Za-z]:\\[^\s'\"<>]*"), "<path>"),
+    (re.compile(r"(?<![\w.])(?:/[\w.@%+=:,-]+){2,}/?"), "<path>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<hex>"),
+    (re.compile(r"\b[0-9a-fA-F]{16,}\b"), "<hex>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+]
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_error(text: str) -> str:
+    # Strip run-specific noise so repeats of the same failure collapse to one form
+    t = redact(text or "")
+    for pattern, repl in _NORMALIZERS:
+        t = pattern.sub(repl, t)
+    return _WHITESPACE.sub(" ", t).strip().lower()
+
+def fingerprint(data: FailureNotification) -> str:
+    # Same digest as hashing the parts joined by \x1f, without building the joined copy
+    h = hashlib.blake2b(f"{data.pipelineName or ''}\x1f{data.activityName or ''}\x1f{data.errorCode or ''}\x1f".encode("utf-8"), digest_size=16)
+    h.update(normalize_error(data.errorMessage).encode("utf-8"))
+    return h.hexdigest()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import get_settings
+from .exceptions import NotificationDispatchError
+from .http_clients import get_client
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+async def fetch_client_credentials_token() -> Tuple[str, float]:
+    # Client credentials grant against the MS identity platform; returns (token, expires_in seconds)
+    settings = get_settings()
+    token_url = f"https://login.microsoftonline.com/{settings.tenant_id}/oauth2/v2.0/token"
+    data = {
+        "client_id": settings.client_id,
+        "client_secret": settings.client_secret,
+        "scope": GRAPH_SCOPE,
+        "grant_type": "client_credentials"
+    }
+    token_resp = await get_client("graph").post(token_url, data=data)
+    if token_resp.status_code >= 400:
+        raise NotificationDispatchError(f"Auth fail: {token_resp.text}")
+    body = token_resp.json()
+    access_token = body.get("access_token")
+    if not access_token:
+        raise NotificationDispatchError("No access token returned")
+    return access_token, float(body.get("expires_in") or 3599)
+
+class GraphTokenProvider:
+    """Process-wide Graph token cache.
+
+    Tokens are reused until ``refresh_margin`` seconds before expiry; inside that
+    window callers keep getting the still-valid token while one background task
+    refreshes it. Expired/missing tokens are fetched once for all concurrent callers.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Tuple[str, float]]] = fetch_client_credentials_token, refresh_margin: float = 300.0, clock: Callable[[], float] = time.time):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._token: Optional[str] = None
+        self._acquired_at = 0.0
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.fetches = 0
+        self.failures = 0
+
+    async def get_token(self) -> str:
+        now = self._clock()
+        if self._token and now < self._expires_at:
+            if now >= self._refresh_at:
+                self._refresh()  # proactive, non-blocking
+            return self._token
+        return await asyncio.shield(self._refresh())
+
+    def _refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._do_refresh())
+            self._refresh_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._refresh_task
+
+    async def _do_refresh(self) -> str:
+        try:
+            token, expires_in = await self._fetch()
+        except Exception:
+            self.failures += 1
+            raise
+        self.fetches += 1
+        self._token = token
+        self._acquired_at = self._clock()
+        self._expires_at = self._acquired_at + expires_in
+        # Short-lived tokens would otherwise sit permanently inside the margin
+        self._refresh_at = self._expires_at - min(self.refresh_margin, expires_in / 2)
+        return token
+
+    def invalidate(self) -> None:
+        self._token = None
+        self._expires_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        cached = bool(self._token) and now < self._expires_at
+        return {
+            "cached": cached,
+            "age_seconds": round(now - self._acquired_at, 1) if cached else None,
+            "expires_in_seconds": round(self._expires_at - now, 1) if cached else None,
+            "fetches": self.fetches,
+            "failures": self.failures,
+        }
+
+_provider: Optional[GraphTokenProvider] = None
+
+def get_token_provider() -> GraphTokenProvider:
+    global _provider
+    if _provider is None:
+        _provider = GraphTokenProvider(refresh_margin=get_settings().graph_token_refresh_margin_seconds)
+    return _provider
+
+def current_provider() -> Optional[GraphTokenProvider]:
+    return _provider
+
+def set_token_provider(provider: Optional[GraphTokenProvider]) -> Optional[GraphTokenProvider]:
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
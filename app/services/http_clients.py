@@ -0,0 +1,86 @@
+from __future__ import annotations
+import importlib.util
+from typing import Dict, Optional
+import httpx
+from app.core.config import Settings, get_settings
+from . import metrics
+
+# One pooled client per upstream so keep-alive connections (and TLS sessions)
+# are reused across requests instead of paying a handshake per failure.
+UPSTREAMS = ("openai", "teams", "graph", "webhook")
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+def _timeout_for(name: str, settings: Settings) -> float:
+    return {
+        "openai": settings.openai_timeout,
+        "teams": settings.teams_timeout,
+        "graph": settings.graph_timeout,
+        "webhook": settings.webhook_timeout,
+    }.get(name, settings.openai_timeout)
+
+class ClientRegistry:
+    def __init__(self, settings: Optional[Settings] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._settings = settings
+        self._transport = transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings or get_settings()
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        s = self.settings
+        kwargs = {
+            "timeout": httpx.Timeout(_timeout_for(name, s), connect=s.http_connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=s.http_max_connections,
+                max_keepalive_connections=s.http_max_keepalive_connections,
+                keepalive_expiry=s.http_keepalive_expiry,
+            ),
+        }
+        if self._transport is not None:
+            kwargs["transport"] = self._transport
+        else:
+            # HTTP/2 needs the optional 'h2' package; fall back to HTTP/1.1 without it
+            kwargs["http2"] = bool(s.http2_enabled and _http2_available())
+        # Every outbound call is timed per upstream and status for /metrics
+        return metrics.InstrumentedClient(name, **kwargs)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build(name)
+            self._clients[name] = client
+        return client
+
+    def open_clients(self) -> Dict[str, httpx.AsyncClient]:
+        return {k: c for k, c in self._clients.items() if not c.is_closed}
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            if not client.is_closed:
+                await client.aclose()
+
+_registry: Optional[ClientRegistry] = None
+
+def get_registry() -> ClientRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry()
+    return _registry
+
+def set_registry(registry: Optional[ClientRegistry]) -> Optional[ClientRegistry]:
+    # Swap the process-wide registry (e.g. one built on httpx.MockTransport in tests); returns the previous one
+    global _registry
+    previous, _registry = _registry, registry
+    return previous
+
+def get_client(name: str) -> httpx.AsyncClient:
+    return get_registry().get(name)
+
+async def close_clients() -> None:
+    if _registry is not None:
+        await _registry.aclose()
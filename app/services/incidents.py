@@ -0,0 +1,245 @@
+from __future__ import annotations
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.config import get_settings
+from app.models.context import Payload, RequestContext
+from app.models.schemas import IncidentDigest
+from . import shared_state
+from .shared_state import StateBackend
+
+IncidentKey = Tuple[str, str, str]
+# The digest email shows at most this much of the raw error; open incidents keep no more
+DIGEST_ERROR_CHARS = 4000
+
+def _trimmed(payload: Payload) -> Payload:
+    # Open incidents are bounded by count, so each must not pin a full-size trace
+    error = payload.raw_error or ""
+    if len(error) <= DIGEST_ERROR_CHARS:
+        return payload
+    if isinstance(payload, RequestContext):
+        return payload.model_copy(update={"failure": payload.failure.model_copy(update={"errorMessage": error[:DIGEST_ERROR_CHARS]})})
+    return payload.model_copy(update={"raw_error": error[:DIGEST_ERROR_CHARS]})
+
+class Incident:
+    __slots__ = ("id", "key", "payload", "first_seen", "last_seen", "window_end", "occurrences", "run_ids")
+
+    def __init__(self, key: IncidentKey, payload: Payload, now: float, window: float, sample_size: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.payload = _trimmed(payload)
+        self.first_seen = now
+        self.last_seen = now
+        self.window_end = now + window
+        self.occurrences = 1
+        self.run_ids: Deque[str] = deque(maxlen=sample_size)
+        if payload.runId:
+            self.run_ids.append(payload.runId)
+
+    @property
+    def suppressed(self) -> int:
+        return self.occurrences - 1
+
+    def digest_payload(self) -> Payload:
+        digest = IncidentDigest(
+            id=self.id,
+            occurrences=self.occurrences,
+            suppressed=self.suppressed,
+            first_seen=datetime.fromtimestamp(self.first_seen, tz=timezone.utc),
+            last_seen=datetime.fromtimestamp(self.last_seen, tz=timezone.utc),
+            sample_run_ids=list(self.run_ids),
+        )
+        return self.payload.model_copy(update={"incident": digest})
+
+class IncidentGrouper:
+    """Groups failures by (pipelineName, errorCode, fingerprint).
+
+    The first failure of a group alerts immediately and opens a window; matches
+    inside the window are held, and when it closes one digest is emitted if
+    anything was held. At most ``max_incidents`` groups are tracked; the oldest
+    is closed early (digest emitted) to make room.
+
+    With a ``shared`` backend the groups span worker processes: the worker that
+    claims a group alerts and later sends its digest; the others only add to the
+    group's shared count, which the digest includes.
+    """
+
+    def __init__(self, window_seconds: float = 300.0, max_incidents: int = 5000, sample_size: int = 5,
+                 clock: Callable[[], float] = time.time, shared: Optional[StateBackend] = None):
+        self.window_seconds = window_seconds
+        self.shared = shared
+        self.max_incidents = max(1, max_incidents)
+        self.sample_size = sample_size
+        self._clock = clock
+        self._open: "OrderedDict[IncidentKey, Incident]" = OrderedDict()
+        self._ready: List[Incident] = []
+        self._task: Optional[asyncio.Task] = None
+        self.alerts = 0
+        self.suppressed = 0
+        self.digests = 0
+
+    @staticmethod
+    def key_for(payload: Payload) -> IncidentKey:
+        return (payload.pipelineName, payload.errorCode or "", payload.fingerprint or "")
+
+    def observe(self, payload: Payload) -> Tuple[str, Incident]:
+        """Returns ``("alert", incident)`` for the first failure of a group, else ``("suppressed", incident)``."""
+        now = self._clock()
+        self._close_expired(now)
+        key = self.key_for(payload)
+        incident = self._open.get(key)
+        if incident is not None:
+            incident.occurrences += 1
+            incident.last_seen = now
+            if payload.runId:
+                incident.run_ids.append(payload.runId)
+            self.suppressed += 1
+            return "suppressed", incident
+        return self._open_incident(Incident(key, payload, now, self.window_seconds, self.sample_size))
+
+    async def aobserve(self, payload: Payload) -> Tuple[str, Incident]:
+        """``observe`` across workers: a group new to this worker alerts only if no other worker has claimed it.
+
+        Without a shared backend, or while it is unavailable, this is ``observe``.
+        """
+        self._close_expired(self._clock())
+        key = self.key_for(payload)
+        if self.shared is None or key in self._open:
+            return self.observe(payload)
+        incident = Incident(key, payload, self._clock(), self.window_seconds, self.sample_size)
+        claim = self._claim_key(key)
+        if await self.shared.run("add", claim, incident.id, self.window_seconds, default=True):
+            # A request for the same group may have opened it here while the claim was in flight
+            return self.observe(payload) if key in self._open else self._open_incident(incident)
+        # Another worker alerted for this group; count toward its digest
+        incident.id = await self.shared.run("get", claim) or incident.id
+        await self.shared.run("incr", f"incident_count:{incident.id}", 1, self.window_seconds * 2)
+        self.suppressed += 1
+        return "suppressed", incident
+
+    def _open_incident(self, incident: Incident) -> Tuple[str, Incident]:
+        self._open[incident.key] = incident
+        while len(self._open) > self.max_incidents:
+            _, oldest = self._open.popitem(last=False)
+            self._retire(oldest)
+        self.alerts += 1
+        return "alert", incident
+
+    def _close_expired(self, now: float) -> None:
+        # Windows all have the same length, so insertion order is expiry order
+        while self._open:
+            key, incident = next(iter(self._open.items()))
+            if incident.window_end > now:
+                break
+            del self._open[key]
+            self._retire(incident)
+
+    async def release(self, incident: Incident) -> None:
+        """Reopens the group after its first alert failed to send, so the next occurrence alerts.
+
+        Repeats already held go out as a digest; the cross-worker claim is dropped.
+        """
+        if self._open.get(incident.key) is incident:
+            del self._open[incident.key]
+            await self._settle(incident)
+            if incident.suppressed:
+                self._ready.append(incident)
+
+    @staticmethod
+    def _claim_key(key: IncidentKey) -> str:
+        return "incident:" + "\x1f".join(key)
+
+    def _retire(self, incident: Incident) -> None:
+        # With a shared backend, other workers may have held repeats; emit() settles before deciding
+        if incident.suppressed or self.shared is not None:
+            self._ready.append(incident)
+
+    async def _settle(self, incident: Incident) -> None:
+        # Add what the other workers held, and release the claim unless it has already passed on
+        if self.shared is None:
+            return
+        count_key = f"incident_count:{incident.id}"
+        incident.occurrences += int(await self.shared.run("get", count_key) or 0)
+        await self.shared.run("delete", count_key)
+        claim = self._claim_key(incident.key)
+        if await self.shared.run("get", claim) == incident.id:
+            await self.shared.run("delete", claim)
+
+    def _take_ready(self, flush_all: bool) -> List[Incident]:
+        if flush_all:
+            while self._open:
+                self._retire(self._open.popitem(last=False)[1])
+        else:
+            self._close_expired(self._clock())
+        ready, self._ready = self._ready, []
+        return ready
+
+    def due_digests(self, flush_all: bool = False) -> List[Payload]:
+        """Digests of closed windows from this worker's counts; ``emit`` also adds other workers'."""
+        ready = [i for i in self._take_ready(flush_all) if i.suppressed]
+        self.digests += len(ready)
+        return [i.digest_payload() for i in ready]
+
+    def start(self, send: Callable[[Payload], Awaitable[Any]], interval: float = 5.0) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._emit_periodically(send, interval))
+
+    async def _emit_periodically(self, send: Callable[[Payload], Awaitable[Any]], interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.emit(send)
+
+    async def emit(self, send: Callable[[Payload], Awaitable[Any]], flush_all: bool = False) -> int:
+        ready = self._take_ready(flush_all)
+        for incident in ready:
+            await self._settle(incident)
+        ready = [i for i in ready if i.suppressed]
+        self.digests += len(ready)
+        digests = [i.digest_payload() for i in ready]
+        for payload in digests:
+            try:
+                await send(payload)
+            except Exception:
+                pass  # per-channel failures are already reported by dispatch; keep emitting the rest
+        return len(digests)
+
+    async def close(self, send: Callable[[Payload], Awaitable[Any]]) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        await self.emit(send, flush_all=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_incidents": len(self._open),
+            "alerts": self.alerts,
+            "suppressed": self.suppressed,
+            "digests": self.digests,
+            "shared": self.shared is not None,
+        }
+
+_grouper: Optional[IncidentGrouper] = None
+
+def get_grouper() -> Optional[IncidentGrouper]:
+    global _grouper
+    settings = get_settings()
+    if not settings.incident_grouping_enabled:
+        return None
+    if _grouper is None:
+        _grouper = IncidentGrouper(
+            window_seconds=settings.incident_window_seconds,
+            max_incidents=settings.incident_max_open,
+            sample_size=settings.incident_sample_run_ids,
+            shared=shared_state.shared_backend(),
+        )
+    return _grouper
+
+def current_grouper() -> Optional[IncidentGrouper]:
+    return _grouper
+
+def set_grouper(grouper: Optional[IncidentGrouper]) -> Optional[IncidentGrouper]:
+    global _grouper
+    previous, _grouper = _grouper, grouper
+    return previous
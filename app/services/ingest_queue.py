@@ -0,0 +1,197 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from app.core.config import get_settings
+from app.models.schemas import FailureNotification
+from .exceptions import IngestQueueFullError
+
+Handler = Callable[[FailureNotification, bool], Awaitable[Any]]
+
+class IngestQueue:
+    """Bounded in-process queue + worker pool for notify requests answered with 202.
+
+    With ``db_path`` set, jobs are written to SQLite before being acknowledged and
+    any job still queued/processing at startup (e.g. after a crash) is replayed.
+    """
+
+    def __init__(self, handler: Handler, maxsize: int = 1000, workers: int = 4, db_path: Optional[str] = None, max_tracked: int = 10000):
+        self.handler = handler
+        self.maxsize = max(1, maxsize)
+        self.worker_count = max(1, workers)
+        self.db_path = db_path
+        self.max_tracked = max_tracked
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = self._open_db(db_path) if db_path else None
+        self.accepted = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _open_db(path: str) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            "id TEXT PRIMARY KEY, payload TEXT NOT NULL, return_only INTEGER NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status ON ingest_jobs(status)")
+        return db
+
+    @property
+    def running(self) -> bool:
+        return any(not w.done() for w in self._workers)
+
+    def start(self) -> None:
+        # Must be called from the serving event loop; idempotent
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.worker_count)]
+        if self._db is not None:
+            pending = self._db.execute(
+                "SELECT id, payload, return_only FROM ingest_jobs WHERE status IN ('queued', 'processing') ORDER BY created_at"
+            ).fetchall()
+            if pending:
+                self._workers.append(asyncio.ensure_future(self._replay(pending)))
+
+    async def _replay(self, rows) -> None:
+        for job_id, payload_json, return_only in rows:
+            payload = FailureNotification.model_validate_json(payload_json)
+            self._track(job_id, {"id": job_id, "status": "queued", "created_at": time.time()})
+            await self._queue.put((job_id, payload, bool(return_only)))
+
+    def submit(self, payload: FailureNotification, return_only: bool = False) -> str:
+        self.start()
+        job_id = uuid.uuid4().hex
+        if self._queue.full():
+            self.rejected += 1
+            raise IngestQueueFullError(f"Ingest queue full ({self.maxsize} jobs)")
+        now = time.time()
+        if self._db is not None:
+            self._db.execute(
+                "INSERT INTO ingest_jobs (id, payload, return_only, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, payload.model_dump_json(), int(return_only), now, now),
+            )
+        self._track(job_id, {"id": job_id, "status": "queued", "created_at": now})
+        self._queue.put_nowait((job_id, payload, return_only))
+        self.accepted += 1
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT id, status, result, error, created_at, updated_at FROM ingest_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {"id": row[0], "status": row[1], "created_at": row[4], "updated_at": row[5]}
+        if row[2]:
+            job["result"] = json.loads(row[2])
+        if row[3]:
+            job["error"] = row[3]
+        return job
+
+    def _track(self, job_id: str, job: Dict[str, Any]) -> None:
+        self._jobs[job_id] = job
+        self._jobs.move_to_end(job_id)
+        while len(self._jobs) > self.max_tracked:
+            self._jobs.popitem(last=False)
+
+    def _update(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        job = self._jobs.get(job_id) or {"id": job_id}
+        job.update({"status": status, "updated_at": now})
+        if result is not None:
+            job["result"] = result
+        if error is not None:
+            job["error"] = error
+        self._track(job_id, job)
+        if self._db is not None:
+            self._db.execute(
+                "UPDATE ingest_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, job_id),
+            )
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, payload, return_only = await self._queue.get()
+            try:
+                self._update(job_id, "processing")
+                result = await self.handler(payload, return_only)
+                self._update(job_id, "done", result=jsonable_encoder(result))
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                self._update(job_id, "failed", error=str(e.detail))
+            except Exception as e:
+                self._update(job_id, "failed", error=f"{e.__class__.__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        if self._queue is not None and self.running:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                pass  # durable jobs stay 'queued'/'processing' in SQLite and are replayed on next start
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": self.worker_count,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "durable": self.db_path is not None,
+        }
+
+_queue: Optional[IngestQueue] = None
+
+def get_queue(handler: Handler) -> IngestQueue:
+    global _queue
+    if _queue is None:
+        settings = get_settings()
+        _queue = IngestQueue(
+            handler,
+            maxsize=settings.ingest_queue_maxsize,
+            workers=settings.ingest_workers,
+            db_path=settings.ingest_db_path or None,
+            max_tracked=settings.ingest_max_tracked_jobs,
+        )
+    return _queue
+
+def current_queue() -> Optional[IngestQueue]:
+    return _queue
+
+def set_queue(queue: Optional[IngestQueue]) -> Optional[IngestQueue]:
+    global _queue
+    previous, _queue = _queue, queue
+    return previous
+
+async def shutdown() -> None:
+    queue = set_queue(None)
+    if queue is not None:
+        await queue.stop()
@@ -0,0 +1,234 @@
+from __future__ import annotations
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import httpx
+from app.core.config import get_settings
+
+# Seconds; covers cache hits (sub-ms) through slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {v:g}" for k, v in items]
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram; one ``observe`` is a bisect and a few list updates under a lock."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative) ..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def count(self, *labels: str) -> int:
+        row = self._values.get(labels)
+        return int(sum(row[:-1])) if row else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        bounds = [f'le="{b:g}"' for b in self.buckets] + ['le="+Inf"']
+        for key, row in items:
+            cumulative = 0.0
+            for bound, n in zip(bounds, row):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, bound)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-1]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative:g}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram("adf_http_request_duration_seconds", "Inbound request latency by route and status.", ("method", "route", "status"))
+STAGE_SECONDS = REGISTRY.histogram("adf_stage_duration_seconds", "Time spent in each notification processing stage.", ("stage",))
+UPSTREAM_SECONDS = REGISTRY.histogram("adf_upstream_request_duration_seconds", "Outbound call latency (to response headers) by upstream and status.", ("upstream", "status"))
+ANALYSES = REGISTRY.counter("adf_analyses_total", "Analyses served, by tier.", ("tier",))
+FALLBACKS = REGISTRY.counter("adf_analysis_fallbacks_total", "Local fallback analyses, by reason.", ("reason",))
+TOKENS = REGISTRY.counter("adf_openai_tokens_total", "Azure OpenAI token usage reported in responses.", ("kind",))
+
+# correlationId of the notification being processed; stamped on every span
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+_UNSET: Any = object()
+_tracer: Any = _UNSET
+
+def get_tracer() -> Any:
+    """OpenTelemetry tracer when OTEL_TRACING_ENABLED and ``opentelemetry-api`` is installed, else ``None``."""
+    global _tracer
+    if _tracer is _UNSET:
+        _tracer = None
+        if get_settings().otel_tracing_enabled:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                pass
+            else:
+                _tracer = trace.get_tracer("adf-monitor-agent")
+    return _tracer
+
+def set_tracer(tracer: Any) -> Any:
+    # None disables spans; _UNSET re-reads settings on next use
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+def reset_tracer() -> None:
+    set_tracer(_UNSET)
+
+def bind_correlation_id(value: Optional[str]) -> None:
+    correlation_id.set(value)
+    if value and get_tracer() is not None:
+        try:
+            from opentelemetry import trace
+        except ImportError:  # a tracer injected via set_tracer
+            return
+        # Tag the enclosing server span too (e.g. from FastAPI auto-instrumentation)
+        trace.get_current_span().set_attribute("adf.correlation_id", value)
+
+class stage:
+    """Times a processing stage (and wraps it in a span when tracing is on): ``with stage("redact"): ...``"""
+
+    __slots__ = ("name", "_span", "_started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._span: Any = None
+
+    def __enter__(self) -> "stage":
+        tracer = get_tracer()
+        if tracer is not None:
+            cid = correlation_id.get()
+            self._span = tracer.start_as_current_span(f"adf.{self.name}", attributes={"adf.correlation_id": cid} if cid else None)
+            self._span.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        STAGE_SECONDS.observe(time.perf_counter() - self._started, self.name)
+        if self._span is not None:
+            self._span.__exit__(*exc)
+
+def record_usage(usage: Optional[Dict[str, Any]]) -> None:
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind)
+        if value:
+            TOKENS.inc(kind[:-len("_tokens")], amount=value)
+
+class InstrumentedClient(httpx.AsyncClient):
+    """``httpx.AsyncClient`` that times every outbound request for one upstream.
+
+    Timing uses event hooks, not a wrapping transport: passing ``transport=`` makes httpx
+    ignore HTTP(S)_PROXY/NO_PROXY. Time runs to the response headers; errors count as "error".
+    """
+
+    def __init__(self, upstream: str, **kwargs: Any):
+        hooks = kwargs.pop("event_hooks", None) or {}
+        kwargs["event_hooks"] = {
+            "request": [*hooks.get("request", ()), self._started],
+            "response": [*hooks.get("response", ()), self._finished],
+        }
+        super().__init__(**kwargs)
+        self.upstream = upstream
+
+    async def _started(self, request: httpx.Request) -> None:
+        request.extensions["adf_started"] = time.perf_counter()
+
+    async def _finished(self, response: httpx.Response) -> None:
+        started = response.request.extensions.get("adf_started")
+        if started is not None:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.upstream, str(response.status_code))
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        try:
+            return await super().send(request, **kwargs)
+        except Exception:
+            started = request.extensions.get("adf_started")
+            if started is not None:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.upstream, "error")
+            raise
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency by route template (not raw path, to bound label cardinality)."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = ["500"]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], path, status[0])
@@ -1,21 +1,24 @@
 from __future__ import annotations
+import asyncio
 import json
-import httpx
-from typing import List
-from app.core.config import get_settings
-from app.models.schemas import NotificationPayload
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from app.core.config import Settings, get_settings
+from app.models.context import Payload
+from app.models.schemas import ChannelResult
 from .exceptions import NotificationDispatchError
+from . import graph_auth, metrics, shared_state
+from .http_clients import get_client
 
-async def send_teams(payload: NotificationPayload) -> None:
-    settings = get_settings()
-    if not settings.teams_webhook_url:
-        return
+def teams_card(payload: Payload) -> Dict[str, Any]:
+    title = f"Incident digest: {payload.pipelineName} ({payload.incident.occurrences} failures)" if payload.incident else f"Pipeline Failure: {payload.pipelineName}"
     card = {
         "@type": "MessageCard",
         "@context": "https://schema.org/extensions",
-        "summary": f"Pipeline Failure: {payload.pipelineName}",
+        "summary": title,
         "themeColor": "EA4300",
-        "title": f"Pipeline Failure: {payload.pipelineName}",
+        "title": title,
         "sections": [
             {
                 "facts": [
@@ -35,33 +38,44 @@ async def send_teams(payload: NotificationPayload) -> None:
             }
         ]
     }
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.post(settings.teams_webhook_url, json=card)
-    if r.status_code >= 400:
-        raise NotificationDispatchError(f"Teams webhook error {r.status_code}: {r.text}")
+    if payload.incident:
+        d = payload.incident
+        card["sections"].insert(0, {"facts": [
+            {"name": "Incident", "value": d.id},
+            {"name": "Occurrences", "value": str(d.occurrences)},
+            {"name": "Suppressed alerts", "value": str(d.suppressed)},
+            {"name": "First seen", "value": d.first_seen.isoformat()},
+            {"name": "Last seen", "value": d.last_seen.isoformat()},
+            {"name": "Sample run ids", "value": ", ".join(d.sample_run_ids) or "-"},
+        ]})
+    return card
 
-async def send_email(payload: NotificationPayload) -> None:
+async def send_teams(payload: Payload) -> None:
     settings = get_settings()
-    if not settings.alert_emails or not settings.client_id or not settings.client_secret or not settings.tenant_id:
+    if not settings.teams_webhook_url:
         return
-    # Acquire token using client credentials via MS identity platform
-    token_url = f"https://login.microsoftonline.com/{settings.tenant_id}/oauth2/v2.0/token"
-    data = {
-        "client_id": settings.client_id,
-        "client_secret": settings.client_secret,
-        "scope": "https://graph.microsoft.com/.default",
-        "grant_type": "client_credentials"
-    }
-    async with httpx.AsyncClient(timeout=15) as client:
-        token_resp = await client.post(token_url, data=data)
-        if token_resp.status_code >= 400:
-            raise NotificationDispatchError(f"Auth fail: {token_resp.text}")
-        access_token = token_resp.json().get("access_token")
-        if not access_token:
-            raise NotificationDispatchError("No access token returned")
-        subject = f"[Failure] {payload.pipelineName} ({payload.environment or '-'})"
-        body_html = f"""
-<h3>Pipeline Failure: {payload.pipelineName}</h3>
+    # Views are rendered only by the channel that sends them, and dropped after the call
+    r = await get_client("teams").post(settings.teams_webhook_url, json=teams_card(payload))
+    if r.status_code >= 400:
+        raise NotificationDispatchError(f"Teams webhook error {r.status_code}: {r.text}")
+
+def email_message(payload: Payload) -> Tuple[str, str]:
+    """Subject and HTML body of the alert email."""
+    subject = f"[Failure] {payload.pipelineName} ({payload.environment or '-'})"
+    digest_html = ""
+    if payload.incident:
+        d = payload.incident
+        subject = f"[Digest x{d.occurrences}] {payload.pipelineName} ({payload.environment or '-'})"
+        digest_html = f"""
+<p>
+  <b>Incident:</b> {d.id}<br/>
+  <b>Occurrences:</b> {d.occurrences} ({d.suppressed} alerts suppressed)<br/>
+  <b>First / last seen:</b> {d.first_seen.isoformat()} / {d.last_seen.isoformat()}<br/>
+  <b>Sample run ids:</b> {', '.join(d.sample_run_ids) or '-'}
+</p>"""
+    # The raw error escapes only the shown prefix: same text as escaping it all, without a full-size copy
+    body_html = f"""
+<h3>Pipeline Failure: {payload.pipelineName}</h3>{digest_html}
 <p>
   <b>Run Id:</b> {payload.runId or '-'}<br/>
   <b>Activity:</b> {payload.activityName or '-'}<br/>
@@ -79,23 +93,100 @@ async def send_email(payload: NotificationPayload) -> None:
 <p><b>Probable Reason:</b> {payload.analysis.probable_reason}</p>
 <p><b>Probable Fix:</b> {payload.analysis.probable_fix}</p>
 <p><b>Confidence:</b> {payload.analysis.confidence:.2f}</p>
-<details><summary>Raw Error</summary><pre>{json.dumps(payload.raw_error)[:4000]}</pre></details>
+<details><summary>Raw Error</summary><pre>{json.dumps(payload.raw_error[:4000])[:4000]}</pre></details>
 """
-        graph_url = "https://graph.microsoft.com/v1.0/users/{sender}/sendMail".format(sender=settings.sender_email or settings.alert_emails[0])
-        mail_json = {
-            "message": {
-                "subject": subject,
-                "body": {"contentType": "HTML", "content": body_html},
-                "toRecipients": [{"emailAddress": {"address": addr}} for addr in settings.alert_emails],
-            },
-            "saveToSentItems": "false"
-        }
-        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-        send_resp = await client.post(graph_url, headers=headers, json=mail_json)
-        if send_resp.status_code >= 400:
-            raise NotificationDispatchError(f"Graph sendMail error {send_resp.status_code}: {send_resp.text}")
+    return subject, body_html
 
-async def dispatch_notifications(payload: NotificationPayload) -> None:
-    # Fire Teams then email; failures raise.
-    await send_teams(payload)
-    await send_email(payload)
+async def send_email(payload: Payload) -> None:
+    settings = get_settings()
+    if not settings.alert_emails or not settings.client_id or not settings.client_secret or not settings.tenant_id:
+        return
+    # Cached client-credentials token; only hits login.microsoftonline.com near expiry
+    tokens = graph_auth.get_token_provider()
+    access_token = await tokens.get_token()
+    client = get_client("graph")
+    subject, body_html = email_message(payload)
+    graph_url = "https://graph.microsoft.com/v1.0/users/{sender}/sendMail".format(sender=settings.sender_email or settings.alert_emails[0])
+    mail_json = {
+        "message": {
+            "subject": subject,
+            "body": {"contentType": "HTML", "content": body_html},
+            "toRecipients": [{"emailAddress": {"address": addr}} for addr in settings.alert_emails],
+        },
+        "saveToSentItems": "false"
+    }
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    send_resp = await client.post(graph_url, headers=headers, json=mail_json)
+    if send_resp.status_code == 401:
+        tokens.invalidate()  # revoked/rotated secret: fetch a fresh token next time
+    if send_resp.status_code >= 400:
+        raise NotificationDispatchError(f"Graph sendMail error {send_resp.status_code}: {send_resp.text}")
+
+async def send_webhook(payload: Payload) -> None:
+    settings = get_settings()
+    if not settings.generic_webhook_url:
+        return
+    r = await get_client("webhook").post(settings.generic_webhook_url, json=payload.model_dump(mode="json"))
+    if r.status_code >= 400:
+        raise NotificationDispatchError(f"Webhook error {r.status_code}: {r.text[:500]}")
+
+@dataclass(frozen=True)
+class Channel:
+    name: str
+    send: Callable[[Payload], Awaitable[None]]
+    is_configured: Callable[[Settings], bool]
+    timeout: Callable[[Settings], float]
+
+CHANNELS: Dict[str, Channel] = {}
+
+def register_channel(channel: Channel) -> None:
+    CHANNELS[channel.name] = channel
+
+register_channel(Channel(
+    "teams", send_teams,
+    lambda s: bool(s.teams_webhook_url),
+    lambda s: s.teams_timeout,
+))
+register_channel(Channel(
+    "email", send_email,
+    lambda s: bool(s.alert_emails and s.client_id and s.client_secret and s.tenant_id),
+    lambda s: s.graph_timeout,
+))
+register_channel(Channel(
+    "webhook", send_webhook,
+    lambda s: bool(s.generic_webhook_url),
+    lambda s: s.webhook_timeout,
+))
+
+async def _run_channel(channel: Channel, payload: Payload, timeout: float, rpm: int = 0) -> ChannelResult:
+    started = time.perf_counter()
+    if rpm:
+        # Counted across all workers when the state backend is shared; waits at most the channel timeout
+        wait = await shared_state.reserve(shared_state.rate_limiter(f"notify:{channel.name}", rpm), 1, timeout)
+        if wait is None:
+            return ChannelResult(channel=channel.name, status="rate_limited", detail=f"Over NOTIFY_RPM={rpm}")
+        if wait:
+            await asyncio.sleep(wait)
+    try:
+        await asyncio.wait_for(channel.send(payload), timeout)
+        status, detail = "sent", None
+    except asyncio.TimeoutError:
+        status, detail = "timeout", f"No response within {timeout:g}s"
+    except Exception as e:  # one channel failing must not stop the others
+        status, detail = "failed", str(e) or e.__class__.__name__
+    elapsed = time.perf_counter() - started
+    metrics.STAGE_SECONDS.observe(elapsed, f"notify_{channel.name}")
+    return ChannelResult(channel=channel.name, status=status, detail=detail, elapsed_ms=round(elapsed * 1000, 1))
+
+async def dispatch_notifications(payload: Payload) -> List[ChannelResult]:
+    # Fire all configured channels concurrently; latency is the slowest channel, not the sum.
+    settings = get_settings()
+    results: List[ChannelResult] = []
+    pending = []
+    for channel in list(CHANNELS.values()):
+        if channel.is_configured(settings):
+            pending.append(_run_channel(channel, payload, channel.timeout(settings), settings.notify_rpm))
+        else:
+            results.append(ChannelResult(channel=channel.name, status="skipped"))
+    results.extend(await asyncio.gather(*pending))
+    return results
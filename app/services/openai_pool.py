@@ -0,0 +1,314 @@
+from __future__ import annotations
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from app.core.config import Settings, get_settings
+from .exceptions import OpenAIUnavailableError
+from .http_clients import get_client
+from . import shared_state
+from .shared_state import SharedBucket, StateBackend
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+@dataclass(frozen=True)
+class Endpoint:
+    endpoint: str
+    deployment: str
+    api_key: str
+    api_version: str
+    rpm: int = 0
+    tpm: int = 0
+
+    @property
+    def url(self) -> str:
+        return f"{self.endpoint.rstrip('/')}/openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+
+    @property
+    def name(self) -> str:
+        return f"{httpx.URL(self.endpoint).host}/{self.deployment}"
+
+def endpoints_from_settings(settings: Settings) -> List[Endpoint]:
+    """``AZURE_OPENAI_ENDPOINTS`` (JSON list) when set, else the single AZURE_OPENAI_* endpoint."""
+    if settings.azure_openai_endpoints:
+        items: List[Dict[str, Any]] = json.loads(settings.azure_openai_endpoints)
+        return [
+            Endpoint(
+                endpoint=item["endpoint"],
+                deployment=item.get("deployment") or settings.azure_openai_deployment,
+                api_key=item.get("api_key") or settings.azure_openai_api_key,
+                api_version=item.get("api_version") or settings.azure_openai_api_version,
+                rpm=int(item.get("rpm", settings.openai_rpm)),
+                tpm=int(item.get("tpm", settings.openai_tpm)),
+            )
+            for item in items
+        ]
+    if not settings.azure_openai_api_key or not settings.azure_openai_endpoint:
+        return []
+    return [Endpoint(
+        settings.azure_openai_endpoint, settings.azure_openai_deployment, settings.azure_openai_api_key,
+        settings.azure_openai_api_version, settings.openai_rpm, settings.openai_tpm,
+    )]
+
+class TokenBucket:
+    """Refills ``per_minute`` units per minute up to one minute's worth.
+
+    ``reserve`` takes the units immediately (the balance may go negative) and returns
+    how long the caller must wait, so concurrent callers queue up fairly.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        amount = min(amount, self.capacity)
+        wait = max(0.0, (amount - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= amount
+        return wait
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; after ``reset_timeout`` one probe
+    call is let through (half-open) and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def available(self) -> bool:
+        if self.state == "open":
+            return self._clock() - self._opened_at >= self.reset_timeout
+        return not (self.state == "half_open" and self._probing)
+
+    def acquire(self) -> bool:
+        if not self.available():
+            return False
+        if self.state == "open":
+            self.state = "half_open"
+        self._probing = self.state == "half_open"
+        return True
+
+    def release(self) -> None:
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = self._clock()
+
+class EndpointState:
+    __slots__ = ("endpoint", "breaker", "rpm", "tpm", "latency", "cooldown_until", "calls", "failures")
+
+    def __init__(self, endpoint: Endpoint, breaker: CircuitBreaker, clock: Callable[[], float], shared: Optional[StateBackend] = None):
+        self.endpoint = endpoint
+        self.breaker = breaker
+        # RPM/TPM quotas belong to the deployment, so with a shared backend every worker draws from one budget
+        if shared is not None:
+            self.rpm = SharedBucket(shared, f"openai:{endpoint.name}:rpm", endpoint.rpm) if endpoint.rpm else None
+            self.tpm = SharedBucket(shared, f"openai:{endpoint.name}:tpm", endpoint.tpm) if endpoint.tpm else None
+        else:
+            self.rpm = TokenBucket(endpoint.rpm, clock) if endpoint.rpm else None
+            self.tpm = TokenBucket(endpoint.tpm, clock) if endpoint.tpm else None
+        self.latency: Optional[float] = None  # EWMA of successful call latency
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    async def reserve(self, tokens: int, max_wait: float) -> Optional[float]:
+        rpm_wait = await shared_state.reserve(self.rpm, 1, max_wait) if self.rpm else 0.0
+        if rpm_wait is None:
+            return None
+        tpm_wait = await shared_state.reserve(self.tpm, tokens, max_wait) if self.tpm else 0.0
+        if tpm_wait is None:
+            if self.rpm:
+                await shared_state.refund(self.rpm, 1)
+            return None
+        return max(rpm_wait, tpm_wait)
+
+    def observe_latency(self, seconds: float) -> None:
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """``retry-after-ms`` (Azure OpenAI) or ``retry-after`` in seconds or as an HTTP date."""
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class OpenAIPool:
+    """Sends chat completions to one of several Azure OpenAI endpoints.
+
+    Each endpoint has its own circuit breaker and optional RPM/TPM token buckets. Calls
+    go to the fastest healthy endpoint (EWMA latency; unmeasured endpoints first). On
+    429/5xx/network errors the call fails over to another ready endpoint at once, or
+    else backs off with full jitter, honouring ``retry-after``. When nothing can serve
+    the call it raises ``OpenAIUnavailableError`` so the caller can fall back locally.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_wait: float = 10.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+        rand: Callable[[], float] = random.random,
+        shared: Optional[StateBackend] = None,
+    ):
+        self.states = [EndpointState(e, CircuitBreaker(breaker_threshold, breaker_reset, clock), clock, shared) for e in endpoints]
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+
+    def _ranked(self, exclude: Optional[EndpointState] = None) -> List[EndpointState]:
+        now = self._clock()
+        ready = [s for s in self.states if s is not exclude and s.breaker.available()]
+        return sorted(ready, key=lambda s: (s.cooldown_until > now, s.latency or 0.0))
+
+    async def _select(self, tokens: int) -> Tuple[Optional[EndpointState], float, str]:
+        reason = "circuit_open"
+        for state in self._ranked():
+            wait = await state.reserve(tokens, self.max_wait)
+            if wait is None:
+                reason = "rate_limited"
+                continue
+            if state.breaker.acquire():
+                return state, wait, ""
+        return None, 0.0, reason
+
+    def _backoff(self, attempt: int) -> float:
+        return self._rand() * min(self.backoff_max, self.backoff_base * (2 ** attempt))
+
+    async def chat(self, body: Dict[str, Any], tokens: int = 0, stream: bool = False) -> httpx.Response:
+        """POSTs ``body``; returns the first non-retryable response (2xx or a client error).
+
+        With ``stream=True`` only the headers have been read: retries happen before the
+        first byte, and the caller must read and ``aclose()`` the response.
+        """
+        reason = "circuit_open"
+        for attempt in range(self.max_retries + 1):
+            state, wait, select_reason = await self._select(tokens)
+            if state is None:
+                raise OpenAIUnavailableError(select_reason if attempt == 0 else reason)
+            if wait:
+                await self._sleep(wait)
+            endpoint = state.endpoint
+            state.calls += 1
+            started = self._clock()
+            delay: Optional[float] = None
+            client = get_client("openai")
+            request = client.build_request(
+                "POST", endpoint.url, headers={"api-key": endpoint.api_key, "Content-Type": "application/json"}, json=body
+            )
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError:
+                reason = "network_error"
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    if response.status_code < 400:
+                        state.breaker.record_success()
+                        state.observe_latency(self._clock() - started)
+                    else:
+                        state.breaker.release()  # a bad request or key is not an outage
+                    return response
+                reason = "rate_limited" if response.status_code == 429 else "http_error"
+                delay = retry_after_seconds(response)
+                if stream:
+                    await response.aclose()
+            state.failures += 1
+            state.breaker.record_failure()
+            delay = self._backoff(attempt) if delay is None else delay
+            state.cooldown_until = self._clock() + delay
+            if attempt == self.max_retries:
+                break
+            alternatives = self._ranked(exclude=state)
+            if alternatives and alternatives[0].cooldown_until <= self._clock():
+                continue  # another endpoint is ready: fail over without waiting
+            if delay > self.max_wait:
+                break
+            await self._sleep(delay)
+        raise OpenAIUnavailableError(reason)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "endpoint": s.endpoint.name,
+                "circuit": s.breaker.state,
+                "latency_ms": round(s.latency * 1000, 1) if s.latency is not None else None,
+                "calls": s.calls,
+                "failures": s.failures,
+            }
+            for s in self.states
+        ]
+
+_pool: Optional[OpenAIPool] = None
+
+def get_pool(settings: Optional[Settings] = None) -> OpenAIPool:
+    global _pool
+    if _pool is None:
+        settings = settings or get_settings()
+        _pool = OpenAIPool(
+            endpoints_from_settings(settings),
+            max_retries=settings.openai_max_retries,
+            backoff_base=settings.openai_backoff_base_seconds,
+            backoff_max=settings.openai_backoff_max_seconds,
+            max_wait=settings.openai_max_wait_seconds,
+            breaker_threshold=settings.openai_breaker_failure_threshold,
+            breaker_reset=settings.openai_breaker_reset_seconds,
+            shared=shared_state.shared_backend(),
+        )
+    return _pool
+
+def current_pool() -> Optional[OpenAIPool]:
+    return _pool
+
+def set_pool(pool: Optional[OpenAIPool]) -> Optional[OpenAIPool]:
+    global _pool
+    previous, _pool = _pool, pool
+    return previous
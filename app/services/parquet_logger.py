@@ -0,0 +1,188 @@
+from __future__ import annotations
+import asyncio
+import os
+import re
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.core.config import Settings, get_settings
+from app.models.context import Payload
+from app.services.csv_logger import CSV_HEADERS, build_row
+
+# Low-cardinality columns are dictionary encoded; free-text columns are left plain
+DICTIONARY_COLUMNS = ["pipelineName", "activityName", "errorCode", "environment", "source", "component", "severity", "region"]
+PARTITION_KEYS = ("date", "environment", "source")
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+def _schema():
+    # pyarrow is optional; only imported when the Parquet sink is in use
+    import pyarrow as pa
+    fields = []
+    for name in CSV_HEADERS:
+        if name == "timestamp":
+            fields.append(pa.field(name, pa.timestamp("us")))
+        elif name == "confidence":
+            fields.append(pa.field(name, pa.float32()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+def _partition_value(value: Optional[str]) -> str:
+    return _UNSAFE.sub("_", value) if value else "unknown"
+
+def _record(payload: Payload) -> Dict[str, Any]:
+    record: Dict[str, Any] = dict(zip(CSV_HEADERS, build_row(payload)))
+    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+    record["confidence"] = float(record["confidence"])
+    for key, value in record.items():
+        if value == "":
+            record[key] = None
+    return record
+
+class ParquetLogger:
+    """Buffers analyses and writes them as Hive-partitioned Parquet files
+    (``date=YYYY-MM-DD/environment=<env>/source=<src>/part-*.parquet``)."""
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.root = settings.parquet_log_dir or os.path.join(os.getcwd(), "analysis_parquet")
+        self.flush_max_rows = max(1, settings.parquet_flush_max_rows)
+        self.flush_interval = settings.parquet_flush_interval_seconds
+        self.row_group_size = settings.parquet_row_group_size
+        self.compression = settings.parquet_compression
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.files_written = 0
+        self.rows_written = 0
+
+    def append_analysis(self, payload: Payload) -> str:
+        with self._lock:
+            self._buffer.append(_record(payload))
+            full = len(self._buffer) >= self.flush_max_rows
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if full:
+                self.flush_sync()
+            return self.root
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+        if full and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self.flush())
+        return self.root
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffer:
+                await self.flush()
+
+    async def flush(self) -> int:
+        return await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self) -> int:
+        import pyarrow as pa
+        with self._flush_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return 0
+            partitions: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+            for record in records:
+                key = (record["timestamp"].strftime("%Y-%m-%d"), _partition_value(record["environment"]), _partition_value(record["source"]))
+                partitions[key].append(record)
+            schema = _schema()
+            for key, rows in partitions.items():
+                directory = os.path.join(self.root, *(f"{name}={value}" for name, value in zip(PARTITION_KEYS, key)))
+                table = pa.Table.from_pylist(rows, schema=schema)
+                self._write(table, directory, f"part-{datetime.utcnow().strftime('%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet")
+            self.rows_written += len(records)
+            return len(records)
+
+    def _write(self, table, directory: str, name: str) -> str:
+        import pyarrow.parquet as pq
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        tmp = path + ".tmp"
+        pq.write_table(
+            table, tmp,
+            row_group_size=self.row_group_size,
+            compression=self.compression,
+            use_dictionary=DICTIONARY_COLUMNS,
+        )
+        os.replace(tmp, path)  # readers never see half-written files
+        self.files_written += 1
+        return path
+
+    def compact(self, min_files: int = 2, small_file_bytes: int = 8 * 1024 * 1024) -> Dict[str, int]:
+        """Merge small files inside each leaf partition into one file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        merged = removed = 0
+        with self._flush_lock:
+            for directory, _, files in os.walk(self.root):
+                small = sorted(
+                    os.path.join(directory, f) for f in files
+                    if f.endswith(".parquet") and os.path.getsize(os.path.join(directory, f)) < small_file_bytes
+                )
+                if len(small) < min_files:
+                    continue
+                table = pa.concat_tables([pq.read_table(p, schema=_schema()) for p in small])
+                table = table.sort_by("timestamp")
+                self._write(table, directory, f"compacted-{uuid.uuid4().hex[:8]}.parquet")
+                for p in small:
+                    os.remove(p)
+                merged += 1
+                removed += len(small)
+        return {"partitions_compacted": merged, "files_removed": removed}
+
+    async def close(self) -> None:
+        for task in (self._timer, self._flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._buffer:
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"root": self.root, "buffered_rows": len(self._buffer), "rows_written": self.rows_written, "files_written": self.files_written}
+
+def read_analyses(root: str, columns: Optional[Sequence[str]] = None, filter=None):
+    """Load the partitioned log for reporting, reading only ``columns`` (partition pruning via ``filter``)."""
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    return dataset.to_table(columns=list(columns) if columns else None, filter=filter)
+
+_logger: Optional[ParquetLogger] = None
+
+def get_parquet_logger() -> ParquetLogger:
+    global _logger
+    if _logger is None:
+        _logger = ParquetLogger()
+    return _logger
+
+def set_parquet_logger(logger: Optional[ParquetLogger]) -> Optional[ParquetLogger]:
+    global _logger
+    previous, _logger = _logger, logger
+    return previous
+
+async def shutdown() -> None:
+    logger = set_parquet_logger(None)
+    if logger is not None:
+        await logger.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compact small Parquet analysis log files per partition.")
+    parser.add_argument("root", nargs="?", help="Parquet log root (defaults to PARQUET_LOG_DIR)")
+    parser.add_argument("--min-files", type=int, default=2)
+    parser.add_argument("--small-file-mb", type=float, default=8)
+    args = parser.parse_args()
+    logger = ParquetLogger()
+    if args.root:
+        logger.root = args.root
+    print(logger.compact(min_files=args.min_files, small_file_bytes=int(args.small_file_mb * 1024 * 1024)))
@@ -0,0 +1,274 @@
+"""Re-run analysis over historical failures, e.g. after a prompt or deployment change.
+
+Records stream from a CSV file, an NDJSON file or a blob in the ADLS container through
+``ai_analyzer.analyze_failure`` on a bounded worker pool, and the results are written in
+input order to a new log (CSV, or NDJSON when the output ends in ``.jsonl``/``.ndjson``):
+
+    python -m app.services.reanalyze failures.jsonl --output reanalysis.csv --workers 8
+    python -m app.services.reanalyze adls://logs/analysis_log.csv --output reanalysis.csv
+
+A checkpoint next to the output records how many input records are done and the output
+size at that point; running the same command again resumes from it.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services.csv_logger import CSV_HEADERS
+
+OUTPUT_HEADERS = ["record"] + CSV_HEADERS + ["fallback_reason"]
+_FIELDS = set(FailureNotification.model_fields)
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Text lines (with line endings) from byte chunks, holding at most one partial line."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    partial = ""
+    for chunk in chunks:
+        text = partial + decoder.decode(chunk)
+        lines = text.splitlines(keepends=True)
+        partial = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+    partial += decoder.decode(b"", final=True)
+    if partial:
+        yield partial
+
+def _file_chunks(path: str, size: int = 1 << 20) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+def _blob_chunks(url: str) -> Iterator[bytes]:
+    """``adls://<container>/<blob>``, using the ADLS_* connection settings."""
+    from app.services.adls_logger import ADLSLogger
+    container, _, blob = url[len("adls://"):].partition("/")
+    logger = ADLSLogger()
+    client = logger.client or logger._build_client()
+    yield from client.get_blob_client(container, blob).download_blob().chunks()
+
+def read_records(source: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Raw records from ``source`` (a path or ``adls://`` URL), one at a time."""
+    chunks = _blob_chunks(source) if source.startswith("adls://") else _file_chunks(source)
+    fmt = fmt or ("csv" if source.lower().endswith(".csv") else "ndjson")
+    if fmt == "csv":
+        yield from csv.DictReader(_lines(chunks))
+        return
+    for line in _lines(chunks):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield {}  # counted as skipped, keeps record numbers aligned with lines
+
+def to_failure(record: Dict[str, Any]) -> Optional[FailureNotification]:
+    """A failure from a notification body, a ``{"body": {...}}`` wrapper or a log row; None if unusable.
+
+    The analysis log itself has no error text column, so rows only qualify when an export
+    adds ``errorMessage`` (or ``raw_error``, as the analysis store names it).
+    """
+    if isinstance(record.get("body"), dict):
+        record = record["body"]
+    fields = {k: v for k, v in record.items() if k in _FIELDS and v not in ("", None)}
+    if "errorMessage" not in fields and record.get("raw_error"):
+        fields["errorMessage"] = record["raw_error"]
+    try:
+        return FailureNotification(**fields)
+    except ValidationError:
+        return None
+
+def _csv_line(values: List[Any]) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+def format_row(index: int, data: FailureNotification, result: AnalysisResult, fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps({
+            "record": index,
+            "failure": data.model_dump(mode="json", exclude={"errorMessage"}),
+            "analysis": result.model_dump(),
+            "fallback_reason": result.fallback_reason,
+        }) + "\n"
+    return _csv_line([
+        index,
+        data.timestamp.isoformat() if data.timestamp else "",
+        data.pipelineName,
+        data.runId or "",
+        data.activityName or "",
+        data.errorCode or "",
+        data.environment or "",
+        data.source or "",
+        data.component or "",
+        data.severity or "",
+        data.correlationId or "",
+        data.region or "",
+        str(data.resourceUrl or ""),
+        result.simplified_error.replace("\n", " ")[:4000],
+        result.probable_reason.replace("\n", " ")[:4000],
+        result.probable_fix.replace("\n", " ")[:4000],
+        f"{result.confidence:.2f}",
+        result.fallback_reason or "",
+    ])
+
+class Reanalysis:
+    """Runs records through the analyzer with ``workers`` concurrent calls, writing results in input order.
+
+    At most ``window`` records are read ahead of the oldest unfinished one, so memory stays
+    bounded by the window whatever the input size. Rows are written only once every earlier
+    record is done, which makes the checkpoint a plain count: the first ``records`` inputs are
+    in the output, which is ``output_bytes`` long. Resuming truncates anything written after
+    the last checkpoint and skips that many records.
+    """
+
+    def __init__(self, source: str, output: str, workers: int = 8, fmt: Optional[str] = None,
+                 checkpoint: Optional[str] = None, checkpoint_every: int = 100,
+                 progress_interval: float = 10.0, limit: Optional[int] = None, quiet: bool = False):
+        self.source = source
+        self.output = output
+        self.workers = max(1, workers)
+        self.window = self.workers * 4
+        self.fmt = fmt
+        self.output_fmt = "ndjson" if output.lower().endswith((".jsonl", ".ndjson")) else "csv"
+        self.checkpoint = checkpoint or output + ".checkpoint.json"
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.progress_interval = progress_interval
+        self.limit = limit
+        self.quiet = quiet
+        self.counts = {"analyzed": 0, "fallbacks": 0, "skipped": 0, "errors": 0}
+        self.done = 0  # input records written (or skipped) in order
+        self.resumed_from = 0
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if not os.path.exists(self.checkpoint):
+            if os.path.exists(self.output) and os.path.getsize(self.output):
+                raise FileExistsError(f"{self.output} exists without a checkpoint; remove it or pick another output")
+            return {}
+        with open(self.checkpoint, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("source") != self.source:
+            raise ValueError(f"checkpoint {self.checkpoint} belongs to {state.get('source')!r}")
+        return state
+
+    def _save_checkpoint(self, handle) -> None:
+        handle.flush()
+        os.fsync(handle.fileno())
+        state = {"source": self.source, "records": self.done, "output_bytes": handle.tell(), "counts": self.counts}
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint)
+
+    def _report(self, started: float, final: bool = False) -> Dict[str, Any]:
+        elapsed = time.monotonic() - started
+        processed = self.done - self.resumed_from
+        summary = {
+            "records": self.done,
+            "processed": processed,
+            **self.counts,
+            "elapsed_s": round(elapsed, 2),
+            "records_per_s": round(processed / elapsed, 2) if elapsed else 0.0,
+        }
+        if not self.quiet:
+            label = "done" if final else "progress"
+            print(f"{label}: " + " ".join(f"{k}={v}" for k, v in summary.items()), file=sys.stderr, flush=True)
+        return summary
+
+    async def run(self) -> Dict[str, Any]:
+        from app.services import ai_analyzer, http_clients
+        state = self._load_checkpoint()
+        self.done = self.resumed_from = state.get("records", 0)
+        self.counts.update(state.get("counts", {}))
+        handle = open(self.output, "r+" if state else "w", encoding="utf-8", newline="")
+        if state:
+            handle.truncate(state["output_bytes"])  # drop rows written after the last checkpoint
+            handle.seek(state["output_bytes"])
+        elif self.output_fmt == "csv":
+            handle.write(_csv_line(OUTPUT_HEADERS))
+        records = read_records(self.source, self.fmt)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers)
+        slots = asyncio.Semaphore(self.window)
+        finished: Dict[int, Tuple[str, Optional[str]]] = {}
+        started = last_report = time.monotonic()
+
+        def next_record() -> Optional[Dict[str, Any]]:
+            return next(records, None)
+
+        async def produce() -> None:
+            index = 0
+            while self.limit is None or index < self.resumed_from + self.limit:
+                # Reading runs in a thread so blob downloads don't stall in-flight analyses
+                record = await asyncio.to_thread(next_record)
+                if record is None:
+                    break
+                if index >= self.resumed_from:
+                    await slots.acquire()
+                    await queue.put((index, record))
+                index += 1
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        def complete(index: int, outcome: str, row: Optional[str]) -> None:
+            nonlocal last_report
+            finished[index] = (outcome, row)
+            while self.done in finished:
+                # Counted in order too, so a checkpoint's counts match its records
+                outcome, row = finished.pop(self.done)
+                self.counts[outcome] += 1
+                if row is not None:
+                    handle.write(row)
+                self.done += 1
+                slots.release()
+                if (self.done - self.resumed_from) % self.checkpoint_every == 0:
+                    self._save_checkpoint(handle)
+            if self.progress_interval and time.monotonic() - last_report >= self.progress_interval:
+                last_report = time.monotonic()
+                self._report(started)
+
+        async def work() -> None:
+            while (item := await queue.get()) is not None:
+                index, record = item
+                data = to_failure(record)
+                if data is None:
+                    complete(index, "skipped", None)
+                    continue
+                try:
+                    result = await ai_analyzer.analyze_failure(data)
+                    outcome = "fallbacks" if result.fallback_reason else "analyzed"
+                except Exception as e:
+                    outcome = "errors"
+                    result = ai_analyzer.fallback_result(data, "reanalysis_error", f"Re-analysis failed: {e}", "Re-run this record.")
+                complete(index, outcome, format_row(index, data, result, self.output_fmt))
+
+        try:
+            await asyncio.gather(produce(), *(work() for _ in range(self.workers)))
+        finally:
+            self._save_checkpoint(handle)
+            handle.close()
+            await http_clients.close_clients()
+        return self._report(started, final=True)
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="CSV or NDJSON path, or adls://<container>/<blob>")
+    parser.add_argument("--output", required=True, help="New log file (.csv, or .jsonl/.ndjson)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format (default: from the extension)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent analyses")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Records between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between throughput reports")
+    parser.add_argument("--limit", type=int, help="Stop after this many records (this run)")
+    args = parser.parse_args(argv)
+    job = Reanalysis(args.source, args.output, workers=args.workers, fmt=args.format, checkpoint=args.checkpoint,
+                     checkpoint_every=args.checkpoint_every, progress_interval=args.progress_interval, limit=args.limit)
+    return asyncio.run(job.run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from app.core.config import Settings, get_settings
+
+# (name, pattern, triggers). Patterns run against a lowercased copy of the text,
+# so literals are written in lowercase; group 1 is the secret that is replaced
+# with "***" (no group: the whole match). A rule only joins the scan when one of
+# its trigger substrings occurs in the text; rules without triggers always do.
+Rule = Tuple[str, str, Tuple[str, ...]]
+_TOKEN = r"([^;\s\"'&<>]+)"
+DEFAULT_RULES: List[Rule] = [
+    ("bearer", r"bearer\s+([a-z0-9\-._~+/]+=*)", ("bearer",)),
+    ("jwt", r"eyj[a-z0-9_-]{5,}\.eyj[a-z0-9_-]{5,}\.[a-z0-9_-]*", ("eyj",)),
+    ("sas_signature", r"[?&]sig=([^&\s\"'<>]+)", ("sig=",)),
+    ("shared_access", r"sharedaccess(?:signature|key)\s*[=:]\s*" + _TOKEN, ("sharedaccess",)),
+    ("account_key", r"accountkey\s*[=:]\s*" + _TOKEN, ("accountkey",)),
+    ("client_secret", r"client_secret\s*[=:]\s*" + _TOKEN, ("client_secret",)),
+    ("access_token", r"access_token\s*[=:]\s*" + _TOKEN, ("access_token",)),
+    ("url_credentials", r"://[^:/\s@]+:([^@\s/]+)(?=@)", ("@",)),
+    # The original SENSITIVE_PATTERNS, one branch each so every branch starts with a literal
+    ("password", r"password\s*=\s*([^;\s]+)", ("password",)),
+    ("secret", r"secret\s*=\s*([^;\s]+)", ("secret",)),
+    ("key", r"key\s*=\s*([^;\s]+)", ("key",)),
+    ("pwd", r"pwd\s*=\s*([^;\s]+)", ("pwd",)),
+]
+MASK = "***"
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+class RedactionEngine:
+    """Redacts secrets in one regex pass over the text.
+
+    All rules are joined into a single case-sensitive alternation that is run on
+    a lowercased copy: CPython's ``re`` can then skip positions whose character
+    cannot start any branch and fail each branch on its first literal, which
+    IGNORECASE would disable. A substring check first drops rules whose trigger
+    words are absent; the alternation for each rule combination is compiled once.
+    """
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES, max_chars: int = 0):
+        self.rules = list(rules)
+        self.max_chars = max_chars
+        self._branches: List[str] = []
+        for name, pattern, _ in self.rules:
+            groups = re.compile(pattern).groups
+            if groups > 1:
+                raise ValueError(f"redaction rule {name!r} may only capture the secret (group 1)")
+            self._branches.append(pattern if groups else f"({pattern})")
+        self._compiled: Dict[Tuple[int, ...], re.Pattern] = {}
+
+    def _pattern(self, active: Tuple[int, ...]) -> re.Pattern:
+        pattern = self._compiled.get(active)
+        if pattern is None:
+            pattern = self._compiled[active] = re.compile("|".join(self._branches[i] for i in active))
+        return pattern
+
+    def redact(self, text: str) -> str:
+        if not text:
+            return text
+        text = truncate(text, self.max_chars)
+        lowered = text.lower()
+        if len(lowered) != len(text):  # a few non-ASCII characters change length when lowercased
+            lowered = text.translate(_ASCII_LOWER)
+        active = tuple(i for i, (_, _, triggers) in enumerate(self.rules) if not triggers or any(t in lowered for t in triggers))
+        if not active:
+            return text
+        # Every branch has exactly one group, so lastindex is the matched secret
+        out: List[str] = []
+        pos = 0
+        for match in self._pattern(active).finditer(lowered):
+            start, end = match.span(match.lastindex)
+            out.append(text[pos:start])
+            out.append(MASK)
+            pos = end
+        if not out:
+            return text
+        out.append(text[pos:])
+        return "".join(out)
+
+def truncate(text: str, max_chars: int) -> str:
+    """Cut ``text`` to about ``max_chars`` on a line (or whitespace) boundary so no token is split."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = max(text.rfind(" ", 0, max_chars), text.rfind("\t", 0, max_chars))
+    if cut < max_chars // 2:
+        cut = max_chars
+    return f"{text[:cut]}\n...[truncated {len(text) - cut} chars]"
+
+def rules_from_settings(settings: Settings) -> List[Rule]:
+    rules = list(DEFAULT_RULES)
+    extra = settings.redaction_extra_patterns
+    if extra:
+        patterns: Iterable[str] = json.loads(extra) if extra.lstrip().startswith("[") else [extra]
+        rules.extend((f"custom_{i}", f"(?i:{p})", ()) for i, p in enumerate(patterns))
+    return rules
+
+_engine: Optional[RedactionEngine] = None
+
+def get_engine() -> RedactionEngine:
+    global _engine
+    if _engine is None:
+        settings = get_settings()
+        _engine = RedactionEngine(rules_from_settings(settings), max_chars=settings.redaction_max_chars)
+    return _engine
+
+def set_engine(engine: Optional[RedactionEngine]) -> Optional[RedactionEngine]:
+    global _engine
+    previous, _engine = _engine, engine
+    return previous
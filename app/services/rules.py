@@ -0,0 +1,192 @@
+from __future__ import annotations
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.core.config import get_settings
+from app.models.schemas import AnalysisResult, FailureNotification
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    simplified_error: str
+    probable_reason: str
+    probable_fix: str
+    confidence: float
+    codes: Tuple[str, ...] = ()
+    pattern: Optional[str] = None  # regex, matched case-insensitively anywhere in the error text
+
+    def result(self) -> AnalysisResult:
+        return AnalysisResult(
+            simplified_error=self.simplified_error,
+            probable_reason=self.probable_reason,
+            probable_fix=self.probable_fix,
+            confidence=self.confidence,
+        )
+
+DEFAULT_RULES: List[Rule] = [
+    Rule("adf_file_not_found",
+         "Source file or folder was not found.",
+         "The path in the dataset does not exist yet (upstream late/failed, wrong date partition, or renamed folder).",
+         "Check the dataset path and its dynamic expressions, confirm the upstream drop landed, or add a Get Metadata/Validation activity before the copy.",
+         0.9, pattern=r"UserErrorFileNotFound|PathNotFound|BlobNotFound|The specified (?:path|blob) does not exist"),
+    Rule("sql_duplicate_key",
+         "Insert into SQL failed on a duplicate key.",
+         "Rows being loaded violate a primary key or unique constraint (re-run without cleanup, or duplicate source rows).",
+         "De-duplicate the source, make the load idempotent (upsert/MERGE or pre-copy delete), or truncate the staging table before re-running.",
+         0.9, pattern=r"Violation of (?:PRIMARY KEY|UNIQUE KEY) constraint|Cannot insert duplicate key"),
+    Rule("adf_2108_auth",
+         "HTTP call from a Web/REST activity was rejected as unauthorized.",
+         "The endpoint returned 401/403: expired or wrong credentials, or the managed identity lacks permission.",
+         "Refresh the secret or token in the linked service/Key Vault and grant the factory identity access to the endpoint.",
+         0.85, codes=("2108",), pattern=r"\b40[13]\b|Unauthorized|Forbidden"),
+    Rule("adf_2108",
+         "HTTP call from a Web/REST activity failed.",
+         "The endpoint returned an error status or could not be reached.",
+         "Check the URL, headers and body in the activity, and the endpoint's availability and logs.",
+         0.7, codes=("2108",)),
+    Rule("adf_2200",
+         "Copy activity failed.",
+         "The copy failed on the source or sink side; the inner error names the cause.",
+         "Open the activity output, check the source/sink named in the message, and validate linked service connectivity and schema mapping.",
+         0.5, codes=("2200",)),
+    Rule("spark_oom",
+         "Spark job ran out of memory.",
+         "An executor or the driver exceeded its memory (large shuffle/skewed partition, collect() to driver, or undersized cluster).",
+         "Increase executor/driver memory or node size, repartition skewed keys, avoid collect() on large data, and enable adaptive query execution.",
+         0.9, pattern=r"java\.lang\.OutOfMemoryError|SparkOutOfMemoryError|GC overhead limit exceeded|Container killed by YARN for exceeding memory limits|exit code 137"),
+    Rule("spark_unresolved_column",
+         "Spark query references a column that does not exist.",
+         "The input schema changed or the column name is misspelled.",
+         "Compare the source schema with the query, handle schema drift explicitly, and fix the column reference.",
+         0.85, pattern=r"UNRESOLVED_COLUMN|AnalysisException: .{0,200}cannot resolve"),
+    Rule("delta_concurrent_write",
+         "Delta table write conflicted with a concurrent writer.",
+         "Two jobs wrote overlapping files of the same Delta table at the same time.",
+         "Serialize the writers, partition the writes so they do not overlap, or retry the write on conflict.",
+         0.85, pattern=r"ConcurrentAppendException|ConcurrentDeleteReadException|ConcurrentModificationException"),
+    Rule("k8s_oom_killed",
+         "Container was killed for exceeding its memory limit.",
+         "The pod used more memory than its limit (OOMKilled).",
+         "Raise the container memory limit/request or reduce the workload's memory use.",
+         0.9, pattern=r"OOMKilled"),
+    Rule("k8s_image_pull",
+         "Kubernetes could not pull the container image.",
+         "The image name/tag is wrong or the registry credentials are missing.",
+         "Verify the image reference and tag, and the imagePullSecrets or registry access of the node identity.",
+         0.9, pattern=r"ErrImagePull|ImagePullBackOff"),
+    Rule("k8s_crash_loop",
+         "Container keeps crashing on start (CrashLoopBackOff).",
+         "The process exits right after starting: bad configuration, missing secret/env var, or an application error.",
+         "Check `kubectl logs --previous` for the exit reason and validate the container's config, secrets and probes.",
+         0.85, pattern=r"CrashLoopBackOff"),
+    Rule("auth_failure",
+         "Authentication to a data store or service failed.",
+         "Credentials are invalid or expired, or the identity lacks access.",
+         "Rotate/refresh the secret in Key Vault or the linked service and confirm the identity's role assignments and firewall rules.",
+         0.85, pattern=r"AADSTS\d+|Login failed for user|AuthenticationFailed|AuthorizationPermissionMismatch|invalid_client"),
+    Rule("throttled",
+         "Requests were throttled by the target service.",
+         "The service rejected calls with 429/TooManyRequests because a rate or capacity limit was hit.",
+         "Lower parallelism/DIUs, add retry with backoff, or raise the service tier or quota.",
+         0.8, pattern=r"TooManyRequests|Too Many Requests|(?:HTTP(?:/[\d.]+)?|status(?:\s*code)?)\s*[:=]?\s*429\b|throttl"),
+    Rule("timeout",
+         "Operation timed out.",
+         "The target was slow or unreachable within the configured timeout.",
+         "Check connectivity (integration runtime, firewall, private endpoints) and raise the activity timeout if the workload is just slow.",
+         0.6, pattern=r"timed out|TimeoutException|\btimeout expired"),
+]
+
+# Stack frames never carry the message text rules look for; skip them before scanning
+_FRAME_LINE = re.compile(r"^[ \t]*(?:at |\.\.\. \d+ more|File \").*\n?", re.MULTILINE)
+SCAN_MAX_CHARS = 32768
+
+def scan_text(text: str) -> str:
+    # Unique non-frame lines: retried Spark tasks repeat the same exception many times
+    return "\n".join(dict.fromkeys(_FRAME_LINE.sub("", text).splitlines()))[:SCAN_MAX_CHARS]
+
+def load_rules(path: str) -> List[Rule]:
+    """Reads a JSON list of rule objects (same fields as ``Rule``; ``keywords`` may be given instead of ``pattern``)."""
+    with open(path, encoding="utf-8") as f:
+        items: List[Dict[str, Any]] = json.load(f)
+    rules = []
+    for item in items:
+        item = dict(item)
+        keywords = item.pop("keywords", None)
+        if keywords and not item.get("pattern"):
+            item["pattern"] = "|".join(re.escape(k) for k in keywords)
+        item["codes"] = tuple(str(c) for c in item.get("codes") or ())
+        rules.append(Rule(**item))
+    return rules
+
+class RuleClassifier:
+    """Matches a failure against known rules without calling the model.
+
+    Error codes are a dict lookup; all regex rules are compiled into one named-group
+    alternation and the text (minus stack frames and repeated lines) is scanned once. The most confident matching rule wins;
+    on equal confidence the earlier rule does, so a configured rule beats a default only when it is at least as confident.
+    """
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES):
+        self.rules = list(rules)
+        self._by_code: Dict[str, List[int]] = {}
+        parts = []
+        for i, rule in enumerate(self.rules):
+            if not rule.codes and not rule.pattern:
+                raise ValueError(f"rule {rule.name!r} needs codes, a pattern, or both")
+            for code in rule.codes:
+                self._by_code.setdefault(code.lower(), []).append(i)
+            if rule.pattern:
+                parts.append(f"(?P<r{i}>{rule.pattern})")
+        self._pattern = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, data: FailureNotification) -> Optional[Rule]:
+        text = scan_text(data.errorMessage or "")
+        code = (data.errorCode or "").lower()
+        matched: set = set()
+        if self._pattern is not None:
+            matched = {int(m.lastgroup[1:]) for m in self._pattern.finditer(text)}
+        by_code = self._by_code.get(code, ())
+        best: Optional[int] = None
+        for i in sorted(matched.union(by_code)):
+            rule = self.rules[i]
+            if rule.codes and i not in by_code:
+                continue
+            if rule.pattern and i not in matched:
+                # finditer only reports non-overlapping matches; re-check a code match's own pattern
+                if not re.search(rule.pattern, text, re.IGNORECASE):
+                    continue
+            if best is None or rule.confidence > self.rules[best].confidence:
+                best = i
+        return self.rules[best] if best is not None else None
+
+    def classify(self, data: FailureNotification, min_confidence: float) -> Optional[AnalysisResult]:
+        """The matching rule's analysis when it is at least ``min_confidence``, else ``None`` (ask the model)."""
+        rule = self.match(data)
+        if rule is None or rule.confidence < min_confidence:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rule.result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rules": len(self.rules), "hits": self.hits, "misses": self.misses}
+
+_classifier: Optional[RuleClassifier] = None
+
+def get_classifier() -> Optional[RuleClassifier]:
+    global _classifier
+    settings = get_settings()
+    if not settings.rules_enabled:
+        return None
+    if _classifier is None:
+        rules = load_rules(settings.rules_path) if settings.rules_path else []
+        _classifier = RuleClassifier(rules + DEFAULT_RULES)
+    return _classifier
+
+def set_classifier(classifier: Optional[RuleClassifier]) -> Optional[RuleClassifier]:
+    global _classifier
+    previous, _classifier = _classifier, classifier
+    return previous
@@ -0,0 +1,377 @@
+"""State shared by every worker process: analysis cache entries, alert-dedup claims and counters, rate windows.
+
+Under ``uvicorn --workers N`` each process has its own analysis cache, incident grouper and
+token buckets, so a failure storm is analyzed, alerted and rate-limited N times over.
+``STATE_BACKEND`` picks where that state also lives:
+
+* ``memory`` (default): this process only; components keep their in-process behaviour.
+* ``sqlite``: one SQLite file (WAL) shared by the workers of a host. On Linux, a path under
+  ``/dev/shm`` keeps it in shared memory.
+* ``redis``: any Redis-compatible server (Redis, Valkey, Azure Cache for Redis), for several
+  hosts. Needs ``pip install .[redis]``.
+
+Backends store strings; counters are integers. Components call them through ``run()``, which keeps
+SQLite and Redis I/O off the event loop and turns a backend failure into the in-process behaviour
+(counted in ``/healthz``) instead of a failed request.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.core.config import get_settings
+
+class StateBackend(ABC):
+    """Key/value operations the shared components need. Keys are namespaced with ``prefix``."""
+
+    # False when the state is only visible to this process (components then skip it)
+    shared = True
+    # True when calls do I/O; ``run()`` then makes them from a worker thread
+    blocking = True
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Sets ``key`` only if it's absent (or expired); True if this call set it."""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Adds ``amount`` and returns the new value; ``ttl`` applies when the counter is created."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+    async def run(self, op: str, *args: Any, default: Any = None) -> Any:
+        """Calls ``op`` (``get``, ``set``, ``add``, ``incr``, ``delete``) without blocking the event loop.
+
+        Any backend error (server down, lock timeout, closed connection) returns ``default``;
+        callers then act on their in-process state alone.
+        """
+        try:
+            if self.blocking:
+                return await asyncio.to_thread(getattr(self, op), *args)
+            return getattr(self, op)(*args)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = f"{op}: {e.__class__.__name__}: {e}"
+            return default
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "shared": self.shared, "errors": self.errors, "last_error": self.last_error}
+
+class MemoryBackend(StateBackend):
+    shared = False
+    blocking = False
+
+    def __init__(self, prefix: str = "", clock: Callable[[], float] = time.time):
+        super().__init__(prefix)
+        self._clock = clock
+        self._items: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Any, Optional[float]]]:
+        item = self._items.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._items[key]
+            return None
+        return item
+
+    def _write(self, key: str, value: Any, expires_at: Optional[float], now: float) -> None:
+        self._items[key] = (value, expires_at)
+        self._writes += 1
+        if self._writes % 1024 == 0:
+            for k in [k for k, (_, exp) in self._items.items() if exp is not None and exp <= now]:
+                del self._items[k]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._live(self.prefix + key, self._clock())
+        return None if item is None else str(item[0])
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        now = self._clock()
+        with self._lock:
+            self._write(self.prefix + key, value, now + ttl if ttl else None, now)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        now = self._clock()
+        with self._lock:
+            if self._live(self.prefix + key, now) is not None:
+                return False
+            self._write(self.prefix + key, value, now + ttl if ttl else None, now)
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = self._clock()
+        key = self.prefix + key
+        with self._lock:
+            item = self._live(key, now)
+            if item is None:
+                value, expires_at = amount, (now + ttl if ttl else None)
+            else:
+                value, expires_at = int(item[0]) + amount, item[1]
+            self._write(key, value, expires_at, now)
+            return value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(self.prefix + key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "keys": len(self._items)}
+
+class SQLiteBackend(StateBackend):
+    """One table in a WAL-mode SQLite file; every statement is atomic on its own, so workers
+    on the same host can share it without extra locking."""
+
+    def __init__(self, path: str, prefix: str = "", clock: Callable[[], float] = time.time):
+        super().__init__(prefix)
+        self.path = path
+        self._clock = clock
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # No type on value: counters stay integers, everything else is text
+        self._db.execute("CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value, expires_at REAL)")
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _write(self, sql: str, params: tuple) -> Tuple[int, Optional[tuple]]:
+        # (rows changed, RETURNING row); the row is read before another thread can use the connection
+        with self._lock:
+            self._writes += 1
+            if self._writes % 1024 == 0:
+                self._db.execute("DELETE FROM shared_state WHERE expires_at <= ?", (self._clock(),))
+            cursor = self._db.execute(sql, params)
+            row = cursor.fetchone()
+            return cursor.rowcount, row
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (self.prefix + key, self._clock()),
+            ).fetchone()
+        return None if row is None else str(row[0])
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = self._clock() + ttl if ttl else None
+        self._write("INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)", (self.prefix + key, value, expires_at))
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        now = self._clock()
+        changed, _ = self._write(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE "
+            "SET value = excluded.value, expires_at = excluded.expires_at WHERE shared_state.expires_at <= ?",
+            (self.prefix + key, value, now + ttl if ttl else None, now),
+        )
+        return changed == 1
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = self._clock()
+        # An expired counter restarts from ``amount`` with a fresh expiry
+        _, row = self._write(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "value = CASE WHEN shared_state.expires_at <= ? THEN excluded.value ELSE CAST(shared_state.value AS INTEGER) + excluded.value END, "
+            "expires_at = CASE WHEN shared_state.expires_at <= ? THEN excluded.expires_at ELSE shared_state.expires_at END "
+            "RETURNING value",
+            (self.prefix + key, amount, now + ttl if ttl else None, now, now),
+        )
+        return int(row[0])
+
+    def delete(self, key: str) -> None:
+        self._write("DELETE FROM shared_state WHERE key = ?", (self.prefix + key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path}
+
+class RedisBackend(StateBackend):
+    """Redis-compatible server through ``redis-py`` (imported only when this backend is used).
+
+    ``client`` replaces the connection built from ``url``; anything with redis-py's
+    ``get``/``set``/``incrby``/``pexpire``/``delete`` works.
+    """
+
+    def __init__(self, url: str, prefix: str = "", client: Any = None):
+        super().__init__(prefix)
+        if client is None:
+            import redis  # optional dependency
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.url = url
+        self._client = client
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(self._client.set(self.prefix + key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = int(self._client.incrby(self.prefix + key, amount))
+        # The call that created the counter sets its expiry
+        if ttl and value == amount:
+            self._client.pexpire(self.prefix + key, int(ttl * 1000))
+        return value
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "url": self.url.split("@")[-1]}  # no credentials
+
+# Rate windows outlive their minute a little, so refunds and late calls still find them
+_WINDOW_TTL = 120.0
+
+class SharedBucket:
+    """Per-minute limit counted in the shared backend, so all workers draw from one budget.
+
+    Async counterpart of ``openai_pool.TokenBucket`` (``await reserve``/``await refund``; see
+    ``reserve()`` below for callers holding either). Usage is counted in fixed one-minute windows
+    (a burst may straddle two); when this minute is spent, the call is booked into the next one and
+    waits for it, or is refused if that's beyond ``max_wait``. While the backend is failing, this
+    worker falls back to its own token bucket.
+    """
+
+    def __init__(self, backend: StateBackend, name: str, per_minute: float, clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.name = name
+        self.capacity = int(per_minute)
+        self._clock = clock
+        self._local: Any = None
+        # Last reservation per task, so a refund after another task's reserve returns the right one
+        self._charged: "weakref.WeakKeyDictionary[asyncio.Task, Tuple[str, int]]" = weakref.WeakKeyDictionary()
+
+    def _fallback(self) -> Any:
+        if self._local is None:
+            from .openai_pool import TokenBucket
+            self._local = TokenBucket(self.capacity)
+        return self._local
+
+    async def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        now = self._clock()
+        minute = int(now // 60)
+        units = min(int(amount), self.capacity)
+        if units <= 0:
+            return 0.0
+        task = asyncio.current_task()
+        for window in (minute, minute + 1):
+            wait = max(0.0, window * 60 - now)
+            if wait > max_wait:
+                return None
+            key = f"rate:{self.name}:{window}"
+            used = await self.backend.run("incr", key, units, _WINDOW_TTL)
+            if used is None:
+                return self._fallback().reserve(amount, max_wait)
+            if used <= self.capacity:
+                if task is not None:
+                    self._charged[task] = (key, units)
+                return wait
+            await self.backend.run("incr", key, -units, _WINDOW_TTL)
+        return None
+
+    async def refund(self, amount: float) -> None:
+        task = asyncio.current_task()
+        charged = self._charged.pop(task, None) if task is not None else None
+        if charged is not None:
+            key, units = charged
+            await self.backend.run("incr", key, -min(units, int(amount)), _WINDOW_TTL)
+        elif self._local is not None:
+            self._local.refund(amount)
+
+async def reserve(limiter: Any, amount: float, max_wait: float) -> Optional[float]:
+    """``reserve`` on a ``TokenBucket`` or a ``SharedBucket``."""
+    if isinstance(limiter, SharedBucket):
+        return await limiter.reserve(amount, max_wait)
+    return limiter.reserve(amount, max_wait)
+
+async def refund(limiter: Any, amount: float) -> None:
+    if isinstance(limiter, SharedBucket):
+        await limiter.refund(amount)
+    else:
+        limiter.refund(amount)
+
+def backend_from_settings(settings) -> StateBackend:
+    kind = (settings.state_backend or "memory").lower()
+    prefix = settings.state_key_prefix
+    if kind == "sqlite":
+        return SQLiteBackend(settings.state_sqlite_path or os.path.join("state", "shared_state.db"), prefix)
+    if kind == "redis":
+        return RedisBackend(settings.state_redis_url, prefix)
+    if kind != "memory":
+        raise ValueError(f"Unknown STATE_BACKEND {settings.state_backend!r} (memory, sqlite or redis)")
+    return MemoryBackend(prefix)
+
+_backend: Optional[StateBackend] = None
+_limiters: Dict[Tuple[str, int], Any] = {}
+
+def get_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        _backend = backend_from_settings(get_settings())
+    return _backend
+
+def shared_backend() -> Optional[StateBackend]:
+    """The backend if other workers can see it, else None (components then stay in-process)."""
+    backend = get_backend()
+    return backend if backend.shared else None
+
+def current_backend() -> Optional[StateBackend]:
+    return _backend
+
+def set_backend(backend: Optional[StateBackend]) -> Optional[StateBackend]:
+    global _backend
+    previous, _backend = _backend, backend
+    _limiters.clear()
+    return previous
+
+def rate_limiter(name: str, per_minute: int) -> Any:
+    """A ``reserve``/``refund`` limiter for ``name``: shared across workers when the backend is,
+    else an in-process token bucket."""
+    limiter = _limiters.get((name, per_minute))
+    if limiter is None:
+        backend = shared_backend()
+        if backend is not None:
+            limiter = SharedBucket(backend, name, per_minute)
+        else:
+            from .openai_pool import TokenBucket
+            limiter = TokenBucket(per_minute)
+        _limiters[(name, per_minute)] = limiter
+    return limiter
+
+async def shutdown() -> None:
+    backend = set_backend(None)
+    if backend is not None:
+        backend.close()
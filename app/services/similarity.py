@@ -0,0 +1,223 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import get_settings
+from app.models.schemas import AnalysisResult, FailureNotification
+from .fingerprint import normalize_error
+from .rules import scan_text
+
+_WORD = re.compile(r"<\w+>|[a-z][a-z0-9_]+")
+
+def hashed_features(data: FailureNotification, dim: int) -> Dict[int, int]:
+    """Term counts of word unigrams, word bigrams and character trigrams (plus the error code), hashed into ``dim`` buckets.
+
+    The text is normalized like the fingerprint (redacted, ids/numbers/paths replaced), so
+    run-specific values don't count; trigrams let ``FileNotFound`` meet ``file not found``.
+    """
+    words = _WORD.findall(normalize_error(scan_text(data.errorMessage or "")))
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in set(words):
+        padded = f" {word} "
+        terms += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    if data.errorCode:
+        terms.append(f"code:{data.errorCode.lower()}")
+    counts: Dict[int, int] = {}
+    for term in terms:
+        # crc32 is stable across processes (unlike hash()), which a persisted index needs
+        i = zlib.crc32(term.encode("utf-8")) % dim
+        counts[i] = counts.get(i, 0) + 1
+    return counts
+
+class SimilarityIndex:
+    """Nearest past analysis by cosine similarity of hashed n-gram TF-IDF vectors.
+
+    Vectors sit in a fixed-capacity float32 matrix used as a ring (the oldest entry is
+    replaced when full); search is one matrix-vector product. With ``path`` the matrix is a
+    memory-mapped file next to the document frequencies and entry metadata, so loading maps
+    it instead of reading it. An existing index keeps the shape it was created with.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 10000, dim: int = 2048, threshold: float = 0.75):
+        import numpy as np  # optional dependency: pip install .[similarity]
+        self._np = np
+        self.path = path
+        self.capacity = max(1, capacity)
+        self.dim = max(64, dim)
+        self.threshold = threshold
+        self.count = 0  # entries ever added; the next row is count % capacity
+        self._entries: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._open(path)
+        else:
+            self._vectors = np.zeros((self.capacity, self.dim), dtype=np.float32)
+            self._df = np.zeros(self.dim, dtype=np.float64)
+            self._entries = [None] * self.capacity
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self, path: str) -> None:
+        np = self._np
+        os.makedirs(path, exist_ok=True)
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.capacity, self.dim, self.count = meta["capacity"], meta["dim"], meta["count"]
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+            self._df = np.load(self._file("df.npy"))
+        else:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="w+", shape=(self.capacity, self.dim))
+            self._df = np.zeros(self.dim, dtype=np.float64)
+        self._entries = [None] * self.capacity
+        lines = 0
+        if os.path.exists(self._file("entries.jsonl")):
+            with open(self._file("entries.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    entry = json.loads(line)
+                    row = entry.pop("row")
+                    if row < self.capacity:
+                        self._entries[row] = entry  # later lines replace reused rows
+        # Entries written after the last meta.json save (crash) are ignored with their rows
+        for row in range(min(self.count, self.capacity), self.capacity):
+            self._entries[row] = None
+        self._rows = {e["fingerprint"]: row for row, e in enumerate(self._entries) if e is not None}
+        if lines > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp = self._file("entries.jsonl.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row, entry in enumerate(self._entries):
+                if entry is not None:
+                    f.write(json.dumps({"row": row, **entry}) + "\n")
+        os.replace(tmp, self._file("entries.jsonl"))
+
+    def _save_state(self) -> None:
+        np = self._np
+        with open(self._file("df.npy.tmp"), "wb") as f:
+            np.save(f, self._df)
+        os.replace(self._file("df.npy.tmp"), self._file("df.npy"))
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"capacity": self.capacity, "dim": self.dim, "count": self.count}, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    def _vector(self, counts: Dict[int, int]):
+        np = self._np
+        docs = min(self.count, self.capacity)
+        idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        idf = np.log((1.0 + docs) / (1.0 + self._df[idx])) + 1.0
+        vec = np.zeros(self.dim, dtype=np.float32)
+        vec[idx] = (1.0 + np.log(tf)) * idf
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def search(self, data: FailureNotification) -> Optional[Tuple[AnalysisResult, float]]:
+        """The most similar past analysis and its cosine score, if at least ``threshold``."""
+        counts = hashed_features(data, self.dim)
+        with self._lock:
+            size = min(self.count, self.capacity)
+            if not counts or not size:
+                self.misses += 1
+                return None
+            scores = self._vectors[:size] @ self._vector(counts)
+            row = int(scores.argmax())
+            score = float(scores[row])
+            entry = self._entries[row]
+            if score < self.threshold or entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        result = AnalysisResult(**entry["result"])
+        # A near match is at most as certain as the match itself
+        result.confidence = round(min(result.confidence, score), 2)
+        return result, score
+
+    def add(self, data: FailureNotification, fingerprint: str, result: AnalysisResult) -> bool:
+        counts = hashed_features(data, self.dim)
+        if not counts:
+            return False
+        with self._lock:
+            if fingerprint in self._rows:
+                return False
+            np = self._np
+            row = self.count % self.capacity
+            old = self._entries[row]
+            if old is not None:
+                self._df -= self._vectors[row] != 0
+                self._rows.pop(old["fingerprint"], None)
+            self._df[np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))] += 1
+            self.count += 1
+            self._vectors[row] = self._vector(counts)
+            entry = {"fingerprint": fingerprint, "added": time.time(), "result": result.model_dump()}
+            self._entries[row] = entry
+            self._rows[fingerprint] = row
+            if self.path:
+                with open(self._file("entries.jsonl"), "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"row": row, **entry}) + "\n")
+                self._save_state()
+        return True
+
+    def close(self) -> None:
+        if self.path:
+            with self._lock:
+                self._vectors.flush()
+                self._save_state()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": min(self.count, self.capacity),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "persistent": self.path is not None,
+        }
+
+_index: Optional[SimilarityIndex] = None
+_unavailable = False
+
+def get_index() -> Optional[SimilarityIndex]:
+    global _index, _unavailable
+    settings = get_settings()
+    if not settings.similarity_enabled or _unavailable:
+        return None
+    if _index is None:
+        try:
+            _index = SimilarityIndex(
+                path=settings.similarity_index_dir or None,
+                capacity=settings.similarity_max_entries,
+                dim=settings.similarity_dimensions,
+                threshold=settings.similarity_threshold,
+            )
+        except ImportError:
+            _unavailable = True  # numpy not installed: the tier stays off
+            return None
+    return _index
+
+def current_index() -> Optional[SimilarityIndex]:
+    return _index
+
+def set_index(index: Optional[SimilarityIndex]) -> Optional[SimilarityIndex]:
+    global _index, _unavailable
+    previous, _index = _index, index
+    _unavailable = False
+    return previous
+
+async def shutdown() -> None:
+    index = set_index(None)
+    if index is not None:
+        index.close()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import get_settings
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key onto one in-flight task.
+
+    The work runs in its own task and every caller (leader included) awaits it
+    through ``asyncio.shield``, so a caller that is cancelled or times out never
+    cancels the shared upstream call for the others.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.collapsed = 0
+        self.timeouts = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """Run ``fn`` once per key; returns ``(result, shared)`` where ``shared`` marks a follower."""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            self.leaders += 1
+        else:
+            self.collapsed += 1
+        wait = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), wait), shared
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even when every caller has already given up
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "timeouts": self.timeouts,
+        }
+
+_flight: Optional[SingleFlight] = None
+
+def get_singleflight() -> Optional[SingleFlight]:
+    global _flight
+    settings = get_settings()
+    if not settings.singleflight_enabled:
+        return None
+    if _flight is None:
+        _flight = SingleFlight(timeout=settings.singleflight_timeout_seconds)
+    return _flight
+
+def set_singleflight(flight: Optional[SingleFlight]) -> Optional[SingleFlight]:
+    global _flight
+    previous, _flight = _flight, flight
+    return previous
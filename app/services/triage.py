@@ -0,0 +1,76 @@
+from __future__ import annotations
+import asyncio
+from typing import Optional, Tuple
+from app.core.config import get_settings
+from app.models.schemas import AnalysisResult, FailureNotification
+from . import ai_analyzer, analysis_cache, metrics, rules, similarity, singleflight
+from .fingerprint import fingerprint
+
+async def analyze(data: FailureNotification, fp: Optional[str] = None) -> Tuple[AnalysisResult, str]:
+    """Resolve an analysis for ``data``; returns the result and the tier that served it."""
+    key = fp or fingerprint(data)
+    local = await resolve_local(data, key)
+    if local is not None:
+        return local
+    flight = singleflight.get_singleflight()
+    if flight is None:
+        result = await _analyze_and_store(data, key)
+        return result, tier_of(result)
+    try:
+        result, shared = await flight.do(key, lambda: _analyze_and_store(data, key))
+    except asyncio.TimeoutError:
+        result = ai_analyzer.fallback_result(
+            data,
+            "coalesce_timeout",
+            probable_reason="Timed out waiting for an identical in-flight analysis.",
+            probable_fix="Retry shortly; the shared analysis will be cached when it completes."
+        )
+        return result, "fallback"
+    return result, "coalesced" if shared else tier_of(result)
+
+async def resolve_local(data: FailureNotification, key: str) -> Optional[Tuple[AnalysisResult, str]]:
+    """Answer from the cache, rules or similarity tier without calling the model; ``None`` on a miss."""
+    cache = analysis_cache.get_cache()
+    if cache is not None:
+        with metrics.stage("cache"):
+            cached = cache.get(key)
+            if cached is None:
+                cached = await cache.get_shared(key)  # another worker's analysis
+        if cached is not None:
+            return cached, "cache"
+    classifier = rules.get_classifier()
+    if classifier is not None:
+        # Well-known failures are answered locally; only misses and low-confidence matches reach the model
+        with metrics.stage("rules"):
+            matched = classifier.classify(data, get_settings().rules_min_confidence)
+        if matched is not None:
+            return matched, "rules"
+    index = similarity.get_index()
+    if index is not None:
+        # Same failure worded differently (other platform, other object names)
+        with metrics.stage("similarity"):
+            similar = index.search(data)
+        if similar is not None:
+            return similar[0], "similar"
+    return None
+
+async def remember(data: FailureNotification, key: str, result: AnalysisResult) -> None:
+    # Fallbacks describe a transient upstream problem, not the error itself; don't pin them
+    if result.fallback_reason is not None:
+        return
+    cache = analysis_cache.get_cache()
+    if cache is not None:
+        cache.put(key, result)
+    index = similarity.get_index()
+    if index is not None:
+        index.add(data, key, result)
+    if cache is not None:
+        await cache.put_shared(key, result)
+
+async def _analyze_and_store(data: FailureNotification, key: str) -> AnalysisResult:
+    result = await ai_analyzer.analyze_failure(data)
+    await remember(data, key, result)
+    return result
+
+def tier_of(result: AnalysisResult) -> str:
+    return "fallback" if result.fallback_reason else "llm"
@@ -0,0 +1,84 @@
+"""Memory per POST /api/v1/notify: peak bytes allocated while one request runs, by error size.
+
+    python -m benchmarks.bench_request_memory [--requests 20] [--sizes 1000,100000,1000000]
+
+Requests go through the whole path (triage, model call, CSV log, Teams, email and webhook)
+in-process, with upstreams answered by an ``httpx.MockTransport``. Each request's error text
+is unique, so the cache doesn't answer. Peaks are measured with ``tracemalloc`` after a warm-up,
+so one-time setup isn't counted.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import tracemalloc
+from typing import Dict, List
+import httpx
+from benchmarks.load_notify import API_KEY, LoadConfig, _patched_env, app_env
+
+FRAME = "\tat org.apache.spark.sql.execution.datasources.FileFormatWriter$.write(FileFormatWriter.scala:{n})\n"
+COMPLETION = json.dumps({"choices": [{"message": {"content": json.dumps({
+    "simplified_error": "Write to the sink failed.", "probable_reason": "Executor lost.", "probable_fix": "Retry.", "confidence": 0.7,
+})}}], "usage": {"prompt_tokens": 1000, "completion_tokens": 50}})
+
+def _upstream(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path.endswith("/chat/completions"):
+        return httpx.Response(200, content=COMPLETION, headers={"content-type": "application/json"})
+    if path.endswith("/oauth2/v2.0/token"):
+        return httpx.Response(200, json={"access_token": "t", "expires_in": 3600})
+    return httpx.Response(202)
+
+def failure(size: int, i: int) -> Dict[str, str]:
+    head = f"Job aborted in stage {chr(97 + i % 26)}{chr(97 + i // 26 % 26)}{chr(97 + i // 676 % 26)}: write failed\n"
+    frames = "".join(FRAME.format(n=n) for n in range(size // len(FRAME) + 1))
+    return {"pipelineName": "Ingest_Sales", "runId": f"run-{i}", "errorCode": "2200", "errorMessage": (head + frames)[:size]}
+
+async def measure(sizes: List[int], requests: int) -> Dict[int, Dict[str, float]]:
+    from app.main import app  # imported first: its load_dotenv must not override the bench env
+    from app.services import http_clients
+    results: Dict[int, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = app_env(LoadConfig(email=True, webhook=True), "http://upstreams.local")
+        env.update({"ENABLE_CSV_LOGGING": "true", "CSV_LOG_PATH": os.path.join(tmp, "log.csv"), "ANALYSIS_CACHE_ENABLED": "false"})
+        registry = http_clients.ClientRegistry(transport=httpx.MockTransport(_upstream))
+        with _patched_env(env):
+            previous = http_clients.set_registry(registry)
+            try:
+                async with app.router.lifespan_context(app):
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                        for i in range(3):  # warm-up
+                            await client.post("/api/v1/notify", headers={"x-api-key": API_KEY}, json=failure(1000, 10_000 + i))
+                        for size in sizes:
+                            bodies = [failure(size, i + size % 997) for i in range(requests)]
+                            peaks = []
+                            tracemalloc.start()
+                            for body in bodies:
+                                before = tracemalloc.get_traced_memory()[0]
+                                tracemalloc.reset_peak()
+                                r = await client.post("/api/v1/notify", headers={"x-api-key": API_KEY}, json=body)
+                                assert r.status_code == 200, r.text
+                                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+                            tracemalloc.stop()
+                            peaks.sort()
+                            results[size] = {"median_peak_kib": round(peaks[len(peaks) // 2] / 1024, 1), "max_peak_kib": round(peaks[-1] / 1024, 1)}
+            finally:
+                http_clients.set_registry(previous)
+                await registry.aclose()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated error sizes in characters")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = asyncio.run(measure(sizes, args.requests))
+    print(f"{'error size':>10} {'median peak KiB':>16} {'max peak KiB':>13} {'peak/size':>10}")
+    for size, r in results.items():
+        print(f"{size:>10} {r['median_peak_kib']:>16} {r['max_peak_kib']:>13} {r['median_peak_kib'] * 1024 / size:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Local stand-ins for Azure OpenAI, Teams, Microsoft Graph, a generic webhook and Blob storage.
+
+One ASGI app serves every upstream by path, with per-upstream latency and error injection.
+In-process runs route the app's pooled httpx clients to it through ``httpx.ASGITransport``;
+for uvicorn runs start it as a server:
+
+    python -m benchmarks.fake_upstreams --port 9100 --fault openai=0.8,0.2,0.05
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+UPSTREAMS = ("openai", "teams", "graph", "webhook", "blob")
+
+@dataclass
+class Fault:
+    latency: float = 0.0  # seconds before answering
+    jitter: float = 0.0  # extra uniform random latency
+    error_rate: float = 0.0  # share of calls answered with error_status
+    error_status: int = 503
+
+    @classmethod
+    def parse(cls, spec: str) -> "Fault":
+        """``latency[,jitter[,error_rate[,error_status]]]``, e.g. ``0.8,0.2,0.05,429``."""
+        parts = [p for p in spec.split(",") if p]
+        values = [float(p) for p in parts[:3]] + [int(p) for p in parts[3:4]]
+        return cls(*values)
+
+    async def delay(self, rand: random.Random) -> None:
+        seconds = self.latency + (rand.random() * self.jitter if self.jitter else 0.0)
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def failed(self, rand: random.Random) -> Optional[Response]:
+        if not self.error_rate or rand.random() >= self.error_rate:
+            return None
+        headers = {"retry-after": "1"} if self.error_status == 429 else {}
+        return JSONResponse({"error": {"code": "injected", "message": "Injected fault"}}, status_code=self.error_status, headers=headers)
+
+def parse_faults(specs) -> Dict[str, Fault]:
+    """``["openai=0.8,0.2", "teams=0.1"]`` -> per-upstream faults."""
+    faults: Dict[str, Fault] = {}
+    for spec in specs or ():
+        name, _, value = spec.partition("=")
+        if name not in UPSTREAMS:
+            raise ValueError(f"unknown upstream {name!r} (expected one of {', '.join(UPSTREAMS)})")
+        faults[name] = Fault.parse(value)
+    return faults
+
+def build_app(faults: Optional[Dict[str, Fault]] = None, seed: int = 0) -> Starlette:
+    faults = faults or {}
+    rand = random.Random(seed)
+    calls: Dict[str, int] = {name: 0 for name in UPSTREAMS}
+
+    def inject(name: str):
+        fault = faults.get(name, Fault())
+
+        def wrap(handler):
+            async def endpoint(request: Request) -> Response:
+                calls[name] += 1
+                await fault.delay(rand)
+                return fault.failed(rand) or await handler(request)
+            return endpoint
+        return wrap
+
+    @inject("openai")
+    async def chat(request: Request) -> Response:
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        content = json.dumps({
+            "simplified_error": f"Simulated analysis {digest}.",
+            "probable_reason": "Injected by the benchmark's fake Azure OpenAI.",
+            "probable_fix": "None needed.",
+            "confidence": 0.7,
+        })
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        if body.get("stream"):
+            chunks = [content[i:i + 16] for i in range(0, len(content), 16)]
+            events = [{"choices": [{"delta": {"content": c}}]} for c in chunks] + [{"choices": [], "usage": usage}]
+            text = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+            return Response(text, media_type="text/event-stream")
+        return JSONResponse({"choices": [{"message": {"content": content}}], "usage": usage})
+
+    @inject("teams")
+    async def teams(request: Request) -> Response:
+        await request.body()
+        return Response("1")
+
+    @inject("graph")
+    async def graph_token(request: Request) -> Response:
+        return JSONResponse({"access_token": "fake-graph-token", "expires_in": 3600, "token_type": "Bearer"})
+
+    @inject("graph")
+    async def send_mail(request: Request) -> Response:
+        await request.body()
+        return Response(status_code=202)
+
+    @inject("webhook")
+    async def webhook(request: Request) -> Response:
+        await request.body()
+        return Response(status_code=204)
+
+    @inject("blob")
+    async def blob(request: Request) -> Response:
+        # Just enough of the Blob REST API for create-append-blob and Append Block
+        await request.body()
+        headers = {
+            "ETag": f'"0x{time.time_ns():X}"',
+            "Last-Modified": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime()),
+            "x-ms-request-id": "00000000-0000-0000-0000-000000000000",
+            "x-ms-version": "2021-08-06",
+            "x-ms-request-server-encrypted": "true",
+        }
+        if request.query_params.get("comp") == "appendblock":
+            headers.update({"x-ms-blob-append-offset": "0", "x-ms-blob-committed-block-count": "1"})
+        return Response(status_code=201, headers=headers)
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse(calls)
+
+    app = Starlette(routes=[
+        Route("/openai/deployments/{deployment}/chat/completions", chat, methods=["POST"]),
+        Route("/teams", teams, methods=["POST"]),
+        Route("/{tenant}/oauth2/v2.0/token", graph_token, methods=["POST"]),
+        Route("/v1.0/users/{sender}/sendMail", send_mail, methods=["POST"]),
+        Route("/webhook", webhook, methods=["POST"]),
+        Route("/_stats", stats, methods=["GET"]),
+        Route("/{account}/{container}/{blob:path}", blob, methods=["PUT"]),
+    ])
+    app.state.calls = calls
+    return app
+
+class FakeBlobService:
+    """In-memory stand-in for ``BlobServiceClient`` (the only calls ``ADLSLogger`` makes), with sync latency."""
+
+    def __init__(self, fault: Optional[Fault] = None, seed: int = 0):
+        self.fault = fault or Fault()
+        self.blobs: Dict[str, bytearray] = {}
+        self.calls = 0
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def get_blob_client(self, container: str, blob: str) -> "_FakeBlob":
+        return _FakeBlob(self, f"{container}/{blob}")
+
+    def _call(self) -> None:
+        with self._lock:
+            self.calls += 1
+        seconds = self.fault.latency + self._rand.random() * self.fault.jitter
+        if seconds:
+            time.sleep(seconds)
+        if self.fault.error_rate and self._rand.random() < self.fault.error_rate:
+            raise IOError("Injected blob fault")
+
+class _FakeBlob:
+    def __init__(self, service: FakeBlobService, name: str):
+        self._service = service
+        self._name = name
+
+    def create_append_blob(self, **kwargs) -> None:
+        from azure.core.exceptions import ResourceExistsError
+        self._service._call()
+        with self._service._lock:
+            if self._name in self._service.blobs:
+                raise ResourceExistsError("exists")
+            self._service.blobs[self._name] = bytearray()
+
+    def append_block(self, data: bytes) -> None:
+        self._service._call()
+        with self._service._lock:
+            self._service.blobs.setdefault(self._name, bytearray()).extend(data)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--fault", action="append", default=[], help="upstream=latency[,jitter[,error_rate[,status]]]; repeatable")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    import uvicorn
+    uvicorn.run(build_app(parse_faults(args.fault), args.seed), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
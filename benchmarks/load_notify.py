@@ -0,0 +1,357 @@
+"""Load test for POST /api/v1/notify against local upstream stand-ins.
+
+    python -m benchmarks.load_notify --requests 2000 --concurrency 50
+    python -m benchmarks.load_notify --fault openai=0.8,0.4,0.02,429 --email --blob
+    python -m benchmarks.load_notify --mode uvicorn --workers 2     # needs uvicorn
+    python -m benchmarks.load_notify --save benchmarks/baselines/inprocess-default.json
+    python -m benchmarks.load_notify --compare benchmarks/baselines/inprocess-default.json
+
+``inprocess`` drives the ASGI app directly (no sockets) with its upstream clients routed to
+``benchmarks.fake_upstreams``; ``uvicorn`` starts the fake upstreams and the app as real
+servers. Reports RPS, latency percentiles (overall and per payload kind), answering tiers and
+RSS. ``--compare`` exits non-zero when RPS, p50/p95/p99 or peak RSS regress beyond ``--tolerance``.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import httpx
+from benchmarks.fake_upstreams import FakeBlobService, build_app, parse_faults
+from benchmarks.payloads import DEFAULT_MIX, PayloadMix
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+API_KEY = "bench-key"
+# Fake account key for the Blob connection string (uvicorn mode); the fake server ignores signatures
+BLOB_KEY = "YmVuY2htYXJrLWtleQ=="
+
+@dataclass
+class LoadConfig:
+    name: str = "default"
+    mode: str = "inprocess"
+    requests: int = 1000
+    concurrency: int = 32
+    mix: str = DEFAULT_MIX
+    storm_size: int = 25
+    faults: List[str] = field(default_factory=list)  # upstream=latency[,jitter[,error_rate[,status]]]
+    email: bool = False
+    webhook: bool = False
+    blob: bool = False
+    return_only: bool = False
+    workers: int = 1
+    seed: int = 0
+
+Sample = Tuple[str, float, int, Optional[str]]  # kind, seconds, status (0 = transport error), tier
+
+def app_env(config: LoadConfig, upstream_url: str) -> Dict[str, str]:
+    env = {
+        "API_KEY": API_KEY,
+        "AZURE_OPENAI_ENDPOINT": upstream_url + "/",
+        "AZURE_OPENAI_DEPLOYMENT": "bench",
+        "AZURE_OPENAI_API_KEY": "fake",
+        "TEAMS_WEBHOOK_URL": upstream_url + "/teams",
+        "GENERIC_WEBHOOK_URL": upstream_url + "/webhook" if config.webhook else "",
+        "ENABLE_CSV_LOGGING": "false",
+        "ENABLE_ADLS_LOGGING": "true" if config.blob else "false",
+        "DISABLE_NOTIFICATIONS": "false",
+    }
+    if config.email:
+        env.update({
+            "ALERT_EMAILS": "oncall@contoso.test", "SENDER_EMAIL": "adf@contoso.test",
+            "AZURE_TENANT_ID": "bench-tenant", "AZURE_CLIENT_ID": "bench-client", "AZURE_CLIENT_SECRET": "fake",
+        })
+    if config.blob:
+        env.update({
+            "ADLS_CONTAINER_NAME": "logs",
+            "ADLS_CONNECTION_STRING": f"DefaultEndpointsProtocol=http;AccountName=bench;AccountKey={BLOB_KEY};BlobEndpoint={upstream_url}/bench;",
+        })
+    return env
+
+@contextmanager
+def _patched_env(values: Dict[str, str]) -> Iterator[None]:
+    from app.core.config import get_settings
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update(values)
+    get_settings.cache_clear()
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        get_settings.cache_clear()
+
+def _rss_mb(pid: int) -> Optional[float]:
+    # Resident memory of pid and its children (uvicorn workers); None off Linux
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return rss + sum(_rss_mb(c) or 0.0 for c in children)
+
+class _RssSampler:
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.start = _rss_mb(pid)
+        self.peak = self.start
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self._observe()
+
+    def _observe(self) -> Optional[float]:
+        rss = _rss_mb(self.pid)
+        if rss is not None:
+            self.peak = max(self.peak or 0.0, rss)
+        return rss
+
+    def __enter__(self) -> "_RssSampler":
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._task.cancel()
+        self.end = self._observe()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {k: round(v, 1) if v is not None else None for k, v in (("start", self.start), ("peak", self.peak), ("end", self.end))}
+
+async def drive(client: httpx.AsyncClient, config: LoadConfig) -> Tuple[List[Sample], float]:
+    # Bodies are encoded up front so JSON encoding of large traces isn't timed
+    mix = PayloadMix(config.mix, storm_size=config.storm_size, seed=config.seed)
+    items = [(kind, json.dumps(p).encode("utf-8")) for kind, p in islice(iter(mix), config.requests)]
+    url = "/api/v1/notify" + ("?return_only=true" if config.return_only else "")
+    headers = {"x-api-key": API_KEY, "Content-Type": "application/json"}
+    pending = iter(items)
+    samples: List[Sample] = []
+
+    async def worker() -> None:
+        for kind, body in pending:
+            started = time.perf_counter()
+            tier = None
+            try:
+                r = await client.post(url, content=body, headers=headers)
+                status = r.status_code
+                if status < 300:
+                    tier = r.json()["metadata"].get("analysis_tier")
+            except httpx.HTTPError:
+                status = 0
+            samples.append((kind, time.perf_counter() - started, status, tier))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, config.concurrency))))
+    return samples, time.perf_counter() - started
+
+async def run_inprocess(config: LoadConfig) -> Dict[str, Any]:
+    from app.main import app  # imported first: its load_dotenv must not override the bench env
+    from app.services import adls_logger, http_clients
+    faults = parse_faults(config.faults)
+    upstreams = build_app(faults, config.seed)
+    registry = http_clients.ClientRegistry(transport=httpx.ASGITransport(app=upstreams))
+    with _patched_env(app_env(config, "http://upstreams.local")):
+        previous = http_clients.set_registry(registry)
+        blob = FakeBlobService(faults.get("blob"), config.seed)
+        if config.blob:
+            adls_logger.set_adls_logger(adls_logger.ADLSLogger(client=blob))
+        try:
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                    with _RssSampler(os.getpid()) as rss:
+                        samples, duration = await drive(client, config)
+        finally:
+            http_clients.set_registry(previous)
+            await registry.aclose()
+    return summarize(config, samples, duration, rss.summary(), dict(upstreams.state.calls, blob=blob.calls))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{proc.args} exited with {proc.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:g}s")
+
+async def run_uvicorn(config: LoadConfig) -> Dict[str, Any]:
+    if config.email:
+        # Graph/login URLs are fixed in the notifier, so a local server can't stand in for them
+        print("note: --email needs the in-process mode; disabled", file=sys.stderr)
+        config.email = False
+    fake_port, app_port = _free_port(), _free_port()
+    upstream_url = f"http://127.0.0.1:{fake_port}"
+    fault_args = [arg for spec in config.faults for arg in ("--fault", spec)]
+    fake = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), "--seed", str(config.seed), *fault_args], cwd=ROOT)
+    # Run the app from an empty directory so a developer .env can't override the bench settings
+    workdir = tempfile.mkdtemp(prefix="adf-bench-")
+    env = {**os.environ, **app_env(config, upstream_url), "PYTHONPATH": ROOT}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--workers", str(config.workers), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    try:
+        await _wait_ready(f"{upstream_url}/_stats", fake)
+        await _wait_ready(f"http://127.0.0.1:{app_port}/healthz", server)
+        limits = httpx.Limits(max_connections=config.concurrency, max_keepalive_connections=config.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits, timeout=120) as client:
+            with _RssSampler(server.pid) as rss:
+                samples, duration = await drive(client, config)
+        await asyncio.sleep(0.5)  # let background log flushes land before reading upstream counts
+        async with httpx.AsyncClient() as client:
+            calls = (await client.get(f"{upstream_url}/_stats")).json()
+    finally:
+        for proc in (server, fake):
+            proc.terminate()
+        for proc in (server, fake):
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return summarize(config, samples, duration, rss.summary(), calls)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values) - 1e-9) - 1))
+    return sorted_values[index]
+
+def _latency_ms(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        **{f"p{p}": round(percentile(values, p) * 1000, 2) for p in (50, 95, 99)},
+        "max": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def summarize(config: LoadConfig, samples: List[Sample], duration: float, memory: Dict[str, Optional[float]], upstream_calls: Dict[str, int]) -> Dict[str, Any]:
+    by_kind: Dict[str, List[float]] = {}
+    for kind, seconds, _, _ in samples:
+        by_kind.setdefault(kind, []).append(seconds)
+    return {
+        "name": config.name,
+        "version": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": asdict(config),
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not 200 <= s[2] < 300),
+        "status": dict(Counter(str(s[2]) for s in samples)),
+        "tiers": dict(Counter(s[3] for s in samples if s[3])),
+        "duration_s": round(duration, 3),
+        "rps": round(len(samples) / duration, 1) if duration else 0.0,
+        "latency_ms": _latency_ms([s[1] for s in samples]),
+        "by_kind": {k: {"count": len(v), **_latency_ms(v)} for k, v in sorted(by_kind.items())},
+        "memory_mb": memory,
+        "upstream_calls": upstream_calls,
+    }
+
+# (path, higher is better)
+COMPARED = [("rps", True), ("latency_ms.p50", False), ("latency_ms.p95", False), ("latency_ms.p99", False), ("memory_mb.peak", False)]
+
+def _lookup(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Prints current vs baseline; returns the metrics that regressed by more than ``tolerance``."""
+    regressions = []
+    print(f"\n{'metric':<16} {'baseline':>10} {'current':>10} {'change':>8}  (baseline {baseline.get('version')} {baseline.get('timestamp')})")
+    for path, higher_is_better in COMPARED:
+        old, new = _lookup(baseline, path), _lookup(current, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(path)
+        print(f"{path:<16} {old:>10.1f} {new:>10.1f} {change:>+7.1%}{flag}")
+    return regressions
+
+def print_summary(result: Dict[str, Any]) -> None:
+    lat = result["latency_ms"]
+    print(f"{result['requests']} requests in {result['duration_s']:.2f}s: {result['rps']:.1f} req/s, {result['errors']} errors {result['status']}")
+    print(f"latency ms: p50 {lat['p50']:.1f}  p95 {lat['p95']:.1f}  p99 {lat['p99']:.1f}  max {lat['max']:.1f}")
+    print(f"tiers: {result['tiers']}  rss MB: {result['memory_mb']}")
+    print(f"upstream calls: {result['upstream_calls']}")
+    print(f"\n{'kind':<8} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for kind, stats in result["by_kind"].items():
+        print(f"{kind:<8} {stats['count']:>6} {stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--name", default="default")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weights for unique,known,large,storm,repeat payloads")
+    parser.add_argument("--storm-size", type=int, default=25, help="identical failures per duplicate storm")
+    parser.add_argument("--fault", action="append", default=[], help="upstream=latency[,jitter[,error_rate[,status]]]; repeatable")
+    parser.add_argument("--email", action="store_true", help="also send Graph email (in-process only)")
+    parser.add_argument("--webhook", action="store_true", help="also post to the generic webhook")
+    parser.add_argument("--blob", action="store_true", help="also log to (fake) ADLS")
+    parser.add_argument("--return-only", action="store_true", help="skip notifications")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the result JSON here (e.g. a baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+    config = LoadConfig(
+        name=args.name, mode=args.mode, requests=args.requests, concurrency=args.concurrency, mix=args.mix,
+        storm_size=args.storm_size, faults=args.fault, email=args.email, webhook=args.webhook, blob=args.blob,
+        return_only=args.return_only, workers=args.workers, seed=args.seed,
+    )
+    result = asyncio.run(run_inprocess(config) if config.mode == "inprocess" else run_uvicorn(config))
+    print_summary(result)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Realistic failure payload mixes for load tests."""
+from __future__ import annotations
+import os
+import random
+import string
+from typing import Dict, Iterator, List, Tuple
+
+SPARK_TRACE = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "data", "spark_trace.txt")
+
+# Known failures the rule tier answers without the model
+KNOWN = [
+    ("2200", "ErrorCode=UserErrorFileNotFound,'Type=Microsoft.DataTransfer.Common.Shared.HybridDeliveryException,Message=Path /raw/{word}/2025/08/13 does not exist"),
+    (None, "Container {word} exited: OOMKilled"),
+    (None, "Back-off restarting failed container {word}: CrashLoopBackOff"),
+    ("2108", "Invoking Web Activity {word} failed with HttpStatusCode - 403 Forbidden"),
+    (None, "Violation of PRIMARY KEY constraint 'PK_{word}'. Cannot insert duplicate key in object 'dbo.Orders'."),
+]
+PIPELINES = ["Ingest_Sales", "Load_Customers", "Daily_Finance", "Stream_Events", "Nightly_Export"]
+SOURCES = ["adf", "synapse", "fabric", "databricks", "app"]
+DEFAULT_MIX = "unique=40,known=20,large=10,storm=20,repeat=10"
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("unique", "known", "large", "storm", "repeat"):
+            raise ValueError(f"unknown payload kind {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class PayloadMix:
+    """Yields ``(kind, payload)``; storms are ``storm_size`` identical failures back to back.
+
+    Weights are shares of requests, so ``storm=20`` means about 20% of requests belong to storms.
+    """
+
+    def __init__(self, mix: str = DEFAULT_MIX, storm_size: int = 25, large_repeat: int = 20, seed: int = 0):
+        self.mix = parse_mix(mix)
+        self.storm_size = storm_size
+        self.rand = random.Random(seed)
+        with open(SPARK_TRACE, encoding="utf-8") as f:
+            self._trace = f.read() * large_repeat
+        self._seen: List[dict] = []
+
+    def _word(self) -> str:
+        # Letters only: the fingerprint normalizes away digits, GUIDs and paths
+        return "".join(self.rand.choice(string.ascii_lowercase) for _ in range(10))
+
+    def _base(self, code, message) -> dict:
+        return {
+            "pipelineName": self.rand.choice(PIPELINES),
+            "runId": f"run-{self.rand.getrandbits(48):x}",
+            "activityName": "Copy_" + self._word()[:4],
+            "errorCode": code,
+            "errorMessage": message,
+            "source": self.rand.choice(SOURCES),
+            "correlationId": f"corr-{self.rand.getrandbits(32):x}",
+        }
+
+    def _make(self, kind: str) -> dict:
+        if kind == "known":
+            code, template = self.rand.choice(KNOWN)
+            return self._base(code, template.format(word=self._word()))
+        if kind == "large":
+            return self._base(None, f"Job {self._word()} aborted.\n" + self._trace)
+        return self._base("2200", f"Operation on target {self._word()} failed: sink column {self._word()} rejected value")
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        kinds = list(self.mix)
+        weights = [w / self.storm_size if k == "storm" else w for k, w in self.mix.items()]
+        while True:
+            kind = self.rand.choices(kinds, weights)[0]
+            if kind == "repeat" and self._seen:
+                yield kind, dict(self.rand.choice(self._seen), runId=f"run-{self.rand.getrandbits(48):x}")
+            elif kind == "storm":
+                payload = self._make("unique")
+                for _ in range(self.storm_size):
+                    yield kind, dict(payload, runId=f"run-{self.rand.getrandbits(48):x}")
+            else:
+                payload = self._make("unique" if kind == "repeat" else kind)
+                if kind != "large" and len(self._seen) < 200:
+                    self._seen.append(payload)
+                yield kind, payload
@@ -0,0 +1,29 @@
+import pytest
+from app.core.config import get_settings
+from app.services import analysis_cache, csv_logger, graph_auth, incidents, metrics, openai_pool, redaction, rules, shared_state, similarity, singleflight
+
+@pytest.fixture(autouse=True)
+def _reset_process_state():
+    # Process-wide caches would otherwise leak analyses between tests
+    analysis_cache.set_cache(None)
+    singleflight.set_singleflight(None)
+    graph_auth.set_token_provider(None)
+    csv_logger.set_csv_writer(None)
+    incidents.set_grouper(None)
+    # Tests set env vars (API_KEY, ...) before their first request
+    get_settings.cache_clear()
+    redaction.set_engine(None)
+    rules.set_classifier(None)
+    openai_pool.set_pool(None)
+    metrics.reset_tracer()
+    similarity.set_index(None)
+    shared_state.set_backend(None)
+    yield
+    singleflight.set_singleflight(None)
+    graph_auth.set_token_provider(None)
+    cache = analysis_cache.set_cache(None)
+    if cache is not None:
+        cache.close()
+    backend = shared_state.set_backend(None)
+    if backend is not None:
+        backend.close()
@@ -0,0 +1,71 @@
+import csv
+import io
+from datetime import datetime
+import pytest
+from azure.core.exceptions import ResourceExistsError
+from app.core.config import Settings
+from app.models.schemas import AnalysisResult, NotificationPayload
+from app.services.adls_logger import ADLSLogger
+
+class FakeAppendBlob:
+    def __init__(self, store, name):
+        self.store, self.name = store, name
+
+    def create_append_blob(self, etag=None, match_condition=None):
+        if self.name in self.store:
+            raise ResourceExistsError("exists")
+        self.store[self.name] = b""
+
+    def append_block(self, data):
+        self.store[self.name] += data
+        self.store.setdefault("__appends__", []).append(self.name)
+
+class FakeBlobService:
+    """Minimal Azurite stand-in: append blobs held in a dict."""
+
+    def __init__(self):
+        self.store = {}
+
+    def get_blob_client(self, container, blob):
+        return FakeAppendBlob(self.store, f"{container}/{blob}")
+
+def _payload(i):
+    return NotificationPayload(
+        pipelineName=f'P{i}', runId=None, activityName=None, errorCode='2200', environment='prod', source=None,
+        resourceUrl=None, component=None, severity=None, tags=None, correlationId=None, region=None,
+        raw_error='boom', analysis=AnalysisResult(simplified_error='s', probable_reason='r', probable_fix='f'),
+    )
+
+def _logger(service, **overrides):
+    settings = Settings(ENABLE_ADLS_LOGGING=True, ADLS_CONTAINER_NAME='logs', **overrides)
+    return ADLSLogger(settings=settings, client=service)
+
+def test_rows_are_batched_into_one_append_per_flush():
+    service = FakeBlobService()
+    logger = _logger(service, ADLS_FLUSH_MAX_ROWS=3)
+    for i in range(3):
+        name = logger.append_analysis(_payload(i))
+    assert name == datetime.utcnow().strftime('analysis_log/%Y/%m/%d/analysis_log.csv')
+    blob = service.store[f'logs/{name}'].decode()
+    rows = list(csv.reader(io.StringIO(blob)))
+    assert rows[0][0] == 'timestamp'
+    assert [r[1] for r in rows[1:]] == ['P0', 'P1', 'P2']
+    assert service.store['__appends__'] == [f'logs/{name}']
+
+def test_existing_blob_gets_no_second_header():
+    service = FakeBlobService()
+    service.store['logs/log.csv'] = b'header\n'
+    logger = _logger(service, ADLS_BLOB_NAME='log.csv', ADLS_FLUSH_MAX_ROWS=100)
+    logger.append_analysis(_payload(1))
+    assert service.store['logs/log.csv'] == b'header\n'  # still buffered
+    assert logger.flush_sync() == 1
+    assert service.store['logs/log.csv'].decode().count('timestamp') == 0
+
+@pytest.mark.asyncio
+async def test_close_flushes_buffer_off_loop():
+    service = FakeBlobService()
+    logger = _logger(service, ADLS_BLOB_NAME='log.csv')
+    logger.append_analysis(_payload(1))
+    await logger.close()
+    assert logger.stats()['rows_written'] == 1
+    assert 'P1' in service.store['logs/log.csv'].decode()
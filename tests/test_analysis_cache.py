@@ -0,0 +1,77 @@
+import os
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services import ai_analyzer
+from app.services.analysis_cache import AnalysisCache
+from app.services.fingerprint import fingerprint, normalize_error
+
+def _result(text="s"):
+    return AnalysisResult(simplified_error=text, probable_reason="r", probable_fix="f")
+
+def test_normalize_strips_run_specific_noise():
+    a = "Run 3f2504e0-4f89-11d3-9a0c-0305e82c3301 failed at 2025-08-13T12:30:00Z reading /mnt/raw/2025/08/13/part-0001.csv (attempt 3), password=hunter2"
+    b = "Run 9b2c1e44-0000-4c1d-8a0c-aaaaaaaaaaaa failed at 2025-08-14 01:02:03 reading /mnt/raw/2025/08/14/part-0007.csv (attempt 1), password=other"
+    assert normalize_error(a) == normalize_error(b)
+    assert "hunter2" not in normalize_error(a)
+
+def test_fingerprint_separates_pipeline_and_code():
+    base = FailureNotification(pipelineName="P", errorCode="2200", errorMessage="Timeout after 30s")
+    same = FailureNotification(pipelineName="P", errorCode="2200", errorMessage="Timeout after 45s", runId="other")
+    assert fingerprint(base) == fingerprint(same)
+    assert fingerprint(base) != fingerprint(base.model_copy(update={"errorCode": "2108"}))
+    assert fingerprint(base) != fingerprint(base.model_copy(update={"pipelineName": "Q"}))
+
+def test_lru_and_ttl():
+    now = [1000.0]
+    cache = AnalysisCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", _result("a"))
+    cache.put("b", _result("b"))
+    assert cache.get("a").simplified_error == "a"
+    cache.put("c", _result("c"))  # evicts least recently used "b"
+    assert cache.get("b") is None
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = AnalysisCache(db_path=path)
+    first.put("k", _result("persisted"))
+    first.close()
+    second = AnalysisCache(db_path=path)
+    assert second.get("k").simplified_error == "persisted"
+    assert second.stats()["disk_hits"] == 1
+    second.close()
+
+@pytest.mark.asyncio
+async def test_repeat_failure_served_from_cache(monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+    calls = []
+
+    async def fake_analyze(data):
+        calls.append(data)
+        return _result("cached")
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        for run in ("run-1", "run-2"):
+            r = await client.post('/api/v1/notify?return_only=true', headers={'x-api-key': 'test-key'}, json={
+                'pipelineName': 'Pipe', 'runId': run, 'errorMessage': f'Copy failed for {run} at 2025-08-13T12:30:00Z'
+            })
+            assert r.status_code == 200
+        health = (await client.get('/healthz')).json()
+    assert len(calls) == 1
+    assert r.json()['metadata']['analysis_tier'] == 'cache'
+    assert health['analysis_cache']['hits'] == 1
+
+@pytest.mark.asyncio
+async def test_fallbacks_are_not_cached(monkeypatch):
+    async def fake_analyze(data):
+        return ai_analyzer.fallback_result(data, "http_error", "r", "f")
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+    from app.services import triage
+    data = FailureNotification(pipelineName="P", errorMessage="x")
+    assert (await triage.analyze(data))[1] == "fallback"
+    assert (await triage.analyze(data))[1] == "fallback"
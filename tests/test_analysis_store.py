@@ -0,0 +1,60 @@
+import os
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import AnalysisResult, NotificationPayload
+from app.services import analysis_store
+from app.services.analysis_store import AnalysisStore
+
+def _payload(pipeline, code, text, fp='fp1', env='prod'):
+    return NotificationPayload(
+        pipelineName=pipeline, runId=None, activityName=None, errorCode=code, environment=env, source='adf',
+        resourceUrl=None, component=None, severity='error', tags=None, correlationId=None, region=None,
+        raw_error=f'{text} password=secret1', fingerprint=fp,
+        analysis=AnalysisResult(simplified_error=text, probable_reason='r', probable_fix='f'),
+    )
+
+@pytest.fixture
+def store(tmp_path):
+    store = AnalysisStore(str(tmp_path / 'store.db'), flush_max_rows=1000)
+    for day in range(1, 8):
+        store.append_analysis(_payload('Ingest', '2200', 'Sink timeout writing parquet'), ts=f'2025-08-0{day}T10:00:00')
+        store.append_analysis(_payload('Ingest', '2108', 'Forbidden on storage account', fp='fp2'), ts=f'2025-08-0{day}T11:00:00')
+    store.append_analysis(_payload('Other', '2200', 'Sink timeout', env='dev'), ts='2025-08-05T12:00:00')
+    assert store.flush_sync() == 15
+    return store
+
+def test_filters_and_keyset_pagination(store):
+    filters = {'pipelineName': 'Ingest', 'errorCode': '2200'}
+    first = store.query(filters, since='2025-08-02', until='2025-08-07', limit=3)
+    assert [i['ts'][:10] for i in first['items']] == ['2025-08-06', '2025-08-05', '2025-08-04']
+    second = store.query(filters, since='2025-08-02', until='2025-08-07', limit=3, cursor=first['next_cursor'])
+    assert [i['ts'][:10] for i in second['items']] == ['2025-08-03', '2025-08-02']
+    assert second['next_cursor'] is None
+    assert 'raw_error' not in first['items'][0]
+
+def test_full_text_search_and_raw_error_is_redacted(store):
+    page = store.query(q='forbidden', include_raw=True, limit=100)
+    assert len(page['items']) == 7
+    assert all('secret1' not in i['raw_error'] for i in page['items'])
+
+def test_aggregate_counts(store):
+    counts = store.aggregate('errorCode', {'pipelineName': 'Ingest'})
+    assert sorted((c['key'], c['count']) for c in counts) == [('2108', 7), ('2200', 7)]
+    assert store.count({'errorCode': '2200'}) == 8
+    assert store.aggregate('day', {'environment': 'dev'})[0]['key'] == '2025-08-05'
+
+@pytest.mark.asyncio
+async def test_analyses_endpoint(store, monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+    monkeypatch.setattr(analysis_store, 'get_store', lambda settings=None: store)
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.get('/api/v1/analyses', headers={'x-api-key': 'test-key'}, params={
+            'errorCode': '2200', 'group_by': 'pipelineName', 'include_total': 'true', 'limit': 2
+        })
+        bad = await client.get('/api/v1/analyses', headers={'x-api-key': 'test-key'}, params={'cursor': '!!!'})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body['total'] == 8 and len(body['items']) == 2 and body['next_cursor']
+    assert body['counts'][0] == {'key': 'Ingest', 'count': 7, 'first_seen': '2025-08-01T10:00:00', 'last_seen': '2025-08-07T10:00:00'}
+    assert bad.status_code == 400
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import AnalysisResult
+from app.services import ai_analyzer
+
+def _lines(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+@pytest.mark.asyncio
+async def test_batch_dedupes_and_streams_per_item(monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+    monkeypatch.setenv('RULES_ENABLED', 'false')  # every item should reach the (fake) model here
+    calls = []
+
+    async def fake_analyze(data):
+        calls.append(data.errorMessage)
+        await asyncio.sleep(0)
+        return AnalysisResult(simplified_error=data.errorCode or '-', probable_reason='r', probable_fix='f')
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+
+    items = [
+        {'pipelineName': 'P', 'runId': f'r{i}', 'errorCode': '2200', 'errorMessage': f'Timeout after {i}s'} for i in range(5)
+    ] + [
+        {'pipelineName': 'P', 'errorCode': '2108', 'errorMessage': 'Forbidden'},
+        {'errorMessage': 'missing pipelineName'},
+    ]
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.post('/api/v1/notify/batch?return_only=true', headers={'x-api-key': 'test-key'}, json=items)
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('application/x-ndjson')
+    lines = _lines(r.text)
+    summary = lines.pop()
+    assert summary == {'done': True, 'total': 7, 'unique': 2, 'failed': 1}
+    assert sorted(line['index'] for line in lines) == list(range(7))
+    by_index = {line['index']: line for line in lines}
+    assert by_index[6]['status'] == 'invalid'
+    assert by_index[5]['analysis']['simplified_error'] == '2108'
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_batch_accepts_ndjson(monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+
+    async def fake_analyze(data):
+        return AnalysisResult(simplified_error='nd', probable_reason='r', probable_fix='f')
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+
+    body = '\n'.join(json.dumps({'pipelineName': f'P{i}', 'errorMessage': 'x'}) for i in range(3)) + '\nnot json\n'
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.post('/api/v1/notify/batch?return_only=true', headers={'x-api-key': 'test-key', 'content-type': 'application/x-ndjson'}, content=body)
+    lines = _lines(r.text)
+    assert lines[-1]['total'] == 4 and lines[-1]['failed'] == 1
+    assert [l['status'] for l in lines[:-1]].count('analysis_only') == 3
@@ -0,0 +1,95 @@
+import json
+import os
+import httpx
+import pytest
+from app.core.config import Settings
+from app.models.schemas import FailureNotification
+from app.services import ai_analyzer, http_clients
+from app.services.condenser import condense, estimate_tokens
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+def _read(name: str) -> str:
+    with open(os.path.join(DATA, name), encoding="utf-8") as f:
+        return f.read()
+
+def test_spark_trace_keeps_cause_chain_and_drops_noise():
+    trace = _read("spark_trace.txt")
+    out = condense(trace, max_tokens=1500)
+    assert out.startswith("org.apache.spark.SparkException: Job aborted due to stage failure")
+    assert 'Caused by: java.lang.NumberFormatException: For input string: "12,50"' in out
+    assert "at com.contoso.etl.transforms.CustomerEnricher.parseAmount(CustomerEnricher.scala:88)" in out
+    assert "at com.contoso.etl.jobs.DailyCustomerLoad.run(DailyCustomerLoad.scala:57)" in out
+    assert "java.util.concurrent.ThreadPoolExecutor" not in out and "py4j.Gateway" not in out
+    assert "frames omitted" in out and "(repeated)" in out
+
+def test_large_trace_shrinks_by_an_order_of_magnitude():
+    trace = _read("spark_trace.txt") * 20  # ~230 KB, the same failure across many retried tasks
+    out = condense(trace, max_tokens=1500)
+    assert estimate_tokens(out) <= 1500
+    assert estimate_tokens(trace) / estimate_tokens(out) > 10
+    assert "Caused by: java.lang.NumberFormatException" in out
+
+def test_adf_error_json_keeps_key_fields():
+    error = "Operation on target Copy Customers to SQL failed: " + _read("adf_error.json")
+    out = condense(error, max_tokens=200)
+    lines = out.splitlines()
+    assert lines[:3] == ["errorCode: 2200", "failureType: UserError", "target: Copy Customers to SQL"]
+    assert "Violation of PRIMARY KEY constraint" in out
+    assert "billingReference" not in out and "activityRunId" not in out
+
+def test_tight_budget_truncates_middle():
+    trace = _read("spark_trace.txt") * 20
+    out = condense(trace, max_tokens=120)
+    assert estimate_tokens(out) <= 160
+    assert "chars omitted" in out
+    assert out.startswith("org.apache.spark.SparkException")
+
+def test_short_messages_unchanged():
+    assert condense("Copy activity failed: timeout", 1500) == "Copy activity failed: timeout"
+
+@pytest.mark.asyncio
+async def test_prompt_uses_condensed_error(monkeypatch):
+    prompts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        prompts.append(json.loads(request.content)["messages"][1]["content"])
+        content = json.dumps({"simplified_error": "s", "probable_reason": "r", "probable_fix": "f"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://aoai.test/", AZURE_OPENAI_DEPLOYMENT="dep", AZURE_OPENAI_API_KEY="k")
+    monkeypatch.setattr(ai_analyzer, "get_settings", lambda: settings)
+    registry = http_clients.ClientRegistry(settings, transport=httpx.MockTransport(handler))
+    previous = http_clients.set_registry(registry)
+    try:
+        trace = _read("spark_trace.txt") * 20
+        await ai_analyzer.analyze_failure(FailureNotification(pipelineName="p", errorMessage=trace))
+    finally:
+        http_clients.set_registry(previous)
+        await registry.aclose()
+    assert len(prompts[0]) < len(trace) / 10
+
+@pytest.mark.asyncio
+async def test_root_cause_past_redaction_limit_reaches_the_prompt(monkeypatch):
+    prompts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        prompts.append(json.loads(request.content)["messages"][1]["content"])
+        content = json.dumps({"simplified_error": "s", "probable_reason": "r", "probable_fix": "f"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://aoai.test/", AZURE_OPENAI_DEPLOYMENT="dep", AZURE_OPENAI_API_KEY="k")
+    monkeypatch.setattr(ai_analyzer, "get_settings", lambda: settings)
+    registry = http_clients.ClientRegistry(settings, transport=httpx.MockTransport(handler))
+    previous = http_clients.set_registry(registry)
+    tail = ("Caused by: com.contoso.ledger.LedgerLockedException: ledger 7781 locked (password=hunter2)\n"
+            "\tat com.contoso.ledger.Ledger.lock(Ledger.scala:12)\n")
+    trace = _read("spark_trace.txt") * 20 + tail
+    assert len(trace) > 200_000
+    try:
+        await ai_analyzer.analyze_failure(FailureNotification(pipelineName="p", errorMessage=trace))
+    finally:
+        http_clients.set_registry(previous)
+        await registry.aclose()
+    assert "LedgerLockedException: ledger 7781 locked" in prompts[0]
+    assert "hunter2" not in prompts[0]
@@ -0,0 +1,52 @@
+import asyncio
+import csv
+import os
+import pytest
+from app.services.csv_logger import CSV_HEADERS, CsvLogWriter
+
+def _row(i):
+    return ['2025-01-01T00:00:00', f'P{i}'] + [''] * (len(CSV_HEADERS) - 2)
+
+def _read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+@pytest.mark.asyncio
+async def test_rows_are_written_in_batches_by_background_task(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    writer = CsvLogWriter(path, batch_size=50, flush_interval=0.05)
+    for i in range(120):
+        assert writer.submit(_row(i))
+    assert not os.path.exists(path)  # nothing written on the request path
+    await writer.close()
+    rows = _read(path)
+    assert rows[0] == CSV_HEADERS
+    assert [r[1] for r in rows[1:]] == [f'P{i}' for i in range(120)]
+    assert writer.stats()['batches'] < 120
+
+def test_rotation_by_size_keeps_header_in_each_file(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    writer = CsvLogWriter(path, rotate_max_bytes=200, fsync='batch')
+    writer.write_batch([_row(i) for i in range(5)])
+    writer.write_batch([_row(5)])
+    rotated = [p for p in os.listdir(tmp_path) if p != 'log.csv']
+    assert writer.rotations == 1 and len(rotated) == 1
+    assert _read(path) == [CSV_HEADERS, _row(5)]
+    assert len(_read(tmp_path / rotated[0])) == 6
+
+def test_rows_survive_rotation_by_another_writer(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    first = CsvLogWriter(path)
+    second = CsvLogWriter(path, rotate_max_bytes=1)
+    first.write_batch([_row(1)])
+    second.write_batch([_row(2)])  # rotates first's file away
+    first.write_batch([_row(3)])   # reopens the live path instead of the rotated file
+    assert [r[1] for r in _read(path)[1:]] == ['P2', 'P3']
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking(tmp_path):
+    writer = CsvLogWriter(str(tmp_path / 'log.csv'), max_queue=1, flush_interval=0.01)
+    assert writer.submit(_row(1))
+    assert not writer.submit(_row(2))
+    assert writer.stats()['dropped'] == 1
+    await writer.close()
@@ -0,0 +1,48 @@
+import asyncio
+import time
+import pytest
+from app.core.config import Settings
+from app.models.schemas import AnalysisResult, NotificationPayload
+from app.services import notifier
+from app.services.exceptions import NotificationDispatchError
+from app.services.notifier import Channel
+
+def _payload():
+    return NotificationPayload(
+        pipelineName='P', runId=None, activityName=None, errorCode=None, environment='prod', source=None,
+        resourceUrl=None, component=None, severity=None, tags=None, correlationId=None, region=None,
+        raw_error='boom', analysis=AnalysisResult(simplified_error='s', probable_reason='r', probable_fix='f'),
+    )
+
+@pytest.mark.asyncio
+async def test_channels_run_concurrently_and_fail_in_isolation(monkeypatch):
+    async def slow(payload):
+        await asyncio.sleep(0.1)
+
+    async def broken(payload):
+        raise NotificationDispatchError('Teams webhook error 500: oops')
+
+    async def hangs(payload):
+        await asyncio.sleep(10)
+
+    channels = {}
+    monkeypatch.setattr(notifier, 'CHANNELS', channels)
+    monkeypatch.setattr(notifier, 'get_settings', lambda: Settings())
+    notifier.register_channel(Channel('a', slow, lambda s: True, lambda s: 1.0))
+    notifier.register_channel(Channel('b', slow, lambda s: True, lambda s: 1.0))
+    notifier.register_channel(Channel('teams', broken, lambda s: True, lambda s: 1.0))
+    notifier.register_channel(Channel('stuck', hangs, lambda s: True, lambda s: 0.05))
+    notifier.register_channel(Channel('off', slow, lambda s: False, lambda s: 1.0))
+
+    started = time.perf_counter()
+    results = {r.channel: r for r in await notifier.dispatch_notifications(_payload())}
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.18  # max(channel), not sum(channel)
+    assert results['a'].status == results['b'].status == 'sent'
+    assert results['teams'].status == 'failed' and '500' in results['teams'].detail
+    assert results['stuck'].status == 'timeout'
+    assert results['off'].status == 'skipped'
+
+def test_builtin_channels_registered():
+    assert {'teams', 'email', 'webhook'} <= set(notifier.CHANNELS)
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from app.services.graph_auth import GraphTokenProvider
+
+def _provider(now, expires_in=3600):
+    fetched = []
+
+    async def fetch():
+        fetched.append(now[0])
+        await asyncio.sleep(0.01)
+        return f'token-{len(fetched)}', expires_in
+
+    return GraphTokenProvider(fetch=fetch, refresh_margin=300, clock=lambda: now[0]), fetched
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_fetch():
+    now = [0.0]
+    provider, fetched = _provider(now)
+    tokens = await asyncio.gather(*(provider.get_token() for _ in range(10)))
+    assert set(tokens) == {'token-1'}
+    assert len(fetched) == 1
+    now[0] = 1000
+    assert await provider.get_token() == 'token-1'
+    assert provider.stats()['age_seconds'] == 1000
+
+@pytest.mark.asyncio
+async def test_refreshes_in_background_before_expiry():
+    now = [0.0]
+    provider, fetched = _provider(now)
+    await provider.get_token()
+    now[0] = 3400  # inside the refresh margin but still valid
+    assert await provider.get_token() == 'token-1'  # not blocked on the refresh
+    await asyncio.sleep(0.02)
+    assert await provider.get_token() == 'token-2'
+    assert len(fetched) == 2
+
+@pytest.mark.asyncio
+async def test_expired_token_is_refetched_and_invalidate():
+    now = [0.0]
+    provider, fetched = _provider(now, expires_in=60)
+    await provider.get_token()
+    now[0] = 61
+    assert await provider.get_token() == 'token-2'
+    provider.invalidate()
+    assert await provider.get_token() == 'token-3'
+    assert provider.stats()['fetches'] == 3
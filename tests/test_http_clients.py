@@ -0,0 +1,75 @@
+import json
+import httpx
+import pytest
+from app.core.config import Settings
+from app.models.schemas import FailureNotification
+from app.services import ai_analyzer, http_clients
+
+@pytest.fixture
+def mock_registry():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        content = json.dumps({"simplified_error": "s", "probable_reason": "r", "probable_fix": "f", "confidence": 0.9})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    registry = http_clients.ClientRegistry(settings=Settings(), transport=httpx.MockTransport(handler))
+    previous = http_clients.set_registry(registry)
+    yield registry, calls
+    http_clients.set_registry(previous)
+
+@pytest.mark.asyncio
+async def test_analyzer_reuses_pooled_client(monkeypatch, mock_registry):
+    registry, calls = mock_registry
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://aoai.test/", AZURE_OPENAI_DEPLOYMENT="dep", AZURE_OPENAI_API_KEY="k")
+    monkeypatch.setattr(ai_analyzer, "get_settings", lambda: settings)
+    data = FailureNotification(pipelineName="Pipe", errorMessage="boom")
+
+    first = await ai_analyzer.analyze_failure(data)
+    client = registry.get("openai")
+    second = await ai_analyzer.analyze_failure(data)
+
+    assert first.simplified_error == second.simplified_error == "s"
+    assert len(calls) == 2
+    assert registry.get("openai") is client
+    assert list(registry.open_clients()) == ["openai"]
+
+@pytest.mark.asyncio
+async def test_registry_close_and_rebuild(mock_registry):
+    registry, _ = mock_registry
+    client = registry.get("teams")
+    assert client.timeout.read == Settings().teams_timeout
+
+    await http_clients.close_clients()
+    assert client.is_closed
+    assert registry.open_clients() == {}
+    assert registry.get("teams") is not client
+
+@pytest.mark.asyncio
+async def test_pooled_clients_honour_proxy_environment(monkeypatch):
+    from app.services import metrics
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.corp:3128")
+    monkeypatch.setenv("NO_PROXY", "internal.corp")
+    registry = http_clients.ClientRegistry(settings=Settings())
+    client = registry.get("teams")
+    try:
+        expected = httpx.AsyncClient()
+        assert set(client._mounts) == set(expected._mounts) and len(client._mounts) == 2
+        await expected.aclose()
+    finally:
+        await registry.aclose()
+
+    # Timing still covers both outcomes
+    def handler(request):
+        if request.url.host == "down.test":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(204)
+    registry = http_clients.ClientRegistry(settings=Settings(), transport=httpx.MockTransport(handler))
+    before = metrics.UPSTREAM_SECONDS.count("webhook", "204"), metrics.UPSTREAM_SECONDS.count("webhook", "error")
+    client = registry.get("webhook")
+    await client.post("https://up.test/x")
+    with pytest.raises(httpx.ConnectError):
+        await client.post("https://down.test/x")
+    await registry.aclose()
+    assert (metrics.UPSTREAM_SECONDS.count("webhook", "204"), metrics.UPSTREAM_SECONDS.count("webhook", "error")) == (before[0] + 1, before[1] + 1)
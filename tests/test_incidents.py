@@ -0,0 +1,124 @@
+import os
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import AnalysisResult, NotificationPayload
+from app.services import ai_analyzer, incidents, notifier
+from app.services.incidents import IncidentGrouper
+
+def _payload(run, code='2200', fp='fp'):
+    return NotificationPayload(
+        pipelineName='P', runId=run, activityName=None, errorCode=code, environment='prod', source=None,
+        resourceUrl=None, component=None, severity=None, tags=None, correlationId=None, region=None,
+        raw_error='boom', fingerprint=fp, analysis=AnalysisResult(simplified_error='s', probable_reason='r', probable_fix='f'),
+    )
+
+def test_first_alerts_then_repeats_fold_into_one_digest():
+    now = [0.0]
+    grouper = IncidentGrouper(window_seconds=60, sample_size=3, clock=lambda: now[0])
+    decisions = []
+    for i in range(6):
+        now[0] = i
+        decisions.append(grouper.observe(_payload(f'r{i}'))[0])
+    assert decisions == ['alert'] + ['suppressed'] * 5
+    assert grouper.observe(_payload('x', code='2108'))[0] == 'alert'
+    assert grouper.due_digests() == []
+    now[0] = 61
+    digests = grouper.due_digests()
+    assert len(digests) == 1
+    d = digests[0].incident
+    assert (d.occurrences, d.suppressed, d.sample_run_ids) == (6, 5, ['r3', 'r4', 'r5'])
+    assert d.last_seen.timestamp() == 5
+    assert grouper.observe(_payload('r9'))[0] == 'alert'  # window closed: new incident
+
+def test_open_incidents_are_bounded():
+    grouper = IncidentGrouper(max_incidents=2)
+    for fp in ('a', 'b', 'c'):
+        grouper.observe(_payload('r', fp=fp))
+        grouper.observe(_payload('r2', fp=fp))
+    assert grouper.stats()['open_incidents'] == 2
+    assert [p.fingerprint for p in grouper.due_digests()] == ['a']
+
+@pytest.mark.asyncio
+async def test_notify_suppresses_repeats(monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+    sent = []
+
+    async def fake_analyze(data):
+        return AnalysisResult(simplified_error='s', probable_reason='r', probable_fix='f')
+
+    async def fake_dispatch(payload):
+        sent.append(payload)
+        return []
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+    monkeypatch.setattr(notifier, 'dispatch_notifications', fake_dispatch)
+    grouper = IncidentGrouper(window_seconds=60)
+    monkeypatch.setattr(incidents, 'get_grouper', lambda: grouper)
+
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        statuses = []
+        for i in range(4):
+            r = await client.post('/api/v1/notify', headers={'x-api-key': 'test-key'}, json={
+                'pipelineName': 'Pipe', 'runId': f'run-{i}', 'errorCode': '2200', 'errorMessage': f'Timeout after {i}s'
+            })
+            statuses.append(r.json()['status'])
+    assert statuses == ['sent', 'suppressed', 'suppressed', 'suppressed']
+    assert len(sent) == 1
+    assert await grouper.emit(fake_dispatch, flush_all=True) == 1
+    assert sent[-1].incident.occurrences == 4
+
+@pytest.mark.asyncio
+async def test_teams_card_renders_digest(monkeypatch):
+    import json
+    import httpx
+    from app.core.config import Settings
+    from app.services import http_clients
+    cards = []
+
+    def handler(request):
+        cards.append(json.loads(request.content))
+        return httpx.Response(200)
+    previous = http_clients.set_registry(http_clients.ClientRegistry(settings=Settings(), transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(notifier, 'get_settings', lambda: Settings(TEAMS_WEBHOOK_URL='https://teams.test/hook'))
+    try:
+        grouper = IncidentGrouper()
+        grouper.observe(_payload('r1'))
+        grouper.observe(_payload('r2'))
+        await notifier.send_teams(grouper.due_digests(flush_all=True)[0])
+    finally:
+        http_clients.set_registry(previous)
+    assert cards[0]['title'] == 'Incident digest: P (2 failures)'
+    facts = {f['name']: f['value'] for f in cards[0]['sections'][0]['facts']}
+    assert facts['Suppressed alerts'] == '1' and facts['Sample run ids'] == 'r1, r2'
+
+@pytest.mark.asyncio
+async def test_failed_first_alert_reopens_the_group(monkeypatch):
+    from app.models.schemas import ChannelResult
+    os.environ['API_KEY'] = 'test-key'
+    outcomes = iter(['failed', 'sent', 'sent'])
+
+    async def fake_analyze(data):
+        return AnalysisResult(simplified_error='s', probable_reason='r', probable_fix='f')
+
+    async def fake_dispatch(payload):
+        return [ChannelResult(channel='teams', status=next(outcomes), detail='down')]
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+    monkeypatch.setattr(notifier, 'dispatch_notifications', fake_dispatch)
+    grouper = IncidentGrouper(window_seconds=60)
+    monkeypatch.setattr(incidents, 'get_grouper', lambda: grouper)
+    body = {'pipelineName': 'Pipe', 'runId': 'run-1', 'errorCode': '2200', 'errorMessage': 'Timeout'}
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        codes = [(await client.post('/api/v1/notify', headers={'x-api-key': 'test-key'}, json=body)) for _ in range(3)]
+    assert [r.status_code for r in codes] == [502, 200, 200]
+    assert [r.json()['status'] for r in codes[1:]] == ['sent', 'suppressed']
+
+def test_open_incident_keeps_only_the_shown_error():
+    grouper = IncidentGrouper()
+    payload = _payload('r1').model_copy(update={'raw_error': 'x' * 200_000})
+    _, incident = grouper.observe(payload)
+    assert len(incident.payload.raw_error) == incidents.DIGEST_ERROR_CHARS
+    from app.models.context import RequestContext
+    from app.models.schemas import FailureNotification
+    context = RequestContext(FailureNotification(pipelineName='Q', errorMessage='y' * 200_000), payload.analysis, 'fp')
+    _, incident = grouper.observe(context)
+    assert len(incident.payload.raw_error) == incidents.DIGEST_ERROR_CHARS and incident.payload.pipelineName == 'Q'
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services import ai_analyzer, ingest_queue
+from app.services.exceptions import IngestQueueFullError
+from app.services.ingest_queue import IngestQueue
+
+@pytest.fixture
+async def clean_queue():
+    yield
+    await ingest_queue.shutdown()
+
+async def _wait_for(client, job_id, status='done'):
+    for _ in range(100):
+        r = await client.get(f'/api/v1/notify/{job_id}', headers={'x-api-key': 'test-key'})
+        if r.json().get('status') == status:
+            return r.json()
+        await asyncio.sleep(0.01)
+    raise AssertionError(f'job {job_id} never reached {status}: {r.json()}')
+
+@pytest.mark.asyncio
+async def test_async_mode_returns_202_and_tracks_job(monkeypatch, clean_queue):
+    os.environ['API_KEY'] = 'test-key'
+
+    async def fake_analyze(data):
+        return AnalysisResult(simplified_error='queued', probable_reason='r', probable_fix='f')
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.post('/api/v1/notify?async_mode=true&return_only=true', headers={'x-api-key': 'test-key'}, json={
+            'pipelineName': 'Pipe', 'errorMessage': 'Err'
+        })
+        assert r.status_code == 202
+        job = await _wait_for(client, r.json()['id'])
+        missing = await client.get('/api/v1/notify/nope', headers={'x-api-key': 'test-key'})
+    assert job['result']['analysis']['simplified_error'] == 'queued'
+    assert missing.status_code == 404
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    release = asyncio.Event()
+
+    async def handler(payload, return_only):
+        await release.wait()
+        return {}
+
+    queue = IngestQueue(handler, maxsize=1, workers=1)
+    item = FailureNotification(pipelineName='P', errorMessage='x')
+    queue.submit(item)
+    await asyncio.sleep(0)  # worker takes the first job
+    queue.submit(item)
+    with pytest.raises(IngestQueueFullError):
+        queue.submit(item)
+    release.set()
+    await queue.stop()
+    assert queue.stats()['rejected'] == 1
+
+@pytest.mark.asyncio
+async def test_durable_queue_replays_pending_jobs(tmp_path):
+    path = str(tmp_path / 'ingest.db')
+    handled = []
+
+    async def never(payload, return_only):
+        await asyncio.Event().wait()
+
+    first = IngestQueue(never, db_path=path, workers=1)
+    job_id = first.submit(FailureNotification(pipelineName='P', errorMessage='x'))
+    await first.stop(drain_timeout=0.01)
+
+    async def handler(payload, return_only):
+        handled.append(payload.pipelineName)
+        return {'ok': True}
+
+    second = IngestQueue(handler, db_path=path, workers=1)
+    second.start()
+    for _ in range(100):
+        if (second.status(job_id) or {}).get('status') == 'done':
+            break
+        await asyncio.sleep(0.01)
+    assert handled == ['P']
+    assert second.status(job_id)['result'] == {'ok': True}
+    await second.stop()
@@ -0,0 +1,23 @@
+import pytest
+from benchmarks.load_notify import LoadConfig, compare, percentile, run_inprocess
+from benchmarks.payloads import PayloadMix
+
+def test_payload_mix_weights_are_shares_of_requests():
+    kinds = [kind for _, (kind, _payload) in zip(range(2000), PayloadMix("unique=50,storm=50", storm_size=10))]
+    assert 0.35 < kinds.count("storm") / len(kinds) < 0.65
+
+def test_percentile_and_baseline_comparison(capsys):
+    assert percentile([0.1 * i for i in range(1, 101)], 95) == pytest.approx(9.5)
+    baseline = {"rps": 100.0, "latency_ms": {"p50": 10.0, "p95": 20.0, "p99": 30.0}}
+    current = {"rps": 80.0, "latency_ms": {"p50": 10.5, "p95": 20.0, "p99": 40.0}}
+    assert compare(current, baseline, tolerance=0.10) == ["rps", "latency_ms.p99"]
+
+@pytest.mark.asyncio
+async def test_inprocess_run_against_fake_upstreams():
+    config = LoadConfig(requests=60, concurrency=8, storm_size=5, faults=["openai=0.005,0,0.2,500"], email=True, blob=True)
+    result = await run_inprocess(config)
+    assert result["requests"] == 60 and result["errors"] == 0
+    assert result["upstream_calls"]["teams"] == 60 and result["upstream_calls"]["graph"] == 61  # one token fetch
+    assert result["upstream_calls"]["blob"] > 0
+    assert {"llm", "rules"} <= set(result["tiers"])
+    assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
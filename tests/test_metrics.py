@@ -0,0 +1,77 @@
+import json
+from contextlib import contextmanager
+import httpx
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import FailureNotification
+from app.services import ai_analyzer, http_clients, metrics
+from app.services.metrics import Counter, Histogram
+
+def test_histogram_and_counter_render_prometheus_text():
+    h = Histogram("h_seconds", "help", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, "a")
+    h.observe(0.1, "a")  # upper bounds are inclusive
+    h.observe(3.0, "a")
+    text = "\n".join(h.render())
+    assert 'h_seconds_bucket{stage="a",le="0.1"} 2' in text
+    assert 'h_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'h_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'h_seconds_count{stage="a"} 3' in text and 'h_seconds_sum{stage="a"} 3.15' in text
+    c = Counter("c_total", "help", ("reason",))
+    c.inc('say "hi"', amount=2)
+    assert c.render()[-1] == 'c_total{reason="say \\"hi\\""} 2'
+
+@pytest.mark.asyncio
+async def test_metrics_cover_stages_upstream_and_tokens(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        content = json.dumps({"simplified_error": "s", "probable_reason": "r", "probable_fix": "f"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 120, "completion_tokens": 30}})
+
+    monkeypatch.setenv("API_KEY", "test-key")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://aoai.test/")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "k")
+    monkeypatch.setenv("RULES_ENABLED", "false")
+    previous = http_clients.set_registry(http_clients.ClientRegistry(transport=httpx.MockTransport(handler)))
+    prompt_tokens = metrics.TOKENS.value("prompt")
+    upstream_calls = metrics.UPSTREAM_SECONDS.count("openai", "200")
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            r = await client.post("/api/v1/notify?return_only=true", headers={"x-api-key": "test-key"}, json={
+                "pipelineName": "Pipe", "errorMessage": "Something new broke", "correlationId": "corr-1"
+            })
+            assert r.status_code == 200
+            text = (await client.get("/metrics")).text
+    finally:
+        http_clients.set_registry(previous)
+    assert metrics.TOKENS.value("prompt") == prompt_tokens + 120
+    assert metrics.UPSTREAM_SECONDS.count("openai", "200") == upstream_calls + 1
+    for stage in ("redact", "condense", "llm", "log"):
+        assert f'adf_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'adf_http_request_duration_seconds_count{method="POST",route="/api/v1/notify",status="200"}' in text
+
+@pytest.mark.asyncio
+async def test_fallbacks_counted_by_reason_and_spans_carry_correlation_id(monkeypatch):
+    spans = []
+
+    class FakeTracer:
+        @contextmanager
+        def start_as_current_span(self, name, attributes=None):
+            spans.append((name, attributes))
+            yield
+
+    monkeypatch.delenv("AZURE_OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("RULES_ENABLED", "false")
+    metrics.set_tracer(FakeTracer())
+    before = metrics.FALLBACKS.value("not_configured")
+    metrics.bind_correlation_id("corr-42")
+    with metrics.stage("triage"):
+        await ai_analyzer.analyze_failure(FailureNotification(pipelineName="p", errorMessage="boom"))
+    assert metrics.FALLBACKS.value("not_configured") == before + 1
+    assert spans == [("adf.triage", {"adf.correlation_id": "corr-42"})]
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("METRICS_ENABLED", "false")
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        assert (await client.get("/metrics")).status_code == 404
@@ -0,0 +1,119 @@
+import json
+import httpx
+import pytest
+from app.core.config import Settings
+from app.models.schemas import FailureNotification
+from app.services import ai_analyzer, http_clients, openai_pool
+from app.services.exceptions import OpenAIUnavailableError
+from app.services.openai_pool import CircuitBreaker, Endpoint, OpenAIPool, TokenBucket
+
+OK_CONTENT = json.dumps({"simplified_error": "s", "probable_reason": "r", "probable_fix": "f"})
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+def _endpoint(host):
+    return Endpoint(f"https://{host}/", "dep", "k", "2024-02-15-preview")
+
+@pytest.fixture
+def upstream():
+    """Routes by host to a list of scripted responses (the last one repeats)."""
+    script = {}
+    calls = []
+    clock = FakeClock()
+    latency = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        calls.append(host)
+        clock.now += latency.get(host, 0.0)
+        responses = script[host]
+        status, headers = responses.pop(0) if len(responses) > 1 else responses[0]
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(status, headers=headers, json={"choices": [{"message": {"content": OK_CONTENT}}]})
+
+    registry = http_clients.ClientRegistry(settings=Settings(), transport=httpx.MockTransport(handler))
+    previous = http_clients.set_registry(registry)
+    yield script, calls, clock, latency
+    http_clients.set_registry(previous)
+
+def _pool(clock, hosts, **kwargs):
+    kwargs.setdefault("rand", lambda: 0.5)
+    return OpenAIPool([_endpoint(h) for h in hosts], clock=clock, sleep=clock.sleep, **kwargs)
+
+@pytest.mark.asyncio
+async def test_retries_429_honouring_retry_after(upstream):
+    script, calls, clock, _ = upstream
+    script["a.test"] = [(429, {"retry-after": "2"}), (200, {})]
+    r = await _pool(clock, ["a.test"]).chat({"messages": []})
+    assert r.status_code == 200
+    assert calls == ["a.test", "a.test"]
+    assert clock.sleeps == [2.0]
+
+@pytest.mark.asyncio
+async def test_fails_over_without_waiting_then_prefers_faster_endpoint(upstream):
+    script, calls, clock, latency = upstream
+    script["a.test"] = [(503, {}), (200, {})]
+    script["b.test"] = [(200, {})]
+    pool = _pool(clock, ["a.test", "b.test"])
+    assert (await pool.chat({})).status_code == 200
+    assert calls == ["a.test", "b.test"] and clock.sleeps == []
+    # Once a.test recovers, the lower measured latency decides
+    clock.now += 60
+    latency.update({"a.test": 0.05, "b.test": 0.8})
+    for _ in range(5):
+        await pool.chat({})
+    assert calls[-3:] == ["a.test"] * 3
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_half_open_probe_closes_it(upstream):
+    script, calls, clock, _ = upstream
+    script["a.test"] = [(500, {}), (500, {}), (200, {})]
+    pool = _pool(clock, ["a.test"], max_retries=1, breaker_threshold=2, breaker_reset=30)
+    with pytest.raises(OpenAIUnavailableError) as ex:
+        await pool.chat({})
+    assert ex.value.reason == "http_error"
+    assert pool.states[0].breaker.state == "open"
+    with pytest.raises(OpenAIUnavailableError) as ex:
+        await pool.chat({})
+    assert ex.value.reason == "circuit_open" and len(calls) == 2  # failed fast, no request
+    clock.now += 31
+    assert (await pool.chat({})).status_code == 200
+    assert pool.states[0].breaker.state == "closed"
+
+def test_token_bucket_and_breaker_units():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)  # one per second
+    assert bucket.reserve(60, max_wait=5) == 0
+    assert bucket.reserve(2, max_wait=5) == pytest.approx(2.0)
+    assert bucket.reserve(10, max_wait=5) is None
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert not breaker.acquire()
+    clock.now += 10
+    assert breaker.acquire() and breaker.state == "half_open"
+    assert not breaker.acquire()  # only one probe at a time
+
+@pytest.mark.asyncio
+async def test_rate_limit_beyond_max_wait_falls_back(upstream, monkeypatch):
+    script, calls, clock, _ = upstream
+    script["a.test"] = [(200, {})]
+    pool = OpenAIPool([Endpoint("https://a.test/", "dep", "k", "v", rpm=1)], max_wait=5, clock=clock, sleep=clock.sleep)
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://a.test/", AZURE_OPENAI_DEPLOYMENT="dep", AZURE_OPENAI_API_KEY="k")
+    monkeypatch.setattr(ai_analyzer, "get_settings", lambda: settings)
+    openai_pool.set_pool(pool)
+    data = FailureNotification(pipelineName="p", errorMessage="boom")
+    assert (await ai_analyzer.analyze_failure(data)).fallback_reason is None
+    result = await ai_analyzer.analyze_failure(data)
+    assert result.fallback_reason == "rate_limited"
+    assert calls == ["a.test"]
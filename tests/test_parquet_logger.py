@@ -0,0 +1,45 @@
+import os
+import pytest
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+from app.core.config import Settings
+from app.models.schemas import AnalysisResult, NotificationPayload
+from app.services.parquet_logger import ParquetLogger, read_analyses
+
+def _payload(i, environment='prod', source='adf'):
+    return NotificationPayload(
+        pipelineName=f'P{i % 2}', runId=f'r{i}', activityName=None, errorCode='2200', environment=environment, source=source,
+        resourceUrl=None, component=None, severity='error', tags=None, correlationId=None, region=None,
+        raw_error='boom', analysis=AnalysisResult(simplified_error='s', probable_reason='r', probable_fix='f', confidence=0.8),
+    )
+
+def _files(root):
+    return sorted(os.path.join(d, f) for d, _, fs in os.walk(root) for f in fs if f.endswith('.parquet'))
+
+def test_partitioned_write_and_column_read(tmp_path):
+    logger = ParquetLogger(Settings(PARQUET_LOG_DIR=str(tmp_path), PARQUET_FLUSH_MAX_ROWS=1000))
+    for i in range(4):
+        logger.append_analysis(_payload(i))
+    logger.append_analysis(_payload(9, environment='dev', source=None))
+    assert logger.flush_sync() == 5
+    files = _files(tmp_path)
+    assert len(files) == 2
+    assert any('environment=dev' in f and 'source=unknown' in f for f in files)
+    column = pq.ParquetFile(files[0]).metadata.row_group(0).column(1)
+    assert column.path_in_schema == 'pipelineName'
+    assert any('DICTIONARY' in str(e) for e in column.encodings)
+
+    table = read_analyses(str(tmp_path), columns=['pipelineName', 'errorCode', 'environment'])
+    assert table.num_rows == 5
+    assert table.column_names == ['pipelineName', 'errorCode', 'environment']
+
+def test_compaction_merges_small_files(tmp_path):
+    logger = ParquetLogger(Settings(PARQUET_LOG_DIR=str(tmp_path)))
+    for i in range(3):
+        logger.append_analysis(_payload(i))
+        logger.flush_sync()
+    assert len(_files(tmp_path)) == 3
+    assert logger.compact() == {'partitions_compacted': 1, 'files_removed': 3}
+    files = _files(tmp_path)
+    assert len(files) == 1 and os.path.basename(files[0]).startswith('compacted-')
+    assert read_analyses(str(tmp_path)).num_rows == 3
@@ -0,0 +1,62 @@
+import asyncio
+import csv
+import json
+import random
+import pytest
+from app.models.schemas import AnalysisResult
+from app.services import ai_analyzer
+from app.services.reanalyze import Reanalysis, _lines, main
+
+def _write_ndjson(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"request_id": f"r{i}", "body": {"pipelineName": f"P{i}", "errorMessage": f"failure {i}"}}) + "\n")
+        f.write("not json\n")
+
+@pytest.fixture
+def fake_analyzer(monkeypatch):
+    calls = []
+    rand = random.Random(1)
+
+    async def fake_analyze(data):
+        calls.append(data.pipelineName)
+        await asyncio.sleep(rand.random() * 0.01)  # finish out of order
+        return AnalysisResult(simplified_error=f"re {data.errorMessage}", probable_reason="r", probable_fix="f", confidence=0.8)
+    monkeypatch.setattr(ai_analyzer, "analyze_failure", fake_analyze)
+    return calls
+
+def test_lines_reassembles_chunk_boundaries():
+    chunks = [b"a,b\n1,\"x", b"\ny\"\n2,", "é".encode("utf-8")[:1], "é".encode("utf-8")[1:] + b"\n3"]
+    assert list(_lines(chunks)) == ["a,b\n", "1,\"x\n", "y\"\n", "2,é\n", "3"]
+
+@pytest.mark.asyncio
+async def test_resume_continues_where_the_checkpoint_stopped(tmp_path, fake_analyzer):
+    source, output = str(tmp_path / "in.jsonl"), str(tmp_path / "out.csv")
+    _write_ndjson(source, 30)
+    first = await Reanalysis(source, output, workers=4, checkpoint_every=5, limit=12, quiet=True).run()
+    assert first["records"] == 12 and len(fake_analyzer) == 12
+    with open(output, "a", encoding="utf-8") as f:
+        f.write("999,partial row from a crash\n")  # past the checkpoint: truncated on resume
+    summary = await Reanalysis(source, output, workers=4, checkpoint_every=5, quiet=True).run()
+    assert summary["records"] == 31 and summary["processed"] == 19
+    assert summary["analyzed"] == 30 and summary["skipped"] == 1
+    assert len(fake_analyzer) == 30
+    with open(output, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["record"] for r in rows] == [str(i) for i in range(30)]
+    assert rows[29]["pipelineName"] == "P29" and rows[29]["simplified_error"] == "re failure 29"
+
+def test_csv_input_needs_error_text_and_refuses_to_overwrite(tmp_path, fake_analyzer, capsys):
+    source, output = tmp_path / "export.csv", tmp_path / "out.jsonl"
+    source.write_text("timestamp,pipelineName,errorCode,raw_error,simplified_error\n"
+                      "2024-05-01T10:00:00,Pipe,2200,\"Timeout\nwhile copying\",old\n"
+                      "2024-05-01T11:00:00,Pipe,2200,,old\n", encoding="utf-8")
+    summary = main([str(source), "--output", str(output), "--workers", "2"])
+    assert summary["analyzed"] == 1 and summary["skipped"] == 1
+    entry = json.loads(output.read_text(encoding="utf-8"))
+    assert entry["analysis"]["simplified_error"] == "re Timeout\nwhile copying"
+    assert entry["failure"]["timestamp"].startswith("2024-05-01T10:00") and "errorMessage" not in entry["failure"]
+    assert "done: records=2" in capsys.readouterr().err
+    (tmp_path / "out.jsonl.checkpoint.json").unlink()
+    with pytest.raises(FileExistsError):
+        main([str(source), "--output", str(output)])
@@ -0,0 +1,32 @@
+import json
+from app.models.context import RequestContext
+from app.models.schemas import AnalysisResult, FailureNotification, NotificationPayload
+from app.services import notifier
+from app.services.condenser import estimate_tokens
+
+def _context(error="boom"):
+    failure = FailureNotification(pipelineName="P", runId="r1", environment="prod", tags=["data"], errorMessage=error)
+    analysis = AnalysisResult(simplified_error="s", probable_reason="r", probable_fix="f", confidence=0.5)
+    return RequestContext(failure, analysis, "fp", "llm")
+
+def test_context_reads_like_the_payload_it_replaces():
+    context = _context()
+    payload = NotificationPayload(**context.failure.model_dump(exclude={"errorMessage", "timestamp"}),
+                                  raw_error="boom", analysis=context.analysis, fingerprint="fp")
+    assert context.model_dump() == payload.model_dump()
+    assert context.raw_error is context.failure.errorMessage and context.pipelineName == "P"
+    assert context.metadata()["analysis_tier"] == "llm" and context.metadata()["tags"] == ["data"]
+    assert notifier.teams_card(context) == notifier.teams_card(payload)
+    copy = context.model_copy(update={"fingerprint": "other"})
+    assert copy.fingerprint == "other" and context.fingerprint == "fp" and copy.failure is context.failure
+    assert not hasattr(context, "__dict__")
+
+def test_email_escapes_only_the_shown_prefix():
+    for error in ["plain " * 2000, 'quote" and \\ backslash\n' * 400, "é" * 5000, "short"]:
+        _, body = notifier.email_message(_context(error))
+        assert f"<pre>{json.dumps(error)[:4000]}</pre>" in body
+
+def test_estimate_tokens_stops_past_the_limit():
+    text = "Job aborted in stage 12 " * 1000
+    assert estimate_tokens(text, 50) == estimate_tokens(text[:400], 50) > 50
+    assert estimate_tokens(text, 10 ** 6) == estimate_tokens(text)
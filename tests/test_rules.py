@@ -0,0 +1,69 @@
+import json
+import os
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import FailureNotification
+from app.services import ai_analyzer, rules
+from app.services.rules import Rule, RuleClassifier, load_rules
+
+def _failure(message, code=None):
+    return FailureNotification(pipelineName="P", errorMessage=message, errorCode=code)
+
+@pytest.mark.parametrize("message,code,name", [
+    ("ErrorCode=UserErrorFileNotFound,'Type=...,Message=Path /raw/2025/08/13 does not exist", "2200", "adf_file_not_found"),
+    ("Lost task 3.3: java.lang.OutOfMemoryError: Java heap space", None, "spark_oom"),
+    ("Back-off restarting failed container: CrashLoopBackOff", None, "k8s_crash_loop"),
+    ("Invoking Web Activity failed with HttpStatusCode - 403 Forbidden", "2108", "adf_2108_auth"),
+    ("Invoking Web Activity failed with HttpStatusCode - 500", "2108", "adf_2108"),
+])
+def test_known_failures_match(message, code, name):
+    assert RuleClassifier().match(_failure(message, code)).name == name
+
+def test_low_confidence_and_misses_go_to_model():
+    classifier = RuleClassifier()
+    assert classifier.classify(_failure("Sink failed", "2200"), min_confidence=0.8) is None  # code-only rule, 0.5
+    assert classifier.classify(_failure("something new"), min_confidence=0.8) is None
+    result = classifier.classify(_failure("OOMKilled"), min_confidence=0.8)
+    assert result.confidence == 0.9
+    assert classifier.stats() == {"rules": len(rules.DEFAULT_RULES), "hits": 1, "misses": 2}
+
+def test_configured_rules_take_precedence(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{
+        "name": "contoso_quota", "keywords": ["QuotaExceeded (contoso)"], "confidence": 0.95,
+        "simplified_error": "Contoso quota hit", "probable_reason": "r", "probable_fix": "f",
+    }]))
+    classifier = RuleClassifier(load_rules(str(path)) + rules.DEFAULT_RULES)
+    assert classifier.match(_failure("429 TooManyRequests: QuotaExceeded (contoso)")).name == "contoso_quota"
+    with pytest.raises(ValueError):
+        RuleClassifier([Rule("empty", "s", "r", "f", 0.5)])
+
+@pytest.mark.asyncio
+async def test_rules_tier_skips_model(monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+
+    async def fail_analyze(data):
+        raise AssertionError("model should not be called for a known failure")
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fail_analyze)
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.post('/api/v1/notify?return_only=true', headers={'x-api-key': 'test-key'}, json={
+            'pipelineName': 'Pipe', 'errorMessage': 'Container exited: OOMKilled'
+        })
+    assert r.status_code == 200
+    body = r.json()
+    assert body['metadata']['analysis_tier'] == 'rules'
+    assert body['analysis']['simplified_error'].startswith('Container was killed')
+
+@pytest.mark.asyncio
+async def test_unconfigured_model_uses_closest_rule(monkeypatch):
+    monkeypatch.delenv('AZURE_OPENAI_API_KEY', raising=False)
+    result = await ai_analyzer.analyze_failure(_failure("Copy failed on sink", "2200"))
+    assert result.simplified_error == "Copy activity failed."
+    assert result.fallback_reason == "not_configured"
+
+def test_throttled_needs_http_context_for_429():
+    classifier = RuleClassifier()
+    assert classifier.match(_failure("Task 3 in stage 429.0 failed 4 times: java.lang.NullPointerException")) is None
+    for text in ("Response status code: 429", "HTTP/1.1 429 from sink", "ErrorCode=UserErrorFailedToCopy, StatusCode 429"):
+        assert classifier.match(_failure(text)).name == "throttled", text
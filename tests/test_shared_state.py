@@ -0,0 +1,201 @@
+import os
+import subprocess
+import sys
+import pytest
+from httpx import AsyncClient
+from app.core.config import Settings
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.models.context import RequestContext
+from app.main import app
+from app.services import ai_analyzer, notifier, shared_state
+from app.services.analysis_cache import AnalysisCache
+from app.services.incidents import IncidentGrouper
+from app.services.notifier import Channel
+from app.services.shared_state import MemoryBackend, RedisBackend, SharedBucket, SQLiteBackend
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """Local stand-in for a Redis server, with redis-py's method signatures."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item and item[1] is not None and item[1] <= self.clock():
+            del self.data[key]
+            return None
+        return item
+
+    def get(self, key):
+        item = self._live(key)
+        return None if item is None else str(item[0]).encode()
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and self._live(key) is not None:
+            return None
+        self.data[key] = (value, self.clock() + px / 1000 if px else None)
+        return True
+
+    def incrby(self, key, amount):
+        item = self._live(key)
+        value = (int(item[0]) if item else 0) + amount
+        self.data[key] = (value, item[1] if item else None)
+        return value
+
+    def pexpire(self, key, ms):
+        self.data[key] = (self.data[key][0], self.clock() + ms / 1000)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def close(self):
+        pass
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    clock = Clock()
+    if request.param == "memory":
+        b = MemoryBackend("t:", clock=clock)
+    elif request.param == "sqlite":
+        b = SQLiteBackend(str(tmp_path / "state.db"), "t:", clock=clock)
+    else:
+        b = RedisBackend("redis://stand-in", "t:", client=FakeRedis(clock))
+    b.clock = clock
+    yield b
+    b.close()
+
+def test_backend_operations_and_expiry(backend):
+    assert backend.add("claim", "a", ttl=10) and not backend.add("claim", "b", ttl=10)
+    assert backend.get("claim") == "a" and backend.get("missing") is None
+    assert backend.incr("n", 2, ttl=10) == 2 and backend.incr("n", 3, ttl=10) == 5
+    backend.set("v", "x y", ttl=5)
+    backend.set("forever", "1")
+    backend.clock.now += 10
+    assert backend.get("claim") is None and backend.get("v") is None and backend.get("forever") == "1"
+    assert backend.incr("n", 1, ttl=10) == 1  # expired counter restarts
+    assert backend.add("claim", "b", ttl=10) and backend.get("claim") == "b"
+    backend.delete("claim")
+    assert backend.get("claim") is None
+
+def test_sqlite_counter_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "state.db")
+    script = ("import sys; from app.services.shared_state import SQLiteBackend; b = SQLiteBackend(sys.argv[1]);\n"
+              "for _ in range(200): b.incr('hits')")
+    workers = [subprocess.Popen([sys.executable, "-c", script, path]) for _ in range(3)]
+    assert all(w.wait(timeout=60) == 0 for w in workers)
+    assert SQLiteBackend(path).get("hits") == "600"
+
+@pytest.mark.asyncio
+async def test_analysis_cached_by_one_worker_is_read_by_another(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = AnalysisCache(shared=SQLiteBackend(path)), AnalysisCache(shared=SQLiteBackend(path))
+    assert second.get("fp") is None and await second.get_shared("fp") is None
+    result = AnalysisResult(simplified_error="s", probable_reason="r", probable_fix="f", confidence=0.9)
+    first.put("fp", result)
+    await first.put_shared("fp", result)
+    assert second.get("fp") is None
+    assert (await second.get_shared("fp")).confidence == 0.9
+    assert second.get("fp").simplified_error == "s"  # now held locally
+    assert second.stats()["shared_hits"] == 1 and second.stats()["hits"] == 2
+
+@pytest.mark.asyncio
+async def test_incident_alerts_once_across_workers():
+    clock = Clock()
+    backend = MemoryBackend(clock=clock)
+    workers = [IncidentGrouper(window_seconds=60, clock=clock, shared=backend) for _ in range(3)]
+    analysis = AnalysisResult(simplified_error="s", probable_reason="r", probable_fix="f")
+
+    def context(run):
+        return RequestContext(FailureNotification(pipelineName="P", runId=run, errorCode="2200", errorMessage="boom"), analysis, "fp")
+    decisions = [await workers[i % 3].aobserve(context(f"r{i}")) for i in range(7)]
+    assert [d for d, _ in decisions].count("alert") == 1
+    assert len({incident.id for _, incident in decisions}) == 1
+    clock.now += 61
+    digests = []
+
+    async def send(payload):
+        digests.append(payload)
+    for w in workers:
+        await w.emit(send)
+    assert len(digests) == 1 and digests[0].incident.occurrences == 7
+    assert (await workers[1].aobserve(context("r8")))[0] == "alert"  # the window closed: a new incident
+
+@pytest.mark.asyncio
+async def test_shared_bucket_spans_workers():
+    clock, backend = Clock(), MemoryBackend()
+    clock.now = 600.0  # start of a minute
+    a, b = SharedBucket(backend, "openai", 2, clock), SharedBucket(backend, "openai", 2, clock)
+    assert await a.reserve(1, 0) == 0.0 and await b.reserve(1, 0) == 0.0
+    assert await a.reserve(1, 5) is None  # the minute is spent and the next is 60s away
+    assert await b.reserve(1, 60) == 60.0
+    await b.refund(1)
+    assert await a.reserve(1, 60) == 60.0
+
+def test_redis_refund_on_expired_window_gets_a_ttl():
+    clock = Clock()
+    client = FakeRedis(clock)
+    backend = RedisBackend("redis://stand-in", client=client)
+    backend.incr("rate", 1, ttl=60)
+    clock.now += 61
+    assert backend.incr("rate", -1, ttl=60) == -1
+    assert client.data["rate"][1] == clock.now + 60
+
+class DownRedis(FakeRedis):
+    def get(self, key):
+        raise ConnectionError("Connection refused")
+    set = incrby = delete = get
+
+@pytest.mark.asyncio
+async def test_backend_outage_degrades_to_in_process_state(monkeypatch):
+    backend = RedisBackend("redis://stand-in", client=DownRedis(Clock()))
+    shared_state.set_backend(backend)
+    bucket = SharedBucket(backend, "openai", 1)
+    assert await bucket.reserve(1, 0) == 0.0 and await bucket.reserve(1, 0) is None
+    os.environ["API_KEY"] = "test-key"
+    monkeypatch.setenv("INCIDENT_GROUPING_ENABLED", "true")
+
+    async def fake_analyze(data):
+        return AnalysisResult(simplified_error="s", probable_reason="r", probable_fix="f")
+
+    async def fake_dispatch(payload):
+        return [notifier.ChannelResult(channel="teams", status="sent")]
+    monkeypatch.setattr(ai_analyzer, "analyze_failure", fake_analyze)
+    monkeypatch.setattr(notifier, "dispatch_notifications", fake_dispatch)
+    body = {"pipelineName": "Pipe", "runId": "run-1", "errorCode": "2200", "errorMessage": "Timeout"}
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        codes = [(await client.post("/api/v1/notify", headers={"x-api-key": "test-key"}, json=body)) for _ in range(2)]
+        health = (await client.get("/healthz")).json()
+    assert [r.status_code for r in codes] == [200, 200]
+    assert [r.json()["status"] for r in codes] == ["sent", "suppressed"]  # grouped by this worker alone
+    assert health["shared_state"]["errors"] >= 3 and "ConnectionError" in health["shared_state"]["last_error"]
+
+@pytest.mark.asyncio
+async def test_reload_settings_reopens_the_backend(monkeypatch, tmp_path):
+    monkeypatch.setenv("PREWARM_ENABLED", "false")
+    shared_state.get_backend()
+    monkeypatch.setenv("STATE_BACKEND", "sqlite")
+    monkeypatch.setenv("STATE_SQLITE_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr("app.main.load_dotenv", lambda **kwargs: None)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        assert (await client.post("/diagnostics/reload-settings")).status_code == 200
+    assert isinstance(shared_state.get_backend(), SQLiteBackend)
+
+@pytest.mark.asyncio
+async def test_notify_rpm_limits_each_channel(monkeypatch):
+    sent = []
+
+    async def send(payload):
+        sent.append(payload)
+    monkeypatch.setattr(notifier, "CHANNELS", {"teams": Channel("teams", send, lambda s: True, lambda s: 0.01)})
+    monkeypatch.setattr(notifier, "get_settings", lambda: Settings(NOTIFY_RPM=1))
+    first = await notifier.dispatch_notifications("payload")
+    second = await notifier.dispatch_notifications("payload")
+    assert first[0].status == "sent" and second[0].status == "rate_limited" and len(sent) == 1
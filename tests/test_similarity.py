@@ -0,0 +1,67 @@
+import os
+import pytest
+from httpx import AsyncClient
+
+np = pytest.importorskip("numpy")
+
+from app.main import app
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services import ai_analyzer
+from app.services.similarity import SimilarityIndex
+
+SQL_NULL = "ErrorCode=SqlOperationFailed,'Message=A database operation failed. Cannot insert the value NULL into column 'CustomerId', table 'dbo.Orders'; column does not allow nulls. INSERT fails."
+SQL_NULL_REWORDED = "ErrorCode=SqlOperationFailed,'Message=A database operation failed. Cannot insert the value NULL into column 'OrderId', table 'dbo.Lines'; column does not allow nulls. INSERT fails."
+SPARK_MISSING_TABLE = "org.apache.spark.sql.AnalysisException: Table or view not found: sales.orders_daily"
+
+def _failure(message, code="2200"):
+    return FailureNotification(pipelineName="P", errorMessage=message, errorCode=code)
+
+def _result(text):
+    return AnalysisResult(simplified_error=text, probable_reason="r", probable_fix="f", confidence=0.9)
+
+def test_reworded_failure_reuses_nearest_analysis():
+    index = SimilarityIndex(threshold=0.75)
+    index.add(_failure(SQL_NULL), "fp-null", _result("NULL into non-null column"))
+    index.add(_failure(SPARK_MISSING_TABLE, None), "fp-table", _result("Missing table"))
+    result, score = index.search(_failure(SQL_NULL_REWORDED))
+    assert result.simplified_error == "NULL into non-null column" and score >= 0.75
+    assert result.confidence == pytest.approx(min(0.9, score), abs=0.01)
+    assert index.search(_failure("String or binary data would be truncated in table 'dbo.Orders'.")) is None
+    assert index.stats()["hits"] == 1 and index.stats()["misses"] == 1
+
+def test_persisted_index_is_memory_mapped_and_rings(tmp_path):
+    path = str(tmp_path / "idx")
+    index = SimilarityIndex(path=path, capacity=2, dim=256)
+    index.add(_failure(SQL_NULL), "a", _result("a"))
+    index.add(_failure(SPARK_MISSING_TABLE, None), "b", _result("b"))
+    index.close()
+    reopened = SimilarityIndex(path=path, capacity=99, dim=4096, threshold=0.5)  # keeps its stored shape
+    assert isinstance(reopened._vectors, np.memmap) and (reopened.capacity, reopened.dim) == (2, 256)
+    assert reopened.search(_failure(SQL_NULL_REWORDED))[0].simplified_error == "a"
+    reopened.add(_failure("ModuleNotFoundError: No module named 'great_expectations'", None), "c", _result("c"))
+    assert not reopened.add(_failure(SQL_NULL), "c", _result("dup"))  # same fingerprint
+    reopened.close()
+    final = SimilarityIndex(path=path, threshold=0.5)
+    assert final.search(_failure(SQL_NULL_REWORDED)) is None  # oldest entry was replaced
+    assert final.stats()["size"] == 2
+
+@pytest.mark.asyncio
+async def test_similar_tier_answers_before_the_model(monkeypatch):
+    os.environ['API_KEY'] = 'test-key'
+    monkeypatch.setenv('SIMILARITY_ENABLED', 'true')
+    calls = []
+
+    async def fake_analyze(data):
+        calls.append(data.errorMessage)
+        return _result("NULL into non-null column")
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        tiers = []
+        for message in (SQL_NULL, SQL_NULL_REWORDED):
+            r = await client.post('/api/v1/notify?return_only=true', headers={'x-api-key': 'test-key'}, json={
+                'pipelineName': 'Pipe', 'errorCode': '2200', 'errorMessage': message
+            })
+            tiers.append(r.json()['metadata']['analysis_tier'])
+        health = (await client.get('/healthz')).json()
+    assert tiers == ['llm', 'similar'] and calls == [SQL_NULL]
+    assert health['similarity']['hits'] == 1
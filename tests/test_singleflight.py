@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services import ai_analyzer, triage
+from app.services.singleflight import SingleFlight, get_singleflight
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_failures_share_one_call(monkeypatch):
+    calls = []
+    release = asyncio.Event()
+
+    async def fake_analyze(data):
+        calls.append(data.runId)
+        await release.wait()
+        return AnalysisResult(simplified_error='shared', probable_reason='r', probable_fix='f')
+    monkeypatch.setattr(ai_analyzer, 'analyze_failure', fake_analyze)
+
+    items = [FailureNotification(pipelineName='P', runId=f'run-{i}', errorMessage=f'Linked service down (attempt {i})') for i in range(5)]
+    tasks = [asyncio.create_task(triage.analyze(item)) for item in items]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert len(calls) == 1
+    assert {r.simplified_error for r, _ in results} == {'shared'}
+    assert sorted(tier for _, tier in results) == ['coalesced'] * 4 + ['llm']
+    assert get_singleflight().stats()['collapsed'] == 4
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_does_not_cancel_followers():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return 'done'
+
+    leader = asyncio.create_task(flight.do('k', work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do('k', work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await follower == ('done', True)
+    assert leader.cancelled()
+
+@pytest.mark.asyncio
+async def test_follower_timeout_is_per_caller():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return 'late'
+
+    leader = asyncio.create_task(flight.do('k', work))
+    await asyncio.sleep(0)
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.do('k', work, timeout=0.01)
+    release.set()
+    assert await leader == ('late', False)
+    assert flight.stats() == {'inflight': 0, 'leaders': 1, 'collapsed': 1, 'timeouts': 1}
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+from httpx import AsyncClient
+from app.api.routes import router
+from app.core import startup
+from app.core.config import _ENV_NAMES, get_settings
+from app.main import app
+from app.services import ai_analyzer, http_clients, metrics, openai_pool, redaction, rules
+
+@pytest.mark.asyncio
+async def test_prewarm_builds_enabled_objects_and_routes(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "gpt")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "k")
+    monkeypatch.setenv("DISABLE_NOTIFICATIONS", "true")
+    monkeypatch.setenv("ENABLE_CSV_LOGGING", "false")
+    registry = http_clients.ClientRegistry(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    previous = http_clients.set_registry(registry)
+
+    async def no_analysis(data):
+        raise AssertionError("prewarm must not run handlers")
+    monkeypatch.setattr(ai_analyzer, "analyze_failure", no_analysis)
+    requests_before = metrics.REQUEST_SECONDS.count("POST", "/api/v1/notify", "422")
+    try:
+        steps = await startup.prewarm(app, router)
+        assert set(registry._clients) == {"openai"}  # notifications are off: no Teams/Graph clients
+    finally:
+        await registry.aclose()
+        http_clients.set_registry(previous)
+    assert {"redaction", "rules", "openai_pool", "client_openai", "routes", "total"} <= set(steps)
+    assert "csv_logger" not in steps and "parquet_logger" not in steps
+    assert redaction.set_engine(None) is not None and rules.set_classifier(None) is not None
+    assert openai_pool.current_pool() is not None
+    assert metrics.REQUEST_SECONDS.count("POST", "/api/v1/notify", "422") == requests_before
+
+@pytest.mark.asyncio
+async def test_failing_prewarm_step_is_recorded(monkeypatch):
+    def broken():
+        raise ValueError("bad RULES_PATH")
+    monkeypatch.setattr(rules, "get_classifier", broken)
+    steps = await startup.prewarm()
+    assert steps["rules"] == "error: ValueError: bad RULES_PATH" and "redaction" in steps
+
+def test_settings_read_only_known_names(monkeypatch):
+    monkeypatch.setenv("UNRELATED_VARIABLE", "x")
+    monkeypatch.setenv("BATCH_CONCURRENCY", "3")
+    assert get_settings().batch_concurrency == 3
+    assert "UNRELATED_VARIABLE" not in _ENV_NAMES and "API_KEY" in _ENV_NAMES
+
+@pytest.mark.asyncio
+async def test_startup_diagnostics(monkeypatch):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        assert (await client.get("/diagnostics/startup")).status_code == 404
+        monkeypatch.setenv("STARTUP_PROFILE", "true")
+        get_settings.cache_clear()
+        body = (await client.get("/diagnostics/startup")).json()
+    assert body["origin"] in ("process_start", "app_import")
+    assert 0 <= body["app_import_started_s"] <= body["imported_s"]
+
+def test_import_breakdown_groups_self_time_by_package():
+    output = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:      1000 |       1000 |     fastapi.routing",
+        "import time:      3000 |       4000 |   fastapi",
+        "import time:       500 |        500 |     app.core.config",
+        "import time:       200 |       4700 |   app.main",
+    ])
+    report = startup.import_breakdown(output)
+    assert report["total_ms"] == 4.7
+    assert report["packages_ms"] == {"fastapi": 4.0, "app": 0.7}
+    assert list(report["app_modules_cumulative_ms"]) == ["app.main", "app.core.config"]
@@ -0,0 +1,84 @@
+import json
+import httpx
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models.schemas import AnalysisResult, FailureNotification
+from app.services import ai_analyzer, analysis_cache, http_clients
+from app.services.ai_analyzer import _StringFieldStream
+from app.services.analysis_cache import AnalysisCache
+
+CONTENT = json.dumps({"simplified_error": "Sink \"orders\" rejected\nrows", "probable_reason": "r", "probable_fix": "f"})
+PAYLOAD = {"pipelineName": "Pipe", "errorMessage": "Something unusual happened"}
+
+def _sse_body(content, size=7):
+    events = [{"choices": [], "prompt_filter_results": []}]
+    events += [{"choices": [{"delta": {"content": content[i:i + size]}}]} for i in range(0, len(content), size)]
+    return "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+
+def _events(text):
+    out = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        out.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return out
+
+@pytest.fixture
+def upstream(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, text=_sse_body(CONTENT))
+
+    monkeypatch.setenv("API_KEY", "test-key")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://aoai.test/")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "dep")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "k")
+    registry = http_clients.ClientRegistry(transport=httpx.MockTransport(handler))
+    previous = http_clients.set_registry(registry)
+    yield requests
+    http_clients.set_registry(previous)
+
+def test_field_stream_decodes_across_chunk_boundaries():
+    field = _StringFieldStream("simplified_error")
+    pieces = [field.feed(CONTENT[i:i + 3]) for i in range(0, len(CONTENT), 3)]
+    assert "".join(pieces) == 'Sink "orders" rejected\nrows'
+    assert sum(1 for p in pieces if p) > 3
+
+@pytest.mark.asyncio
+async def test_deltas_precede_validated_result(upstream):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        r = await client.post("/api/v1/notify/stream?return_only=true", headers={"x-api-key": "test-key"}, json=PAYLOAD)
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    assert upstream[0]["stream"] is True
+    assert [e for e, _ in events[:-1]] == ["delta"] * (len(events) - 1) and len(events) > 2
+    assert "".join(d["simplified_error"] for _, d in events[:-1]) == 'Sink "orders" rejected\nrows'
+    kind, body = events[-1]
+    assert kind == "result" and body["metadata"]["analysis_tier"] == "llm"
+    assert AnalysisResult(**body["analysis"]).probable_fix == "f"
+
+@pytest.mark.asyncio
+async def test_cached_analysis_is_a_single_result_event(upstream):
+    analysis_cache.set_cache(AnalysisCache())
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.post("/api/v1/notify/stream?return_only=true", headers={"x-api-key": "test-key"}, json=PAYLOAD)
+        r = await client.post("/api/v1/notify/stream?return_only=true", headers={"x-api-key": "test-key"}, json=PAYLOAD)
+    events = _events(r.text)
+    assert [e for e, _ in events] == ["result"] and events[0][1]["metadata"]["analysis_tier"] == "cache"
+    assert len(upstream) == 1
+
+@pytest.mark.asyncio
+async def test_truncated_stream_falls_back_to_parse_error(monkeypatch):
+    def handler(request):
+        return httpx.Response(200, text=_sse_body(CONTENT[:20]))
+
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://aoai.test/")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "k")
+    previous = http_clients.set_registry(http_clients.ClientRegistry(transport=httpx.MockTransport(handler)))
+    try:
+        events = [e async for e in ai_analyzer.analyze_failure_stream(FailureNotification(**PAYLOAD))]
+    finally:
+        http_clients.set_registry(previous)
+    assert events[-1][0] == "result" and events[-1][1].fallback_reason == "parse_error"